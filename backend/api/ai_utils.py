@@ -1,75 +1,188 @@
 import os
 import io
+import asyncio
+import re
 import base64
+import numpy as np
 import pypdfium2 as pdfium
-from PIL import Image
+from PIL import Image, ImageDraw, ImageFont, ImageOps
 from django.conf import settings
 from groq import Groq
 
-def load_document_images(file_path):
+def iter_document_images(file_path):
     """
-    Renders PDF pages as images using pypdfium2.
-    Returns a list of PIL Images.
+    Renders PDF pages as images using pypdfium2, one page at a time.
+    Yields (page_no, PIL Image) with 1-based page numbers; a page that fails
+    to render is yielded as (page_no, None), so later pages keep their numbers.
+    Pages after the consumer stops iterating are never rendered.
     """
-    images = []
     try:
         # Load PDF document
         pdf = pdfium.PdfDocument(file_path)
-        
-        # Iterate over pages and render
-        for i in range(len(pdf)):
-            page = pdf[i]
-            # Render page to bitmap (scale=300/72 represents roughly 300 DPI)
-            bitmap = page.render(scale=300/72)
-            # Convert to PIL Image
-            pil_image = bitmap.to_pil()
-            images.append(pil_image)
-            
     except Exception as e:
         print(f"Error extracting images from PDF: {e}")
         # Identify if it's an image file already (fallback)
         try:
              img = Image.open(file_path)
-             images.append(img)
         except Exception as img_e:
              print(f"Error loading as image: {img_e}")
-             
-    return images
+             return
+        yield 1, img
+        return
+
+    for i in range(len(pdf)):
+        try:
+            page = pdf[i]
+            # Render page to bitmap (scale=300/72 represents roughly 300 DPI)
+            bitmap = page.render(scale=300/72)
+        except Exception as e:
+            print(f"Error rendering PDF page {i+1}: {e}")
+            yield i + 1, None
+            continue
+        # Convert to PIL Image
+        yield i + 1, bitmap.to_pil()
+
+def count_document_pages(file_path):
+    """
+    Number of pages in the document without rendering them (1 for image files).
+    """
+    try:
+        return len(pdfium.PdfDocument(file_path))
+    except Exception:
+        return 1
+
+def load_document_images(file_path):
+    """
+    Renders PDF pages as images using pypdfium2.
+    Returns a list of PIL Images (pages that failed to render are left out).
+    """
+    return [img for _, img in iter_document_images(file_path) if img is not None]
+
+# --- PAGE PREPROCESSING (before Vision OCR) ---
+MAX_SKEW_DEGREES = 5.0      # only straighten gentle tilts
+INK_CONTRAST = 50           # a pixel this much darker than the paper counts as ink
+BLANK_MAX_INK_PIXELS = 150  # pages with less ink than this (on a 1000px thumbnail) are blank
+CROP_MARGIN = 24            # px kept around the detected content
+MIN_PAGE_SIDE = 512         # tiny crops are padded back up so the vision model can read them
+
+def _crop_borders(gray):
+    """
+    Trims the uniform surround (white margins, scanner bed, desk) around the content.
+    Whatever colour runs along the frame edge is treated as background.
+    """
+    pixels = np.asarray(gray)
+    edge = np.concatenate([pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]])
+    mask = np.abs(pixels.astype(np.int16) - int(np.median(edge))) > 40
+    rows, cols = np.where(mask.any(axis=1))[0], np.where(mask.any(axis=0))[0]
+    if rows.size == 0 or cols.size == 0:
+        return gray
+    top, bottom = max(rows[0] - CROP_MARGIN, 0), min(rows[-1] + CROP_MARGIN, pixels.shape[0])
+    left, right = max(cols[0] - CROP_MARGIN, 0), min(cols[-1] + CROP_MARGIN, pixels.shape[1])
+    return gray.crop((int(left), int(top), int(right), int(bottom)))
+
+def _ink_mask(gray):
+    """
+    Boolean array of "ink" pixels: clearly darker than the paper (the median pixel).
+    """
+    pixels = np.asarray(gray)
+    return pixels < np.median(pixels) - INK_CONTRAST
+
+def _estimate_skew(gray):
+    """
+    Returns the rotation (degrees) that makes text lines most horizontal,
+    using the variance of the row projection profile on the page centre.
+    """
+    w, h = gray.size
+    centre = gray.crop((w // 5, h // 5, w - w // 5, h - h // 5))
+    centre.thumbnail((1000, 1000))
+    ink = Image.fromarray((_ink_mask(centre) * 255).astype(np.uint8))
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-MAX_SKEW_DEGREES, MAX_SKEW_DEGREES + 0.01, 0.5):
+        rotated = np.asarray(ink.rotate(float(angle), resample=Image.NEAREST), dtype=np.float32)
+        score = float(np.var(rotated.sum(axis=1)))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+def is_blank_page(gray):
+    """
+    True when a grayscale page has (almost) no ink — separator sheets, empty backs.
+    """
+    thumb = gray.copy()
+    thumb.thumbnail((1000, 1000))
+    return int(_ink_mask(thumb).sum()) < BLANK_MAX_INK_PIXELS
+
+def preprocess_page(image):
+    """
+    Cleans a page for Vision OCR: grayscale, border crop, deskew and contrast
+    normalization. Returns the cleaned PIL Image, or None for a blank page.
+    """
+    gray = image.convert("L")
+    if is_blank_page(gray):
+        return None
+
+    gray = _crop_borders(gray)
+    angle = _estimate_skew(gray)
+    if angle:
+        gray = gray.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+        gray = _crop_borders(gray)
+
+    if min(gray.size) < MIN_PAGE_SIDE:
+        canvas = Image.new("L", (max(gray.width, MIN_PAGE_SIDE), max(gray.height, MIN_PAGE_SIDE)), 255)
+        canvas.paste(gray, (0, 0))
+        gray = canvas
+
+    # Stretch faint / low-contrast photos to the full range (ignore 1% outliers)
+    return ImageOps.autocontrast(gray, cutoff=1)
+
+OCR_PROMPT = "Act as an expert OCR engine. Transcribe this medical report image into highly accurate Markdown. Preserve tables. Do not summarize."
+
+VISION_MODELS = ["llama-3.2-11b-vision-preview", "llama-3.2-90b-vision-preview"]
+
+def vision_messages(image, prompt=OCR_PROMPT):
+    """
+    Chat messages carrying the prompt and the image as a base64 JPEG.
+    `image` is a PIL Image, or JPEG bytes already encoded (see render_pool).
+    """
+    if isinstance(image, bytes):
+        jpeg = image
+    else:
+        # Convert PIL Image to JPEG
+        buffered = io.BytesIO()
+        image.save(buffered, format="JPEG")
+        jpeg = buffered.getvalue()
+    img_str = base64.b64encode(jpeg).decode("utf-8")
+    return [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text", 
+                    "text": prompt
+                },
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/jpeg;base64,{img_str}"
+                    }
+                }
+            ]
+        }
+    ]
 
-def get_markdown_from_page(image, client):
+def get_markdown_from_page(image, client, prompt=OCR_PROMPT, max_tokens=1024):
     """
     Sends an image to Groq Vision model to get a Markdown transcription.
     """
-    # Convert PIL Image to base64
-    buffered = io.BytesIO()
-    image.save(buffered, format="JPEG")
-    img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-    
-    vision_models = ["llama-3.2-11b-vision-preview", "llama-3.2-90b-vision-preview"]
+    messages = vision_messages(image, prompt)
     
-    for model_name in vision_models:
+    for model_name in VISION_MODELS:
         try:
             completion = client.chat.completions.create(
                 model=model_name,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text", 
-                                "text": "Act as an expert OCR engine. Transcribe this medical report image into highly accurate Markdown. Preserve tables. Do not summarize."
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{img_str}"
-                                }
-                            }
-                        ]
-                    }
-                ],
+                messages=messages,
                 temperature=0,
-                max_tokens=1024,
+                max_tokens=max_tokens,
             )
             print(f"[OK] Vision OCR succeeded with model: {model_name}")
             return completion.choices[0].message.content
@@ -79,3 +192,150 @@ def get_markdown_from_page(image, client):
     
     print("[ERROR] All vision models failed")
     return ""
+
+async def aget_markdown_from_page(image, client, prompt=OCR_PROMPT, max_tokens=1024):
+    """
+    get_markdown_from_page for an async Groq client; JPEG encoding runs in a thread.
+    """
+    messages = await asyncio.to_thread(vision_messages, image, prompt)
+    for model_name in VISION_MODELS:
+        try:
+            completion = await client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                temperature=0,
+                max_tokens=max_tokens,
+            )
+            print(f"[OK] Vision OCR succeeded with model: {model_name}")
+            return completion.choices[0].message.content
+        except Exception as e:
+            print(f"[WARN] Vision model {model_name} failed: {e}")
+    print("[ERROR] All vision models failed")
+    return ""
+
+# --- PAGE TILING (several sparse pages per Vision call) ---
+SPARSE_PAGE_HEIGHT = 1400    # cropped pages shorter than this (~40% of A4 at 300 DPI) get packed
+TILE_MAX_HEIGHT = 3600       # about one full A4 page at 300 DPI
+TILE_MAX_PIXELS = 10_000_000 # keeps the encoded JPEG well under the vision request size limit
+MARKER_HEIGHT = 110
+
+TILE_PROMPT = (
+    "Act as an expert OCR engine. This image contains several medical report pages stacked "
+    "vertically, each preceded by a banner like '=== PAGE 2 ==='. Transcribe every page into "
+    "highly accurate Markdown. Preserve tables. Do not summarize. Start each page's "
+    "transcription with its banner line exactly as printed, e.g. === PAGE 2 ==="
+)
+
+_MARKER_RE = re.compile(r"^\W*=+\s*PAGE\s+(\d+)\s*=+\W*$", re.MULTILINE | re.IGNORECASE)
+
+def _page_marker(page_no, width):
+    """
+    White banner reading '=== PAGE N ===' placed above each page in a tile.
+    """
+    banner = Image.new("L", (width, MARKER_HEIGHT), 255)
+    draw = ImageDraw.Draw(banner)
+    draw.line([(0, 4), (width, 4)], fill=0, width=4)
+    draw.text((24, 24), f"=== PAGE {page_no} ===", fill=0, font=ImageFont.load_default(size=56))
+    return banner
+
+def stitch_pages(pages):
+    """
+    Stacks [(page_no, image), ...] vertically with a marker banner above each page.
+    """
+    width = max(img.width for _, img in pages)
+    height = sum(img.height + MARKER_HEIGHT for _, img in pages)
+    tile = Image.new("L", (width, height), 255)
+    y = 0
+    for page_no, img in pages:
+        tile.paste(_page_marker(page_no, width), (0, y))
+        tile.paste(img.convert("L"), (0, y + MARKER_HEIGHT))
+        y += MARKER_HEIGHT + img.height
+    return tile
+
+def _fits(batch, img):
+    width = max([img.width] + [p.width for _, p in batch])
+    height = sum(p.height + MARKER_HEIGHT for _, p in batch) + img.height + MARKER_HEIGHT
+    return height <= TILE_MAX_HEIGHT and width * height <= TILE_MAX_PIXELS
+
+def iter_page_batches(pages):
+    """
+    Groups an iterable of (page_no, image) into OCR batches, lazily.
+    Consecutive sparse pages share a batch while the stitched tile stays within
+    TILE_MAX_HEIGHT / TILE_MAX_PIXELS; dense pages always go alone.
+    """
+    batch = []
+    for page_no, img in pages:
+        if img.height > SPARSE_PAGE_HEIGHT:
+            if batch:
+                yield batch
+                batch = []
+            yield [(page_no, img)]
+            continue
+        if batch and not _fits(batch, img):
+            yield batch
+            batch = []
+        batch.append((page_no, img))
+    if batch:
+        yield batch
+
+class EncodedBatch(list):
+    """
+    An OCR batch ([(page_no, page), ...]) whose Vision image — the page, or
+    the stitched tile — is already JPEG-encoded in `jpeg` (see render_pool).
+    """
+
+    def __init__(self, pages, jpeg):
+        super().__init__(pages)
+        self.jpeg = jpeg
+
+def split_tile_markdown(text, page_numbers):
+    """
+    Splits a tile transcription back into {page_no: markdown} using the banners.
+    Text the model did not attribute to a page goes to the first page of the tile.
+    """
+    result = {page_no: "" for page_no in page_numbers}
+    matches = list(_MARKER_RE.finditer(text or ""))
+    lead = text[:matches[0].start()] if matches else (text or "")
+    result[page_numbers[0]] += lead.strip()
+    for i, match in enumerate(matches):
+        page_no = int(match.group(1))
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        body = text[match.end():end].strip()
+        target = page_no if page_no in result else page_numbers[0]
+        result[target] = f"{result[target]}\n{body}".strip()
+    return result
+
+def get_markdown_from_batch(batch, client):
+    """
+    OCRs a batch from iter_page_batches. A single page goes through
+    get_markdown_from_page as usual; several pages are stitched into one
+    tile, sent in one Vision call and split back per page.
+    Returns {page_no: markdown}.
+    """
+    encoded = isinstance(batch, EncodedBatch)
+    if len(batch) == 1:
+        page_no, img = batch[0]
+        return {page_no: get_markdown_from_page(batch.jpeg if encoded else img, client)}
+
+    page_numbers = [page_no for page_no, _ in batch]
+    print(f"[SCAN] Packing pages {page_numbers} into one Vision call")
+    tile = batch.jpeg if encoded else stitch_pages(batch)
+    text = get_markdown_from_page(tile, client, prompt=TILE_PROMPT,
+                                  max_tokens=min(1024 * len(batch), 4096))
+    return split_tile_markdown(text, page_numbers)
+
+async def aget_markdown_from_batch(batch, client):
+    """
+    get_markdown_from_batch for an async Groq client.
+    """
+    encoded = isinstance(batch, EncodedBatch)
+    if len(batch) == 1:
+        page_no, img = batch[0]
+        return {page_no: await aget_markdown_from_page(batch.jpeg if encoded else img, client)}
+
+    page_numbers = [page_no for page_no, _ in batch]
+    print(f"[SCAN] Packing pages {page_numbers} into one Vision call")
+    tile = batch.jpeg if encoded else await asyncio.to_thread(stitch_pages, batch)
+    text = await aget_markdown_from_page(tile, client, prompt=TILE_PROMPT,
+                                         max_tokens=min(1024 * len(batch), 4096))
+    return split_tile_markdown(text, page_numbers)
@@ -0,0 +1,243 @@
+"""
+Async report pipeline for the ASGI upload endpoint (/api/upload/async/).
+
+Same stages and results as pipeline.process_report, but Groq calls go
+through an async client, so a report waiting on the LLM holds no thread:
+- OCR batches are awaited concurrently (up to OCR_ASYNC_CONCURRENCY per
+  report) while the next pages render in a worker thread
+- plan generation runs alongside saving the extraction and linking the patient,
+  or starts even earlier from a local parse of the OCR text (SPECULATIVE_PLAN)
+- CPU work (rendering, JPEG encoding, response repair) runs in threads and DB
+  writes go through sync_to_async / Model.asave
+"""
+import asyncio
+import weakref
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from groq import AsyncGroq
+
+from .ai_utils import aget_markdown_from_batch, count_document_pages
+from .fakegroq import AsyncFakeGroq
+from .patients import record_report
+from .scheduler import astage_slot
+from .pipeline import (NEW_PLAN_FIELDS, build_patient_sections, build_report_response,
+                       keep_speculation, speculative_profile, start_new_plan)
+from .services import (MAX_PLAN_DAYS, MOCK_TEXT, TARGET_FIELDS, TEXT_MODELS,
+                       build_diet_prompt, build_multi_day_prompt, build_template_days,
+                       detect_report_fields,
+                       distribute_calories, extraction_failure_mock, extraction_messages,
+                       finalize_multi_day_plan, finish_extraction, finish_llm_generation,
+                       finish_multi_day_generation, get_best_mock_match, iter_ocr_batches,
+                       ocr_failure_mock, start_quick_answer_precompute)
+
+# The async client's connection pool belongs to the event loop that created it
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """Async Groq client (or AsyncFakeGroq when GROQ_FAKE is set) for the running loop."""
+    loop = asyncio.get_running_loop()
+    if loop not in _clients:
+        _clients[loop] = (AsyncFakeGroq.from_settings() if settings.GROQ_FAKE
+                          else AsyncGroq(api_key=settings.GROQ_API_KEY))
+    return _clients[loop]
+
+
+async def acall_groq_with_fallback(messages, response_format=None):
+    """call_groq_with_fallback over the async client."""
+    client = get_async_client()
+    last_error = None
+    for model in TEXT_MODELS:
+        try:
+            kwargs = {"model": model, "messages": messages}
+            if response_format:
+                kwargs["response_format"] = response_format
+            response = await client.chat.completions.create(**kwargs)
+            print(f"[OK] Groq API call succeeded with model: {model}")
+            return response
+        except Exception as e:
+            last_error = e
+            print(f"[WARN] Model {model} failed: {type(e).__name__}: {e}")
+    raise last_error
+
+
+async def aocr_document(file_path, progress, stats):
+    """
+    OCR every batch of the document, several Vision calls in flight at once.
+    Returns {page_no: markdown}. Stops rendering new pages once the local
+    detector has seen every target field (OCR_EARLY_EXIT).
+    """
+    client = get_async_client()
+    page_count = stats["pages"]
+    batches = iter_ocr_batches(file_path, stats)
+    slots = asyncio.Semaphore(max(1, settings.OCR_ASYNC_CONCURRENCY))
+    page_texts, found, tasks = {}, set(), []
+    last_page, exhausted = 0, False
+
+    async def read(batch):
+        try:
+            progress("ocr", page=batch[-1][0], pages=page_count)
+            async with astage_slot("ocr"):
+                batch_texts = await aget_markdown_from_batch(batch, client)
+            page_texts.update(batch_texts)
+            stats["pages_ocr"] += len(batch)
+            if settings.OCR_EARLY_EXIT:
+                for text in batch_texts.values():
+                    detect_report_fields(text, found)
+        except Exception as e:
+            print(f"[WARN] Page read error: {e}")
+            stats["pages_failed"] += len(batch)
+        finally:
+            slots.release()
+
+    try:
+        while True:
+            # Render at most OCR_ASYNC_CONCURRENCY batches ahead of the Vision calls
+            await slots.acquire()
+            if settings.OCR_EARLY_EXIT and found.issuperset(TARGET_FIELDS) and last_page < page_count:
+                slots.release()
+                break
+            batch = await asyncio.to_thread(next, batches, None)
+            if batch is None:
+                slots.release()
+                exhausted = True
+                break
+            last_page = batch[-1][0]
+            tasks.append(asyncio.create_task(read(batch)))
+        await asyncio.gather(*tasks)
+    finally:
+        # Early exit, an error or cancellation: stop rendering, free pages already rendered
+        try:
+            batches.close()
+        except ValueError:
+            # Cancelled while a render thread is still inside the generator;
+            # it is closed when that thread lets go of it
+            pass
+
+    if not exhausted:
+        stats["early_exit"] = True
+        stats["pages_skipped"] = max(
+            page_count - stats["pages_ocr"] - stats["pages_blank"] - stats["pages_failed"], 0)
+        print(f"[SCAN] All target fields found — skipped {stats['pages_skipped']} pages")
+    return page_texts
+
+
+async def aextract_medical_data(file_path, progress=None, stats=None, on_text=None):
+    """extract_medical_data with concurrent OCR and an awaited extraction call."""
+    progress = progress or (lambda stage, **info: None)
+    stats = {} if stats is None else stats
+    print(f"[VIEW] PROCESSING FILE (async): {file_path}")
+
+    full_text = ""
+    try:
+        progress("rendering")
+        page_count = await asyncio.to_thread(count_document_pages, file_path)
+        stats.update(pages=page_count, pages_ocr=0, pages_blank=0, pages_failed=0,
+                     pages_skipped=0, early_exit=False)
+        page_texts = await aocr_document(file_path, progress, stats)
+        print(f"[PERF] OCR pages: {stats['pages_ocr']} read, {stats['pages_blank']} blank, "
+              f"{stats['pages_skipped']} skipped of {page_count}")
+        for page_no in sorted(page_texts):
+            full_text += f"\n--- PAGE {page_no} ---\n{page_texts[page_no]}"
+        if not full_text:
+            raise Exception("No text extracted")
+    except Exception as e:
+        print(f"[ERROR] OCR FAILED: {e}")
+        return ocr_failure_mock(), MOCK_TEXT
+
+    if on_text:
+        on_text(full_text)
+    progress("extraction")
+    try:
+        async with astage_slot("extraction"):
+            response = await acall_groq_with_fallback(extraction_messages(full_text),
+                                                      response_format={"type": "json_object"})
+        return finish_extraction(response.choices[0].message.content, full_text), full_text
+    except Exception as e:
+        print(f"[ERROR] EXTRACTION FAILED: {e}")
+        return extraction_failure_mock(), MOCK_TEXT
+
+
+async def agenerate_diet_plan(structured_data, diet_type="Balanced", age=25, days=1):
+    """
+    generate_diet_plan with the LLM call awaited. Repair (which may make one
+    field-fix call) runs in a thread; fallbacks are the same templates.
+    """
+    days = max(1, min(int(days or 1), MAX_PLAN_DAYS))
+    if days > 1:
+        prompt, context = build_multi_day_prompt(structured_data, diet_type, age, days)
+        finish = partial(finish_multi_day_generation, context=context, days=days)
+    else:
+        prompt, context = build_diet_prompt(structured_data, diet_type, age)
+        finish = partial(finish_llm_generation, context=context, age=age)
+
+    plan = None
+    try:
+        async with astage_slot("plan"):
+            response = await acall_groq_with_fallback([{"role": "user", "content": prompt}],
+                                                      response_format={"type": "json_object"})
+        plan = await asyncio.to_thread(finish, response.choices[0].message.content)
+    except Exception as e:
+        print(f"[ERROR] LLM GENERATION FAILED: {type(e).__name__}: {str(e)}")
+
+    if days > 1:
+        if plan:
+            return {"plan": finalize_multi_day_plan(plan, age), "source": "AI"}
+        print(f"[WARN] LLM FAILED - FILLING {days} DAYS FROM TEMPLATES")
+        return {"plan": finalize_multi_day_plan(build_template_days(structured_data, diet_type, days), age),
+                "source": "Template"}
+    if plan:
+        return {"plan": plan, "source": "AI"}
+    print(f"[WARN] LLM FAILED - FALLING BACK TO MOCK DATA")
+    return {"plan": distribute_calories(get_best_mock_match(structured_data, diet_type), age),
+            "source": "Template"}
+
+
+async def _asave_extraction(report, full_text):
+    await report.asave(update_fields=["extracted_data", "diet_type", "age"])
+    # Link to the patient and update their lab history / summary; mock
+    # profiles (OCR or extraction failed) are not the patient's values
+    if full_text != MOCK_TEXT:
+        await sync_to_async(record_report)(report)
+
+
+async def aprocess_report(report, diet_type="Balanced", age=25, progress=None, days=1):
+    """process_report for the async upload view. Returns the same response dict."""
+    progress = progress or (lambda stage, **info: None)
+    ocr_stats = {}
+    speculation = {}
+
+    def start_speculation(full_text):
+        predicted = speculative_profile(full_text)
+        if predicted:
+            speculation.update(profile=predicted, task=asyncio.create_task(
+                agenerate_diet_plan(predicted, diet_type, age, days)))
+
+    extracted, full_text = await aextract_medical_data(
+        report.report_file.path, progress, ocr_stats,
+        on_text=start_speculation if settings.SPECULATIVE_PLAN else None)
+
+    progress("plan", partial=build_patient_sections(extracted, age))
+    report.extracted_data = extracted
+    report.diet_type = diet_type
+    report.age = age
+    if speculation and keep_speculation(speculation["profile"], extracted):
+        plan = speculation["task"]
+    else:
+        if speculation:
+            speculation["task"].cancel()
+        plan = agenerate_diet_plan(extracted, diet_type, age, days)
+    # The plan and the patient history both depend only on the extracted data
+    result, _ = await asyncio.gather(plan, _asave_extraction(report, full_text))
+
+    report.diet_plan = result.get("plan", result)
+    report.plan_source = result.get("source", "Unknown")
+    start_new_plan(report)
+    await report.asave(update_fields=["diet_plan", "plan_source", *NEW_PLAN_FIELDS])
+    await report.arefresh_from_db(fields=["plan_version"])
+
+    # Pre-generate quick-start chat answers in the background
+    start_quick_answer_precompute(report, extracted, report.diet_plan)
+    return build_report_response(report, age, full_text, ocr_stats)
@@ -0,0 +1,582 @@
+"""
+Dr. AI Chatbot — Direct Groq API chatbot for AI-NutriCare, served by /api/chat/.
+No LangChain / ChromaDB / sentence-transformers needed.
+Just the Groq SDK + a small in-memory BM25 index over the user's diet plan,
+past reports and a built-in nutrition knowledge base.
+
+Conversation state lives in Django's cache (see ChatSessionStore), so any
+backend worker can serve any turn of a conversation.
+"""
+
+import os
+import re
+import math
+import time
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Any, Iterator, List, Optional
+from django.conf import settings
+from django.core.cache import cache
+from .locks import cache_lock
+
+
+# --- Built-in nutrition knowledge base (retrieved alongside the plan) ---
+NUTRITION_KNOWLEDGE = [
+    ("Blood sugar basics",
+     "Fasting blood sugar of 70-100 mg/dL is normal, 100-125 mg/dL is prediabetic "
+     "and 126 mg/dL or above suggests diabetes. Fiber, whole grains and lean protein "
+     "slow glucose absorption; sugary drinks, white rice and refined flour spike it."),
+    ("Glycemic index",
+     "Low glycemic index foods such as oats, lentils, beans, most vegetables and "
+     "whole fruits release sugar slowly. Pairing carbohydrates with protein or "
+     "healthy fat lowers the glucose response of a meal."),
+    ("Cholesterol basics",
+     "Total cholesterol below 200 mg/dL is desirable, 200-239 mg/dL is borderline "
+     "high and 240 mg/dL or above is high. Saturated fat (butter, ghee, red meat, "
+     "fried food) raises LDL; soluble fiber, nuts, olive oil and oily fish help lower it."),
+    ("Hemoglobin and iron",
+     "Normal hemoglobin is about 12-17 g/dL. Low hemoglobin often points to iron "
+     "deficiency. Iron-rich foods include spinach, lentils, chickpeas, jaggery, eggs "
+     "and lean meat; vitamin C (lemon, amla, oranges) improves iron absorption, tea "
+     "with meals reduces it."),
+    ("Protein and albumin",
+     "Normal total protein is 6.0-8.3 g/dL and albumin 3.5-5.5 g/dL. Low values can "
+     "reflect poor protein intake. Good protein sources are dal, paneer, tofu, curd, "
+     "eggs, chicken and fish."),
+    ("BMI ranges",
+     "BMI below 18.5 is underweight, 18.5-24.9 is normal, 25-29.9 is overweight and "
+     "30 or above is obese. Weight loss needs a moderate calorie deficit, not skipped meals."),
+    ("Calorie distribution",
+     "Plans split daily calories roughly 25% breakfast, 40% lunch and 35% dinner. "
+     "Daily targets depend on age: younger adults need more energy, older adults less."),
+    ("Meal swaps",
+     "Good swaps and meal alternatives keep calories and the dietary goal the same: "
+     "brown rice or millets for white rice, roti for paratha, grilled for fried, "
+     "curd or buttermilk for sweetened drinks, fruit for dessert."),
+    ("Vegetarian protein",
+     "Vegetarian plans get complete protein by combining grains with legumes "
+     "(rice with dal, roti with chana), and from paneer, tofu, soy, curd and nuts."),
+    ("Hydration",
+     "Most adults need about 2-3 litres of fluids a day. Water, buttermilk and "
+     "unsweetened tea are good choices; limit sugary and packaged juices."),
+    ("Sodium and blood pressure",
+     "Keep salt under about 5 g a day. Pickles, papad, chips and processed foods are "
+     "high in sodium; fresh vegetables, fruit and potassium-rich foods help balance it."),
+]
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or "
+    "should the this to what when which why with you your".split()
+)
+
+
+def _tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def build_context_chunks(data: Dict[str, Any],
+                         past_reports: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, str]]:
+    """
+    Split the API response (plus any past reports) into small retrievable chunks.
+    Each chunk is a {"source": ..., "text": ...} dict.
+    """
+    chunks = []
+
+    if "patient_info" in data:
+        p = data["patient_info"]
+        chunks.append({
+            "source": "Patient information",
+            "text": f"Name: {p.get('name', 'N/A')}, Age: {p.get('age', 'N/A')}, "
+                    f"Gender: {p.get('gender', 'N/A')}",
+        })
+
+    if "medical_data" in data:
+        m = data["medical_data"]
+        values = []
+        for key in ("blood_sugar", "cholesterol", "bmi", "hemoglobin",
+                     "total_protein", "albumin"):
+            label = key.replace("_", " ").title()
+            values.append(f"{label}: {m.get(key, 'N/A')}")
+        chunks.append({"source": "Medical data (lab values)", "text": "; ".join(values)})
+        findings = m.get("abnormal_findings", [])
+        if findings:
+            chunks.append({
+                "source": "Abnormal findings",
+                "text": "Abnormal findings and health conditions: " + ", ".join(findings),
+            })
+
+    if "diet_plan" in data:
+        d = data["diet_plan"]
+        for meal in ("breakfast", "lunch", "dinner"):
+            if meal not in d:
+                continue
+            info = d[meal]
+            if isinstance(info, dict):
+                items = ", ".join(info.get("food_items", []))
+                text = (f"{meal.title()} meal food items: {items}. "
+                        f"{meal.title()} calories: {info.get('total_calories', 'N/A')}")
+            else:
+                text = f"{meal.title()} meal: {info}"
+            chunks.append({"source": f"Diet plan - {meal.title()}", "text": text})
+        # Multi-day plans: day 1 is mirrored above, later days get one chunk each
+        for day_no, day in enumerate(d.get("days", [])[1:], start=2):
+            meals = "; ".join(
+                f"{meal.title()}: {', '.join(day[meal].get('food_items', []))}"
+                for meal in ("breakfast", "lunch", "dinner") if isinstance(day.get(meal), dict)
+            )
+            chunks.append({"source": f"Diet plan - Day {day_no}", "text": f"Day {day_no} meals. {meals}"})
+        if "doctor_note" in d:
+            note = d["doctor_note"]
+            if "plan_source" in data:
+                note += f" (Plan source: {data['plan_source']})"
+            chunks.append({
+                "source": "Doctor's note (why this diet)",
+                "text": f"Doctor's note and reason for this diet: {note}",
+            })
+
+    for i, report in enumerate(past_reports or [], start=1):
+        when = report.get("created_at", f"#{i}")
+        values = "; ".join(
+            f"{k.replace('_', ' ').title()}: {v}"
+            for k, v in report.items()
+            if k not in ("created_at", "patient_name") and v not in (None, "", "N/A", [])
+        )
+        if values:
+            chunks.append({"source": f"Past report ({when})", "text": values})
+
+    for title, text in NUTRITION_KNOWLEDGE:
+        chunks.append({"source": f"Nutrition knowledge - {title}", "text": text})
+
+    return chunks
+
+
+class BM25Index:
+    """Tiny in-memory Okapi BM25 index over context chunks."""
+
+    def __init__(self, chunks: List[Dict[str, str]], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.doc_tokens = [_tokenize(c["source"] + " " + c["text"]) for c in chunks]
+        self.term_freqs = [Counter(toks) for toks in self.doc_tokens]
+        self.avg_len = (sum(len(t) for t in self.doc_tokens) / len(chunks)) if chunks else 0.0
+        doc_freq = Counter()
+        for tf in self.term_freqs:
+            doc_freq.update(tf.keys())
+        n = len(chunks)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, str]]:
+        """Return the top_k chunks for the query, in original (document) order."""
+        terms = _tokenize(query)
+        scores = []
+        for idx, tf in enumerate(self.term_freqs):
+            doc_len = len(self.doc_tokens[idx])
+            score = 0.0
+            for term in terms:
+                freq = tf.get(term)
+                if not freq:
+                    continue
+                norm = freq + self.k1 * (1 - self.b + self.b * doc_len / (self.avg_len or 1))
+                score += self.idf[term] * freq * (self.k1 + 1) / norm
+            if score > 0:
+                scores.append((score, idx))
+
+        if not scores:
+            # Nothing matched (e.g. "hi") — fall back to the plan overview chunks
+            return self.chunks[:top_k]
+
+        best = sorted(scores, reverse=True)[:top_k]
+        return [self.chunks[idx] for _, idx in sorted(best, key=lambda s: s[1])]
+
+
+def format_chunks(chunks: List[Dict[str, str]]) -> str:
+    return "\n\n".join(f"[{c['source']}]\n{c['text']}" for c in chunks)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) — good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a patient and Dr. AI, a dietitian assistant.
+
+Update the summary with the new messages below. Keep every fact that matters for later questions: foods the patient likes or dislikes, allergies, swaps already suggested, goals, and questions already answered. Write at most 150 words of plain text. Return ONLY the updated summary.
+
+CURRENT SUMMARY:
+{summary}
+
+NEW MESSAGES:
+{messages}
+"""
+
+
+HISTORY_LOCK_TIMEOUT = 5  # seconds
+
+
+class ChatSessionStore:
+    """
+    Server-side chat state in Django's cache, evicted after CHAT_SESSION_TTL
+    seconds of inactivity. History and summary are stored under separate keys
+    so the background summarizer never overwrites freshly appended turns.
+    """
+
+    def __init__(self, ttl: Optional[int] = None):
+        self.ttl = ttl or settings.CHAT_SESSION_TTL
+
+    @staticmethod
+    def _key(report_id: int, session_id: str, part: str) -> str:
+        return f"chat:{report_id}:{session_id}:{part}"
+
+    def get_history(self, report_id: int, session_id: str) -> List[Dict[str, str]]:
+        return cache.get(self._key(report_id, session_id, "history"), [])
+
+    def set_history(self, report_id: int, session_id: str, history: List[Dict[str, str]]) -> None:
+        cache.set(self._key(report_id, session_id, "history"), history, self.ttl)
+
+    def append_history(self, report_id: int, session_id: str, messages: List[Dict[str, str]]) -> None:
+        """
+        Append to the stored history under a per-session lock, re-reading it
+        first, so two turns finishing at once both keep their messages.
+        """
+        with cache_lock(self._key(report_id, session_id, "lock"), HISTORY_LOCK_TIMEOUT):
+            history = self.get_history(report_id, session_id)
+            self.set_history(report_id, session_id, history + messages)
+
+    def get_summary(self, report_id: int, session_id: str) -> Dict[str, Any]:
+        return cache.get(self._key(report_id, session_id, "summary"),
+                         {"summary": "", "summarized_upto": 0})
+
+    def set_summary(self, report_id: int, session_id: str, state: Dict[str, Any]) -> None:
+        cache.set(self._key(report_id, session_id, "summary"), state, self.ttl)
+
+    def clear(self, report_id: int, session_id: str) -> None:
+        cache.delete_many([self._key(report_id, session_id, part)
+                           for part in ("history", "summary")])
+
+
+class ConversationMemory:
+    """
+    Rolling conversation memory: older turns are folded into a running summary
+    in a background thread, recent turns are kept verbatim, and the prompt is
+    trimmed to stay under a token ceiling. Summary state is kept in the
+    ChatSessionStore under (report_id, session_id).
+    """
+
+    # Sessions with a summarization currently running in this process
+    _in_flight = set()
+    _in_flight_lock = threading.Lock()
+
+    def __init__(self, client, store: ChatSessionStore, report_id: int, session_id: str,
+                 keep_recent: Optional[int] = None,
+                 max_prompt_tokens: Optional[int] = None,
+                 summary_model: str = "llama-3.1-8b-instant"):
+        self.client = client
+        self.store = store
+        self.report_id = report_id
+        self.session_id = session_id
+        self.keep_recent = keep_recent or int(os.getenv("DRAI_RECENT_MESSAGES", "6"))
+        self.max_prompt_tokens = max_prompt_tokens or int(os.getenv("DRAI_MAX_PROMPT_TOKENS", "3000"))
+        self.summary_model = summary_model
+
+    def _load(self) -> Dict[str, Any]:
+        return self.store.get_summary(self.report_id, self.session_id)
+
+    def build_messages(self, system_message: str, history: List[Dict[str, str]],
+                       user_message: str) -> List[Dict[str, str]]:
+        """Assemble system prompt + summary + as many recent turns as the budget allows."""
+        state = self._load()
+        summary, upto = state["summary"], state["summarized_upto"]
+        if upto > len(history):
+            # History was reset — the old summary no longer applies
+            summary, upto = "", 0
+
+        messages = [{"role": "system", "content": system_message}]
+        if summary:
+            messages.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{summary}",
+            })
+
+        budget = self.max_prompt_tokens - sum(estimate_tokens(m["content"]) for m in messages)
+        budget -= estimate_tokens(user_message)
+
+        # Walk back from the newest turn; anything not yet summarized is still
+        # eligible, but the ceiling always wins.
+        recent = []
+        for msg in reversed(history[upto:]):
+            cost = estimate_tokens(msg["content"])
+            if cost > budget:
+                break
+            recent.append({"role": msg["role"], "content": msg["content"]})
+            budget -= cost
+        messages.extend(reversed(recent))
+
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    def compact_async(self, history: List[Dict[str, str]]) -> None:
+        """Fold turns older than the verbatim window into the summary, off the request path."""
+        if len(history) - self._load()["summarized_upto"] <= self.keep_recent:
+            return
+        key = (self.report_id, self.session_id)
+        with self._in_flight_lock:
+            if key in self._in_flight:
+                return  # the next reply will pick up whatever this run misses
+            self._in_flight.add(key)
+        threading.Thread(target=self._compact, args=(list(history),), daemon=True).start()
+
+    def _compact(self, history: List[Dict[str, str]]) -> None:
+        try:
+            state = self._load()
+            summary, upto = state["summary"], state["summarized_upto"]
+            if upto > len(history):
+                summary, upto = "", 0
+            target = len(history) - self.keep_recent
+            overflow = history[upto:target]
+            if not overflow:
+                return
+
+            transcript = "\n".join(f"{m['role'].upper()}: {m['content']}" for m in overflow)
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.summary_model,
+                    messages=[{
+                        "role": "user",
+                        "content": SUMMARY_PROMPT.format(summary=summary or "(empty)",
+                                                         messages=transcript),
+                    }],
+                    temperature=0,
+                    max_tokens=300,
+                )
+                new_summary = response.choices[0].message.content.strip()
+            except Exception as e:
+                print(f"[WARN] Conversation summary failed: {e}")
+                return
+
+            self.store.set_summary(self.report_id, self.session_id,
+                                   {"summary": new_summary, "summarized_upto": target})
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.discard((self.report_id, self.session_id))
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation and stopwords: 'What should I eat for breakfast?' -> 'eat breakfast'."""
+    return " ".join(_tokenize(question))
+
+
+class AnswerCache:
+    """
+    Process-wide LRU cache of chatbot answers, keyed by the normalized question
+    plus a hash of the plan context retrieved for it. Near-duplicate questions
+    (token Jaccard similarity >= threshold) against the same context also hit.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[int] = None,
+                 similarity: float = 0.8):
+        self.max_entries = max_entries or int(os.getenv("DRAI_ANSWER_CACHE_SIZE", "1024"))
+        self.ttl_seconds = ttl_seconds or int(os.getenv("DRAI_ANSWER_CACHE_TTL", "86400"))
+        self.similarity = similarity
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (answer, stored_at)
+        self._by_context: Dict[str, set] = {}  # context hash -> normalized questions
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def context_hash(context: str) -> str:
+        return hashlib.sha256(context.encode("utf-8")).hexdigest()[:16]
+
+    def get(self, question: str, context_hash: str) -> Optional[str]:
+        normalized = normalize_question(question)
+        with self._lock:
+            key = self._lookup(normalized, context_hash)
+            if key is None:
+                self.misses += 1
+                return None
+            answer, stored_at = self._entries[key]
+            if time.time() - stored_at > self.ttl_seconds:
+                self._evict(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return answer
+
+    def put(self, question: str, context_hash: str, answer: str) -> None:
+        key = (context_hash, normalize_question(question))
+        with self._lock:
+            self._entries[key] = (answer, time.time())
+            self._entries.move_to_end(key)
+            self._by_context.setdefault(context_hash, set()).add(key[1])
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+
+    def _lookup(self, normalized: str, context_hash: str) -> Optional[tuple]:
+        if (context_hash, normalized) in self._entries:
+            return (context_hash, normalized)
+        tokens = set(normalized.split())
+        if not tokens:
+            return None
+        best, best_score = None, self.similarity
+        for candidate in self._by_context.get(context_hash, ()):
+            other = set(candidate.split())
+            score = len(tokens & other) / len(tokens | other)
+            if score >= best_score:
+                best, best_score = (context_hash, candidate), score
+        return best
+
+    def _evict(self, key: tuple) -> None:
+        del self._entries[key]
+        questions = self._by_context.get(key[0])
+        if questions is not None:
+            questions.discard(key[1])
+            if not questions:
+                del self._by_context[key[0]]
+
+
+# Shared by every chat session served by this worker process
+ANSWER_CACHE = AnswerCache()
+
+
+SYSTEM_PROMPT = """You are Dr. AI, a friendly and knowledgeable dietitian assistant for the AI-NutriCare app.
+
+Below are the excerpts from the patient's diet plan, medical data and nutrition notes that are most relevant to their latest question. Use them to answer accurately.
+
+RULES:
+1. Answer based on the context provided. Reference specific foods, calories, and medical values when relevant.
+2. If asked for meal alternatives, suggest foods that match the same calorie range and dietary goal.
+3. If the question is unrelated to diet/nutrition/health, politely redirect: "I specialize in nutrition and diet advice. How can I help with your meal plan?"
+4. Be warm, encouraging, and concise. Use bullet points for lists.
+5. When discussing medical values, explain what they mean in simple terms.
+6. Never diagnose conditions — only provide dietary guidance.
+7. If the excerpts don't cover the question, say so rather than guessing values.
+
+RELEVANT CONTEXT:
+{context}
+"""
+
+
+class DrAIChatbot:
+    """Groq-powered chatbot that retrieves only the relevant plan context per question."""
+
+    def __init__(self, diet_plan_data: Dict[str, Any], client,
+                 memory: ConversationMemory,
+                 past_reports: Optional[List[Dict[str, Any]]] = None,
+                 top_k: int = 5):
+        self.client = client
+        self.memory = memory
+        self.index = BM25Index(build_context_chunks(diet_plan_data, past_reports))
+        self.top_k = top_k
+        # Model list with fallback
+        self.models = ["llama-3.3-70b-versatile", "llama-3.1-8b-instant"]
+
+    def retrieve_context(self, user_message: str) -> str:
+        """Formatted top-k chunks relevant to this question."""
+        return format_chunks(self.index.search(user_message, top_k=self.top_k))
+
+    def chat_stream(self, user_message: str, history: List[Dict[str, str]]) -> Iterator[str]:
+        """
+        Send a message and stream the response.
+
+        Args:
+            user_message: The user's question.
+            history: List of {"role": "user"|"assistant", "content": "..."} dicts.
+
+        Yields:
+            Pieces of the assistant's reply as they arrive.
+        """
+        context = self.retrieve_context(user_message)
+
+        # Opening questions don't depend on earlier turns, so they can be
+        # answered from the shared cache (quick-start buttons hit this path).
+        cache_key = AnswerCache.context_hash(context) if not history else None
+        if cache_key:
+            cached = ANSWER_CACHE.get(user_message, cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        messages = self.memory.build_messages(
+            SYSTEM_PROMPT.format(context=context), history, user_message
+        )
+
+        # Try models with fallback
+        last_error = None
+        for model in self.models:
+            parts = []
+            try:
+                stream = self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=0.4,
+                    max_tokens=1024,
+                    stream=True,
+                )
+                for chunk in stream:
+                    delta = chunk.choices[0].delta.content or ""
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+            except Exception as e:
+                last_error = e
+                if parts:
+                    # Can't restart on another model once text has been sent
+                    yield f"\n\n_(response interrupted: {e})_"
+                    return
+                continue
+
+            reply = "".join(parts)
+            if cache_key:
+                ANSWER_CACHE.put(user_message, cache_key, reply)
+            self.memory.compact_async(history + [
+                {"role": "user", "content": user_message},
+                {"role": "assistant", "content": reply},
+            ])
+            return
+
+        yield f"Sorry, I'm having trouble connecting right now. Error: {last_error}"
+
+    def chat(self, user_message: str, history: List[Dict[str, str]]) -> str:
+        """Non-streaming variant of chat_stream; returns the full reply."""
+        return "".join(self.chat_stream(user_message, history))
+
+
+SESSION_STORE = ChatSessionStore()
+
+
+def chat_turn(report_data: Dict[str, Any], report_id: int, session_id: str,
+              user_message: str, quick_answers: Optional[Dict[str, str]] = None,
+              past_reports: Optional[List[Dict[str, Any]]] = None) -> Iterator[str]:
+    """
+    Run one conversation turn for (report_id, session_id): stream the reply,
+    then append both messages to the server-side history. Opening questions
+    with a pre-generated quick answer are served without an LLM call.
+    `past_reports` (the patient's earlier results) are added to retrieval.
+    """
+    from .services import client  # shared Groq client / connection pool
+
+    history = SESSION_STORE.get_history(report_id, session_id)
+    quick_answer = (quick_answers or {}).get(user_message) if not history else None
+
+    parts = []
+    if quick_answer:
+        parts.append(quick_answer)
+        yield quick_answer
+    else:
+        memory = ConversationMemory(client, SESSION_STORE, report_id, session_id)
+        bot = DrAIChatbot(report_data, client, memory, past_reports=past_reports)
+        for piece in bot.chat_stream(user_message, history):
+            parts.append(piece)
+            yield piece
+
+    SESSION_STORE.append_history(report_id, session_id, [
+        {"role": "user", "content": user_message},
+        {"role": "assistant", "content": "".join(parts)},
+    ])
@@ -0,0 +1,312 @@
+"""
+Offline stand-in for the Groq client, for load tests and benchmarks.
+
+FakeGroq answers chat.completions.create() from recorded responses, with a
+configurable latency distribution and error rate, so the whole pipeline can
+be driven at any concurrency without spending Groq quota. RecordingGroq wraps
+the real client and saves what it returns in the same format, so recordings
+can be refreshed from live traffic.
+
+Recordings are a JSON object of {kind: [response text, ...]}. The kind comes
+from the request (see request_kind); each kind replays its responses in turn.
+Kinds without a recording use the built-in DEFAULT_RECORDINGS. A request no
+kind matches (a new prompt) fails loudly instead of getting another kind's reply.
+"""
+import asyncio
+import atexit
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from types import SimpleNamespace as NS
+
+# Median latency (ms) and lognormal sigma per kind, roughly what Groq shows
+# for these prompts. Streaming kinds spread the latency over their chunks.
+DEFAULT_LATENCY = {
+    "ocr": (1800, 0.35),
+    "extraction": (900, 0.3),
+    "diet_plan": (1500, 0.3),
+    "multi_day_plan": (3500, 0.3),
+    "field_fix": (500, 0.3),
+    "quick_answers": (2000, 0.3),
+    "chat": (700, 0.4),
+    "summary": (400, 0.3),
+}
+
+_DAY = {
+    "breakfast": {"food_items": ["1 cup oats with skimmed milk", "10 almonds", "1 apple"],
+                  "total_calories": "450 kcal"},
+    "lunch": {"food_items": ["2 multigrain rotis", "1 cup dal", "1 cup mixed vegetable sabzi", "1 cup salad"],
+              "total_calories": "700 kcal"},
+    "dinner": {"food_items": ["150g grilled paneer", "1 cup brown rice", "1 bowl vegetable soup"],
+               "total_calories": "600 kcal"},
+}
+
+DEFAULT_RECORDINGS = {
+    "ocr": [
+        "# City Diagnostics Laboratory\nPatient Name: Rahul Sharma\nAge/Sex: 45 Y / M\n\n"
+        "| Test | Result | Reference |\n|---|---|---|\n"
+        "| Fasting Blood Sugar | 182 mg/dL | 70-100 |\n| Total Cholesterol | 245 mg/dL | <200 |\n"
+        "| Hemoglobin | 11.2 g/dL | 12-17 |\n| Total Protein | 6.4 g/dL | 6.0-8.3 |\n"
+        "| Serum Albumin | 3.9 g/dL | 3.5-5.5 |\n| BMI | 27.1 | 18.5-24.9 |",
+    ],
+    "extraction": [json.dumps({
+        "patient_name": "Rahul Sharma", "age": "45", "gender": "Male",
+        "blood_sugar": "182 mg/dL", "cholesterol": "245 mg/dL", "bmi": "27.1",
+        "hemoglobin": "11.2 g/dL", "total_protein": "6.4 g/dL", "albumin": "3.9 g/dL",
+        "abnormal_findings": ["High fasting blood sugar", "High cholesterol", "Low hemoglobin"],
+    })],
+    "diet_plan": [json.dumps({**_DAY, "doctor_note": "Blood sugar of 182 mg/dL and cholesterol of "
+                              "245 mg/dL call for low-glycemic, high-fibre meals."})],
+    "multi_day_plan": [json.dumps({"days": [{**_DAY, "day_calories": 1750}],
+                                   "doctor_note": "Rotate protein sources across the week."})],
+    "field_fix": [json.dumps({"fixes": {}})],
+    "quick_answers": [json.dumps({"answers": {
+        str(i): "- Prefer whole grains and vegetables\n- Limit refined sugar" for i in range(1, 5)}})],
+    "chat": ["Based on your plan, keep breakfast high in fibre: oats with skimmed milk and a few "
+             "almonds keep your blood sugar steadier through the morning."],
+    "summary": ["The patient asked about breakfast options and sugar control."],
+}
+
+
+UNKNOWN_KIND = "unknown"
+
+
+class FakeGroqError(RuntimeError):
+    """Injected failure, raised like a Groq API error would be."""
+
+
+def request_kind(messages, stream=False):
+    """
+    Which recorded response list a chat.completions request is answered from,
+    or UNKNOWN_KIND for a prompt this module does not know yet.
+    """
+    content = messages[-1]["content"] if messages else ""
+    if stream:
+        return "chat"
+    if isinstance(content, list):
+        return "ocr"
+    if "Medical Data Extraction" in content:
+        return "extraction"
+    if "You produced this JSON" in content:
+        return "field_fix"
+    if re.search(r"\d+-day meal plan", content):
+        return "multi_day_plan"
+    if "nutrition expert" in content:
+        return "diet_plan"
+    if '"answers"' in content:
+        return "quick_answers"
+    if "running summary of a conversation" in content:
+        return "summary"
+    return UNKNOWN_KIND
+
+
+def load_recordings(path):
+    """Recordings file merged over DEFAULT_RECORDINGS."""
+    recordings = {kind: list(texts) for kind, texts in DEFAULT_RECORDINGS.items()}
+    if path:
+        with open(path, encoding="utf-8") as f:
+            recordings.update({kind: texts for kind, texts in json.load(f).items() if texts})
+    return recordings
+
+
+def _fit_days(text, messages):
+    """Cycle a recorded multi-day plan's days to the length the prompt asks for."""
+    wanted = int(re.search(r"(\d+)-day meal plan", messages[-1]["content"]).group(1))
+    plan = json.loads(text)
+    days = plan.get("days") or []
+    if days and len(days) != wanted:
+        plan["days"] = [days[i % len(days)] for i in range(wanted)]
+    return json.dumps(plan)
+
+
+class _Completions:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def create(self, messages, stream=False, **kwargs):
+        return self._fake.complete(messages, stream=stream)
+
+
+class FakeGroq:
+    """
+    Drop-in for groq.Groq in this app: client.chat.completions.create(...).
+
+    latency_scale multiplies every sampled latency (0 = no sleeping);
+    error_rate is the probability that a call raises FakeGroqError;
+    capacity, when set, caps concurrent (sync) calls like a shared account
+    quota would: extra calls queue until one finishes.
+    Sampling uses one seeded RNG, so a single-threaded run is reproducible.
+    """
+
+    def __init__(self, recordings=None, latency=None, latency_scale=1.0, error_rate=0.0,
+                 seed=0, stream_chunks=8, capacity=0):
+        self.recordings = recordings or load_recordings(None)
+        self.latency = {**DEFAULT_LATENCY, **(latency or {})}
+        self.latency_scale = latency_scale
+        self.error_rate = error_rate
+        self.stream_chunks = stream_chunks
+        self.chat = NS(completions=_Completions(self))
+        self.calls = Counter()
+        self.errors = Counter()
+        self._rng = random.Random(seed)
+        self._cursor = Counter()
+        self._scripted = defaultdict(deque)
+        self._lock = threading.Lock()
+        self._capacity = threading.BoundedSemaphore(capacity) if capacity else None
+
+    @classmethod
+    def from_settings(cls):
+        from django.conf import settings
+        return cls(recordings=load_recordings(settings.GROQ_FAKE_RECORDINGS),
+                   latency_scale=settings.GROQ_FAKE_LATENCY_SCALE,
+                   error_rate=settings.GROQ_FAKE_ERROR_RATE)
+
+    def script(self, kind, texts):
+        """
+        Answer the next calls of `kind` with `texts`, in order, before falling
+        back to the recordings. Replaces anything still scripted for that kind.
+        """
+        with self._lock:
+            self._scripted[kind] = deque(texts)
+
+    def _draw(self, kind, messages):
+        """(latency seconds, fail?, response text) for one call, under the lock."""
+        if kind == UNKNOWN_KIND:
+            content = str(messages[-1]["content"] if messages else "")[:80]
+            print(f"[WARN] FakeGroq has no recording kind for this request: {content!r}")
+            raise FakeGroqError("unrecognised request: add its kind to fakegroq.request_kind")
+        with self._lock:
+            self.calls[kind] += 1
+            median_ms, sigma = self.latency.get(kind, DEFAULT_LATENCY["summary"])
+            seconds = median_ms / 1000 * self._rng.lognormvariate(0, sigma) * self.latency_scale
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.errors[kind] += 1
+            if self._scripted[kind]:
+                return seconds, fail, self._scripted[kind].popleft()
+            texts = self.recordings.get(kind) or DEFAULT_RECORDINGS[kind]
+            text = texts[self._cursor[kind] % len(texts)]
+            self._cursor[kind] += 1
+        return seconds, fail, text
+
+    def complete(self, messages, stream=False):
+        if self._capacity is None or stream:
+            return self._complete(messages, stream)
+        with self._capacity:
+            return self._complete(messages, stream)
+
+    def _complete(self, messages, stream=False):
+        kind = request_kind(messages, stream)
+        seconds, fail, text = self._draw(kind, messages)
+        if kind == "multi_day_plan":
+            text = _fit_days(text, messages)
+        if fail:
+            # Failures surface after part of the round trip, like a timeout or 5xx
+            time.sleep(seconds / 2)
+            raise FakeGroqError(f"injected {kind} failure")
+        if stream:
+            return self._stream(text, seconds)
+        time.sleep(seconds)
+        return NS(choices=[NS(message=NS(content=text))])
+
+    def _stream(self, text, seconds):
+        words = text.split(" ")
+        size = max(1, -(-len(words) // self.stream_chunks))
+        for i in range(0, len(words), size):
+            time.sleep(seconds / self.stream_chunks)
+            piece = " ".join(words[i:i + size]) + (" " if i + size < len(words) else "")
+            yield NS(choices=[NS(delta=NS(content=piece))])
+
+
+class _AsyncCompletions:
+    def __init__(self, fake):
+        self._fake = fake
+
+    async def create(self, messages, stream=False, **kwargs):
+        return await self._fake.acomplete(messages, stream=stream)
+
+
+class AsyncFakeGroq(FakeGroq):
+    """Drop-in for groq.AsyncGroq: same recordings and sampling, awaited with asyncio.sleep."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.chat = NS(completions=_AsyncCompletions(self))
+
+    async def acomplete(self, messages, stream=False):
+        kind = request_kind(messages, stream)
+        seconds, fail, text = self._draw(kind, messages)
+        if kind == "multi_day_plan":
+            text = _fit_days(text, messages)
+        if fail:
+            await asyncio.sleep(seconds / 2)
+            raise FakeGroqError(f"injected {kind} failure")
+        if stream:
+            return self._astream(text, seconds)
+        await asyncio.sleep(seconds)
+        return NS(choices=[NS(message=NS(content=text))])
+
+    async def _astream(self, text, seconds):
+        for chunk in self._stream(text, 0):
+            await asyncio.sleep(seconds / self.stream_chunks)
+            yield chunk
+
+
+class _RecordingCompletions:
+    def __init__(self, recorder):
+        self._recorder = recorder
+
+    def create(self, **kwargs):
+        kind = request_kind(kwargs.get("messages", []), kwargs.get("stream", False))
+        response = self._recorder.client.chat.completions.create(**kwargs)
+        if not kwargs.get("stream"):
+            self._recorder.save(kind, response.choices[0].message.content)
+            return response
+        return self._recorder.tee(kind, response)
+
+
+class RecordingGroq:
+    """
+    Wraps a real Groq client and adds every response to a recordings file.
+    Responses are collected in memory and the file is written once, at exit
+    (or on flush()), instead of being rewritten on every call.
+    """
+
+    def __init__(self, client, path):
+        self.client = client
+        self.path = path
+        self.chat = NS(completions=_RecordingCompletions(self))
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                self._recordings = json.load(f)
+        except (OSError, ValueError):
+            self._recordings = {}
+        self._dirty = False
+        atexit.register(self.flush)
+
+    def save(self, kind, text):
+        if not text:
+            return
+        with self._lock:
+            self._recordings.setdefault(kind, []).append(text)
+            self._dirty = True
+
+    def flush(self):
+        """Write the recordings file if anything was added since the last flush."""
+        with self._lock:
+            if not self._dirty:
+                return
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self._recordings, f, indent=1)
+            self._dirty = False
+
+    def tee(self, kind, stream):
+        parts = []
+        for chunk in stream:
+            parts.append(chunk.choices[0].delta.content or "")
+            yield chunk
+        self.save(kind, "".join(parts))
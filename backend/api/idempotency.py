@@ -0,0 +1,159 @@
+"""
+Idempotent uploads and coalescing of duplicate in-flight uploads.
+
+- Idempotency-Key header: the first upload with a key runs; repeats within
+  IDEMPOTENCY_TTL get the same response (the same report, or the same job)
+  instead of a new pipeline run. A key reused for other content is a 422.
+- Coalescing: while an upload of some file with some preferences is being
+  processed, identical uploads from the same tenant join it. For
+  /api/upload/ they wait for the leader's response; for /api/jobs/ they get
+  the leader's job id at once. Either way there is no second OCR or LLM run.
+
+Records live in Django's cache, so with Redis (REDIS_URL) uploads coalesce
+across server processes. Replayed responses carry `Idempotent-Replayed: true`.
+"""
+import asyncio
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .scheduler import request_tenant
+
+RUNNING, DONE = "running", "done"
+POLL_INTERVAL = 0.2
+
+
+class IdempotencyConflict(Exception):
+    """The Idempotency-Key was already used for a different upload."""
+
+
+class StillRunning(Exception):
+    """A follower gave up waiting for the leader (UPLOAD_COALESCE_WAIT)."""
+
+
+def upload_fingerprint(upload, *preferences):
+    """sha256 of the uploaded file's bytes and the preferences it was sent with."""
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    digest.update(repr(tuple(str(p) for p in preferences)).encode())
+    return digest.hexdigest()
+
+
+class Flight:
+    """
+    One upload's place among identical uploads. join() decides whether it
+    leads (runs the pipeline, then calls settle()) or follows (replays the
+    leader's response, waiting for it if needed).
+    """
+
+    def __init__(self, endpoint, tenant, fingerprint, idempotency_key=None):
+        self.fingerprint = fingerprint
+        self.content_key = f"flight:{endpoint}:{tenant}:{fingerprint}"
+        self.key = f"idem:{endpoint}:{tenant}:{idempotency_key}" if idempotency_key else None
+        self.leader = False
+
+    @classmethod
+    def for_request(cls, request, endpoint, data):
+        """The Flight of an upload request, or None when it has no file or coalescing is off."""
+        upload = request.FILES.get("report_file")
+        if upload is None or not settings.UPLOAD_COALESCE:
+            return None
+        fingerprint = upload_fingerprint(upload, data.get("diet_type"), data.get("age"),
+                                         data.get("days"), data.get("priority"))
+        return cls(endpoint, request_tenant(request), fingerprint,
+                   request.headers.get("Idempotency-Key", "")[:128] or None)
+
+    def join(self):
+        """
+        None when this upload leads, else the record it follows
+        ({"status", "status_code", "data"}). Raises IdempotencyConflict.
+        """
+        if self.key:
+            record = cache.get(self.key)
+            if record and record["fingerprint"] != self.fingerprint:
+                raise IdempotencyConflict("This Idempotency-Key was already used for a different upload.")
+            if record:
+                return record
+        record = {"status": RUNNING, "fingerprint": self.fingerprint}
+        # cache.add is atomic: exactly one of several identical uploads becomes the leader
+        if cache.add(self.content_key, record, settings.UPLOAD_COALESCE_WAIT):
+            self.leader = True
+            if self.key:
+                cache.set(self.key, record, settings.UPLOAD_COALESCE_WAIT)
+            return None
+        record = cache.get(self.content_key)
+        if record is None:
+            return self.join()
+        self._remember(record)
+        return record
+
+    def _remember(self, record):
+        """Keep a finished, successful response the follower got for its own Idempotency-Key."""
+        if self.key and record["status"] == DONE and 200 <= record["status_code"] < 300:
+            cache.add(self.key, record, self._key_ttl(record["in_flight"]))
+
+    @staticmethod
+    def _key_ttl(in_flight):
+        # A replayed job id is only useful while the job's state is kept
+        return min(settings.IDEMPOTENCY_TTL, settings.UPLOAD_JOB_TTL) if in_flight else settings.IDEMPOTENCY_TTL
+
+    def _poll(self):
+        record = (cache.get(self.key) if self.key else None) or cache.get(self.content_key)
+        if record is None:
+            # The leader failed (errors are not replayed) or its record expired
+            # without a response (its process went away)
+            raise StillRunning("The identical upload this one joined did not finish. Please retry.")
+        return record if record["status"] == DONE else None
+
+    def wait(self, record):
+        """The leader's finished record, polling until it is there (or StillRunning)."""
+        deadline = time.monotonic() + settings.UPLOAD_COALESCE_WAIT
+        while record["status"] != DONE:
+            if time.monotonic() > deadline:
+                raise StillRunning("An identical upload is still being processed. Please retry shortly.")
+            time.sleep(POLL_INTERVAL)
+            record = self._poll() or record
+        self._remember(record)
+        return record
+
+    async def await_result(self, record):
+        """wait() for async views."""
+        deadline = time.monotonic() + settings.UPLOAD_COALESCE_WAIT
+        while record["status"] != DONE:
+            if time.monotonic() > deadline:
+                raise StillRunning("An identical upload is still being processed. Please retry shortly.")
+            await asyncio.sleep(POLL_INTERVAL)
+            record = await sync_to_async(self._poll)() or record
+        await sync_to_async(self._remember)(record)
+        return record
+
+    def settle(self, status_code, data, in_flight=False):
+        """
+        Publish the leader's response. Waiting followers replay a successful
+        one for UPLOAD_COALESCE_GRACE seconds, or until release() when
+        `in_flight` (a queued job). An error (500, 429, 503, ...) is not
+        published: the records are dropped, so waiting followers are told to
+        retry and a retry of the same upload or Idempotency-Key runs again.
+        """
+        if not self.leader:
+            return
+        if not 200 <= status_code < 300:
+            self.release()
+            if self.key:
+                cache.delete(self.key)
+            return
+        record = {"status": DONE, "fingerprint": self.fingerprint,
+                  "status_code": status_code, "data": data, "in_flight": in_flight}
+        cache.set(self.content_key, record,
+                  settings.UPLOAD_JOB_TTL if in_flight else settings.UPLOAD_COALESCE_GRACE)
+        if self.key:
+            cache.set(self.key, record, self._key_ttl(in_flight))
+
+    def release(self):
+        """The leader's job finished: identical uploads from now on run again."""
+        cache.delete(self.content_key)
@@ -0,0 +1,66 @@
+"""
+Background upload jobs: the report is processed on a worker thread while the
+client polls GET /api/jobs/<job_id>/ for stage progress and partial results.
+Job state lives in Django's cache so any backend worker can answer a poll.
+"""
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from .pipeline import process_report
+from .scheduler import BATCH, INTERACTIVE, admit
+
+_executor = ThreadPoolExecutor(max_workers=settings.UPLOAD_JOB_WORKERS,
+                               thread_name_prefix="upload-job")
+# Batch jobs get their own threads so a bulk submission never occupies interactive ones
+_batch_executor = ThreadPoolExecutor(max_workers=settings.BATCH_JOB_WORKERS,
+                                     thread_name_prefix="batch-job")
+
+
+def _key(job_id):
+    return f"job:{job_id}"
+
+
+def get_job(job_id):
+    return cache.get(_key(job_id))
+
+
+def _update_job(job_id, **fields):
+    state = cache.get(_key(job_id)) or {"job_id": job_id}
+    state.update(fields, updated_at=time.time())
+    cache.set(_key(job_id), state, settings.UPLOAD_JOB_TTL)
+    return state
+
+
+def submit_report_job(report, diet_type, age, days=1, ticket=None, on_done=None):
+    """
+    Queue a saved MedicalReport for processing. `ticket` is the report's
+    scheduler admission (see scheduler.admit); it is released when the job
+    ends, after which `on_done()` is called if given. Returns the job id.
+    """
+    job_id = uuid.uuid4().hex
+    ticket = ticket or admit(INTERACTIVE)
+    _update_job(job_id, status="queued", stage="queued", report_id=report.id,
+                priority=ticket.priority, partial=None, result=None, error=None)
+
+    def progress(stage, **info):
+        _update_job(job_id, status="running", stage=stage, **info)
+
+    def run():
+        try:
+            with ticket.active():
+                result = process_report(report, diet_type, age, progress=progress, days=days)
+            _update_job(job_id, status="done", stage="done", result=result)
+        except Exception as e:
+            print(f"[ERROR] Upload job {job_id} failed: {type(e).__name__}: {e}")
+            _update_job(job_id, status="error", stage="error", error=str(e))
+        finally:
+            ticket.release()
+            if on_done:
+                on_done()
+            connection.close()
+
+    (_batch_executor if ticket.priority == BATCH else _executor).submit(run)
+    return job_id
@@ -0,0 +1,31 @@
+"""
+Short mutexes in Django's cache for read-modify-write sections (cache.add is
+atomic, so with Redis they hold across server processes).
+"""
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+POLL_INTERVAL = 0.05
+
+
+@contextmanager
+def cache_lock(key, timeout):
+    """
+    Hold `key` while the body runs. Waits up to `timeout` seconds for the
+    current holder (whose lock expires after `timeout` anyway), then goes
+    ahead without the lock rather than failing the request.
+    """
+    deadline = time.monotonic() + timeout
+    acquired = cache.add(key, 1, timeout)
+    while not acquired and time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        acquired = cache.add(key, 1, timeout)
+    if not acquired:
+        print(f"[WARN] Lock {key} timed out; continuing without it")
+    try:
+        yield
+    finally:
+        if acquired:
+            cache.delete(key)
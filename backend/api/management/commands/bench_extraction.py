@@ -0,0 +1,176 @@
+"""
+Speed and accuracy benchmark for load_document_images and extract_medical_data
+over a synthetic corpus with ground truth (see generate_report_corpus).
+
+    python manage.py bench_extraction --corpus /tmp/corpus --limit 200
+    python manage.py bench_extraction --generate 60 --offline
+
+By default the configured Groq client is used, so accuracy reflects the real
+OCR + extraction models. --offline swaps in FakeGroq: OCR answers with each
+page's printed text and extraction with the printed values. That measures
+rendering, preprocessing, batching and early exit at scale without quota, and
+the accuracy figures then only cover the pipeline's own post-processing
+(schema repair, name fallback, unit conversion).
+"""
+import contextlib
+import io
+import json
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from api import services
+from api.ai_utils import load_document_images
+from api.fakegroq import FakeGroq
+from api.synthetic import TARGETS, read_corpus, write_corpus
+from api.vitals import normalize_vital
+
+FIELDS = ["patient_name", "age", "gender", *TARGETS]
+REL_TOLERANCE = 0.01  # canonical values within 1% count as correct (unit conversion rounding)
+
+
+def score_report(data, truth):
+    """{field: "correct" | "wrong" | "missed" | "false_positive"} for one report."""
+    scores = {}
+    scores["patient_name"] = ("correct" if (data.get("patient_name") or "").strip().lower()
+                              == truth["patient_name"].lower() else "wrong")
+    scores["age"] = "correct" if str(data.get("age", "")).strip().split(" ")[0] == truth["age"] else "wrong"
+    scores["gender"] = ("correct" if str(data.get("gender", "")).strip()[:1].upper() == truth["gender"][0]
+                        else "wrong")
+    for field in TARGETS:
+        expected = truth["values"][field]
+        got = normalize_vital(field, data.get(field))
+        if expected is None:
+            scores[field] = "correct" if got is None else "false_positive"
+        elif got is None:
+            scores[field] = "missed"
+        else:
+            scores[field] = "correct" if abs(got - expected) <= max(abs(expected) * REL_TOLERANCE, 0.05) else "wrong"
+    return scores
+
+
+def offline_extraction(truth):
+    """What a perfect extraction model would return for this report."""
+    printed = {field: truth["printed"][field] or "N/A" for field in TARGETS}
+    return json.dumps({"patient_name": truth["patient_name"], "age": truth["age"],
+                       "gender": truth["gender"], **printed, "abnormal_findings": []})
+
+
+def ms_percentiles(samples):
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0}
+    p50, p95 = np.percentile(np.asarray(samples) * 1000, [50, 95])
+    return {"p50": round(float(p50), 1), "p95": round(float(p95), 1)}
+
+
+class Command(BaseCommand):
+    help = "Score speed and accuracy of page rendering and extract_medical_data on a synthetic corpus."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--corpus", help="Directory written by generate_report_corpus")
+        parser.add_argument("--generate", type=int, default=0,
+                            help="Generate a temporary corpus of this many reports instead")
+        parser.add_argument("--limit", type=int, default=0)
+        parser.add_argument("--workers", type=int, default=1,
+                            help="Reports extracted concurrently (--offline always uses 1)")
+        parser.add_argument("--offline", action="store_true",
+                            help="Answer OCR and extraction from the ground truth instead of Groq")
+        parser.add_argument("--latency-scale", type=float, default=0.0,
+                            help="With --offline: multiplier on simulated Groq latency")
+        parser.add_argument("--seed", type=int, default=7)
+        parser.add_argument("--output", help="Also write per-report results as JSON to this path")
+
+    def handle(self, *args, **options):
+        if not options["corpus"] and not options["generate"]:
+            raise CommandError("Pass --corpus DIR or --generate N")
+        with tempfile.TemporaryDirectory(prefix="corpus-") as tmp:
+            corpus_dir = options["corpus"]
+            if not corpus_dir:
+                write_corpus(tmp, options["generate"], seed=options["seed"])
+                corpus_dir = tmp
+            corpus = read_corpus(corpus_dir)
+            if options["limit"]:
+                corpus = corpus[:options["limit"]]
+            self.stdout.write(f"Corpus: {len(corpus)} reports, "
+                              f"{sum(truth['pages'] for _, truth in corpus)} pages "
+                              f"({'offline' if options['offline'] else 'live Groq'})")
+            results, wall = self._run(corpus, options)
+        self._report(results, wall)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=1)
+
+    def _run(self, corpus, options):
+        fake = None
+        real_client = services.client
+        if options["offline"]:
+            fake = FakeGroq(latency_scale=options["latency_scale"], seed=options["seed"])
+            services.client = fake
+        # Scripted OCR answers pages one by one, in order
+        tiling = {"OCR_TILE_PAGES": False} if fake else {}
+
+        def run_one(entry):
+            path, truth = entry
+            start = time.perf_counter()
+            pages = len(load_document_images(path))
+            render_s = time.perf_counter() - start
+            if fake:
+                fake.script("ocr", truth["page_text"])
+                fake.script("extraction", [offline_extraction(truth)])
+            stats = {}
+            start = time.perf_counter()
+            data, _ = services.extract_medical_data(path, stats=stats)
+            extract_s = time.perf_counter() - start
+            return {"file": truth["file"], "format": truth["format"], "layout": truth["layout"],
+                    "pages": pages, "render_s": render_s, "extract_s": extract_s,
+                    "pages_ocr": stats.get("pages_ocr", 0), "early_exit": stats.get("early_exit", False),
+                    "scores": score_report(data, truth)}
+
+        workers = 1 if fake else max(1, options["workers"])
+        start = time.perf_counter()
+        try:
+            with override_settings(**tiling), contextlib.redirect_stdout(io.StringIO()):
+                with ThreadPoolExecutor(workers) as pool:
+                    results = list(pool.map(run_one, corpus))
+        finally:
+            services.client = real_client
+        return results, time.perf_counter() - start
+
+    def _report(self, results, wall):
+        if not results:
+            return
+        pages = sum(r["pages"] for r in results)
+        render = sum(r["render_s"] for r in results)
+        extract = [r["extract_s"] for r in results]
+        self.stdout.write(
+            f"Rendering: {render / pages * 1000:.1f} ms/page   "
+            f"Extraction: {len(results) / wall:.2f} reports/s, {pages / wall:.1f} pages/s, "
+            f"p50 {ms_percentiles(extract)['p50']} ms  p95 {ms_percentiles(extract)['p95']} ms per report")
+        self.stdout.write(
+            f"Pages sent to OCR: {sum(r['pages_ocr'] for r in results)}/{pages}   "
+            f"early exits: {sum(r['early_exit'] for r in results)}/{len(results)}")
+
+        counts = {field: defaultdict(int) for field in FIELDS}
+        groups = defaultdict(lambda: [0, 0])
+        for r in results:
+            for field, outcome in r["scores"].items():
+                counts[field][outcome] += 1
+            correct = sum(outcome == "correct" for outcome in r["scores"].values())
+            for group in (f"format={r['format']}", f"layout={r['layout']}"):
+                groups[group][0] += correct
+                groups[group][1] += len(r["scores"])
+
+        self.stdout.write(f"{'field':15s} {'accuracy':>8s} {'wrong':>6s} {'missed':>6s} {'false+':>6s}")
+        for field in FIELDS:
+            c = counts[field]
+            self.stdout.write(f"{field:15s} {c['correct'] / len(results):8.1%} {c['wrong']:6d} "
+                              f"{c['missed']:6d} {c['false_positive']:6d}")
+        total_correct = sum(c["correct"] for c in counts.values())
+        self.stdout.write(f"Overall field accuracy: {total_correct / (len(results) * len(FIELDS)):.1%}   " +
+                          "  ".join(f"{group} {correct / total:.1%}"
+                                    for group, (correct, total) in sorted(groups.items())))
@@ -0,0 +1,111 @@
+"""
+Micro-benchmark for find_patient_name over a synthetic corpus of OCR'd reports.
+
+    python manage.py bench_name_extraction --reports 2000 --pages 6 --repeat 25
+
+Compares find_patient_name, which searches only the first page's header,
+against the previous implementation that searched the whole text, and checks
+both agree on every report. Reports the median of --repeat runs.
+"""
+import contextlib
+import io
+import random
+import re
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import services
+
+FIRST_NAMES = ["Rahul", "Priya", "Anita", "Vikram", "John", "Sara", "Amit", "Meera", "Ravi", "Leela"]
+LAST_NAMES = ["Sharma", "Patel", "Desai", "Singh", "Smith", "Lee", "Rao", "Iyer", "Kumar", "Nair"]
+NAME_LINES = ["Patient Name: {}", "Name: {}", "Patient: {}", "Mr. {}", "Mrs. {}", "Ms. {}", "PATIENT NAME : {}"]
+LAB_LINES = [
+    "| Fasting Blood Sugar | {} mg/dL | 70-100 |",
+    "| Total Cholesterol | {} mg/dL | <200 |",
+    "| Hemoglobin | {} g/dL | 12-17 |",
+    "| Total Protein | {} g/dL | 6.0-8.3 |",
+    "| Serum Albumin | {} g/dL | 3.5-5.5 |",
+    "| HDL Cholesterol | {} mg/dL | >40 |",
+]
+
+
+def _legacy_find_patient_name(text):
+    """The pre-optimization implementation, kept here as the baseline."""
+    if not text:
+        return None
+    patterns = [
+        r"Name\s*[:\-]\s*([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",
+        r"Patient(?:'s)?\s+Name\s*[:\-]\s*([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",
+        r"Patient\s*[:\-]\s*([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",
+        r"Mr\.?\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",
+        r"Ms\.?\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",
+        r"Mrs\.?\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",
+        r"Dr\.?\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, text)
+        if match:
+            name = match.group(1).strip()
+            if 2 <= len(name) <= 50 and not re.search(r'\d', name):
+                return name
+    return None
+
+
+def build_corpus(reports, pages, seed):
+    """Synthetic report texts in the '--- PAGE n ---' layout extract_medical_data produces."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(reports):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        header = [
+            "# City Diagnostics Laboratory",
+            f"Ref. Dr. {rng.choice(LAST_NAMES)}" if rng.random() < 0.5 else "Sample: Serum",
+            rng.choice(NAME_LINES).format(name) if rng.random() < 0.9 else "Patient ID: 00" + str(rng.randint(100, 999)),
+            f"Age/Sex: {rng.randint(18, 85)} Y / {rng.choice(['M', 'F'])}",
+            "",
+        ]
+        text = ""
+        for page_no in range(1, pages + 1):
+            lines = header if page_no == 1 else [f"Page {page_no} of {pages}"]
+            lines = lines + [rng.choice(LAB_LINES).format(round(rng.uniform(3, 250), 1))
+                             for _ in range(rng.randint(20, 60))]
+            text += f"\n--- PAGE {page_no} ---\n" + "\n".join(lines)
+        corpus.append(text)
+    return corpus
+
+
+class Command(BaseCommand):
+    help = "Benchmark patient-name extraction on a synthetic corpus of report texts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reports", type=int, default=1000)
+        parser.add_argument("--pages", type=int, default=4)
+        parser.add_argument("--repeat", type=int, default=25)
+        parser.add_argument("--seed", type=int, default=7)
+
+    def _time(self, fn, corpus, repeat):
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results = [fn(text) for text in corpus]
+            runs.append(time.perf_counter() - start)
+        return statistics.median(runs), results
+
+    def handle(self, *args, **options):
+        corpus = build_corpus(options["reports"], options["pages"], options["seed"])
+        avg_chars = sum(map(len, corpus)) // len(corpus)
+        self.stdout.write(f"Corpus: {len(corpus)} reports, {options['pages']} pages, ~{avg_chars} chars each")
+
+        # find_patient_name logs every hit; keep the timing loop quiet
+        with contextlib.redirect_stdout(io.StringIO()):
+            legacy_s, legacy = self._time(_legacy_find_patient_name, corpus, options["repeat"])
+            fast_s, fast = self._time(services.find_patient_name, corpus, options["repeat"])
+
+        mismatches = sum(a != b for a, b in zip(legacy, fast))
+        for label, seconds in (("whole text", legacy_s), ("first-page header", fast_s)):
+            self.stdout.write(f"{label:24s} {seconds * 1000:8.1f} ms median "
+                              f"{seconds / len(corpus) * 1e6:8.1f} us/report")
+        self.stdout.write(f"Speedup: {legacy_s / fast_s:.1f}x   found: {sum(bool(n) for n in fast)}/{len(corpus)}   "
+                          f"mismatches vs legacy: {mismatches}")
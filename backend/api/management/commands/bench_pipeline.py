@@ -0,0 +1,293 @@
+"""
+Offline load benchmark for the upload pipeline and the chatbot.
+
+    python manage.py bench_pipeline --reports 40 --concurrency 8 --latency-scale 0.1
+
+Groq is replaced by FakeGroq (recorded responses, lognormal latency, optional
+injected errors), reports are synthetic PDFs, and everything runs against a
+throwaway database and media directory. Uploads go through UploadReportView,
+chat turns through DrAIChatbot.chat, each at the given concurrency. Prints
+throughput, p50/p95/p99 latency and traced memory per report.
+
+--batch-reports N also queues N batch-priority jobs (POST /api/jobs/) before
+the uploads start, to measure interactive latency under a bulk backlog.
+"""
+import contextlib
+import io
+import json
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from PIL import Image, ImageDraw, ImageFont
+from rest_framework.test import APIClient
+
+from api import services
+from api.chat_engine import SESSION_STORE, ConversationMemory, DrAIChatbot
+from api.fakegroq import FakeGroq, load_recordings
+from api.jobs import get_job
+from api.models import MedicalReport
+from api.pipeline import build_report_response
+
+FIRST_NAMES = ["Rahul", "Priya", "Anita", "Vikram", "John", "Sara", "Amit", "Meera"]
+LAST_NAMES = ["Sharma", "Patel", "Desai", "Singh", "Smith", "Rao", "Iyer", "Nair"]
+LAB_ROWS = [
+    ("Fasting Blood Sugar", "mg/dL", 70, 240),
+    ("Total Cholesterol", "mg/dL", 140, 300),
+    ("Hemoglobin", "g/dL", 9, 17),
+    ("Total Protein", "g/dL", 5, 9),
+    ("Serum Albumin", "g/dL", 2.8, 5.5),
+    ("HDL Cholesterol", "mg/dL", 30, 70),
+    ("Creatinine", "mg/dL", 0.5, 1.6),
+]
+CHAT_QUESTIONS = [
+    "What should I eat for breakfast?",
+    "Can I replace the rice at dinner?",
+    "Which snacks are safe between meals?",
+    "How much water should I drink?",
+    "Is my cholesterol a concern?",
+]
+
+
+def build_report_pdf(rng, pages):
+    """A synthetic lab report PDF (150 DPI A4 pages of printed rows)."""
+    font = ImageFont.load_default(size=26)
+    images = []
+    for page_no in range(1, pages + 1):
+        img = Image.new("L", (1240, 1754), 255)
+        draw = ImageDraw.Draw(img)
+        lines = [f"City Diagnostics Laboratory - Page {page_no} of {pages}"]
+        if page_no == 1:
+            lines += [f"Patient Name: {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                      f"Age/Sex: {rng.randint(18, 85)} Y / {rng.choice('MF')}", ""]
+        for _ in range(rng.randint(12, 30)):
+            test, unit, low, high = rng.choice(LAB_ROWS)
+            lines.append(f"{test:<28} {round(rng.uniform(low, high), 1):>7} {unit}")
+        for i, line in enumerate(lines):
+            draw.text((90, 90 + i * 46), line, fill=0, font=font)
+        images.append(img)
+    out = io.BytesIO()
+    images[0].save(out, format="PDF", save_all=True, append_images=images[1:], resolution=150)
+    return out.getvalue()
+
+
+def percentiles(samples):
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    p50, p95, p99 = np.percentile(np.asarray(samples) * 1000, [50, 95, 99])
+    return {"p50": round(float(p50), 1), "p95": round(float(p95), 1), "p99": round(float(p99), 1)}
+
+
+class Command(BaseCommand):
+    help = "Load-benchmark uploads and chat turns against an offline Groq stand-in."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reports", type=int, default=20)
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--pages", type=int, default=2)
+        parser.add_argument("--days", type=int, default=1)
+        parser.add_argument("--batch-reports", type=int, default=0,
+                            help="Batch-priority jobs queued behind the interactive uploads")
+        parser.add_argument("--chat-turns", type=int, default=3, help="Turns per report session")
+        parser.add_argument("--latency-scale", type=float, default=0.1,
+                            help="Multiplier on recorded Groq latencies (1.0 = realistic, 0 = none)")
+        parser.add_argument("--error-rate", type=float, default=0.0)
+        parser.add_argument("--groq-capacity", type=int, default=0,
+                            help="Concurrent Groq calls the fake serves at once (0 = unlimited)")
+        parser.add_argument("--recordings", help="JSON recordings file (see api/fakegroq.py)")
+        parser.add_argument("--memory-samples", type=int, default=3,
+                            help="Sequential uploads traced for memory per report")
+        parser.add_argument("--seed", type=int, default=7)
+        parser.add_argument("--output", help="Also write the results as JSON to this path")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        files = [build_report_pdf(rng, options["pages"]) for _ in range(min(options["reports"], 8))]
+        fake = FakeGroq(recordings=load_recordings(options["recordings"]),
+                        latency_scale=options["latency_scale"],
+                        error_rate=options["error_rate"], seed=options["seed"],
+                        capacity=options["groq_capacity"])
+        self.stdout.write(f"Reports: {options['reports']} x {options['pages']} pages, "
+                          f"concurrency {options['concurrency']}, latency x{options['latency_scale']}, "
+                          f"error rate {options['error_rate']}")
+
+        media = tempfile.mkdtemp(prefix="bench-media-")
+        db_file = tempfile.NamedTemporaryFile(prefix="bench-", suffix=".sqlite3", delete=False).name
+        connection.settings_dict.setdefault("TEST", {})["NAME"] = db_file
+        if connection.vendor == "sqlite":
+            # Concurrent uploads write from several threads; wait for the write
+            # lock instead of failing with "database is locked"
+            options_dict = connection.settings_dict.setdefault("OPTIONS", {})
+            options_dict.setdefault("timeout", 30)
+            if django.VERSION >= (5, 1):
+                options_dict.setdefault("transaction_mode", "IMMEDIATE")
+        old_db = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        real_client, services.client = services.client, fake
+        results = {}
+        try:
+            with override_settings(MEDIA_ROOT=media), contextlib.redirect_stdout(io.StringIO()):
+                results["memory"] = self._memory(files, options)
+                batch = self._start_batch(files, options)
+                results["upload"], report_ids = self._uploads(files, options)
+                results["batch"] = self._finish_batch(*batch)
+                results["chat"] = self._chat(report_ids, options)
+                self._wait_for_background_threads()
+        finally:
+            services.client = real_client
+            connection.creation.destroy_test_db(old_db, verbosity=0)
+            shutil.rmtree(media, ignore_errors=True)
+
+        results["groq_calls"] = dict(fake.calls)
+        results["groq_injected_errors"] = dict(fake.errors)
+        results["max_rss_mib"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        self._report(results)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump({"options": options, "results": results}, f, indent=2, default=str)
+
+    def _upload(self, data, options, tenant="bench"):
+        upload = io.BytesIO(data)
+        upload.name = "report.pdf"
+        start = time.perf_counter()
+        try:
+            response = APIClient().post("/api/upload/", {
+                "report_file": upload, "diet_type": "Vegetarian", "age": 40, "days": options["days"],
+            }, format="multipart", HTTP_X_TENANT_ID=tenant)
+        finally:
+            connection.close()
+        if response.status_code != 201:
+            print(f"[BENCH] upload failed: {response.status_code} {response.data}", file=sys.stderr)
+        return time.perf_counter() - start, response.status_code, response.data.get("report_id")
+
+    def _memory(self, files, options):
+        """Peak traced allocation of single uploads run one at a time."""
+        peaks = []
+        tracemalloc.start()
+        try:
+            for i in range(options["memory_samples"]):
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                self._upload(files[i % len(files)], options)
+                peaks.append((tracemalloc.get_traced_memory()[1] - base) / 2**20)
+        finally:
+            tracemalloc.stop()
+        return {"peak_mib_median": round(statistics.median(peaks), 1) if peaks else 0.0,
+                "peak_mib_max": round(max(peaks), 1) if peaks else 0.0}
+
+    def _uploads(self, files, options):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options["concurrency"]) as pool:
+            # One tenant per simulated user, so per-tenant admission limits do not apply
+            runs = list(pool.map(lambda i: self._upload(files[i % len(files)], options,
+                                                        tenant=f"bench-user-{i % options['concurrency']}"),
+                                 range(options["reports"])))
+        wall = time.perf_counter() - start
+        latencies = [seconds for seconds, _, _ in runs]
+        failed = sum(code != 201 for _, code, _ in runs)
+        return {
+            "count": len(runs), "failed": failed, "wall_s": round(wall, 2),
+            "throughput_per_s": round(len(runs) / wall, 2) if wall else 0.0,
+            **percentiles(latencies),
+        }, [report_id for _, code, report_id in runs if code == 201]
+
+    def _start_batch(self, files, options):
+        """Queue the batch jobs; returns (start time, job ids)."""
+        job_ids = []
+        for i in range(options["batch_reports"]):
+            upload = io.BytesIO(files[i % len(files)])
+            upload.name = "report.pdf"
+            response = APIClient().post("/api/jobs/", {
+                "report_file": upload, "diet_type": "Vegetarian", "age": 40, "days": options["days"],
+                "priority": "batch",
+            }, format="multipart", HTTP_X_TENANT_ID="bench-bulk")
+            job_ids.append(response.data["job_id"])
+        connection.close()
+        return time.perf_counter(), job_ids
+
+    def _finish_batch(self, start, job_ids, timeout=600):
+        if not job_ids:
+            return {"count": 0}
+        deadline = time.monotonic() + timeout
+        pending = set(job_ids)
+        while pending and time.monotonic() < deadline:
+            pending = {job_id for job_id in pending
+                       if (get_job(job_id) or {}).get("status") not in ("done", "error")}
+            time.sleep(0.05)
+        wall = time.perf_counter() - start
+        failed = sum((get_job(job_id) or {}).get("status") != "done" for job_id in job_ids)
+        return {"count": len(job_ids), "failed": failed, "wall_s": round(wall, 2),
+                "throughput_per_s": round(len(job_ids) / wall, 2) if wall else 0.0}
+
+    def _chat_session(self, report_id, options):
+        report = MedicalReport.objects.get(pk=report_id)
+        data = build_report_response(report)
+        connection.close()
+        session_id = uuid.uuid4().hex
+        memory = ConversationMemory(services.client, SESSION_STORE, report_id, session_id)
+        bot = DrAIChatbot(data, services.client, memory)
+        history, latencies = [], []
+        for turn in range(options["chat_turns"]):
+            # Vary the opening question per session so the shared answer cache
+            # does not turn the benchmark into a cache benchmark
+            question = CHAT_QUESTIONS[(report_id + turn) % len(CHAT_QUESTIONS)]
+            if not history:
+                question = f"{question} (session {session_id[:6]})"
+            start = time.perf_counter()
+            reply = bot.chat(question, history)
+            latencies.append(time.perf_counter() - start)
+            history += [{"role": "user", "content": question}, {"role": "assistant", "content": reply}]
+        return latencies
+
+    def _chat(self, report_ids, options):
+        if not report_ids or options["chat_turns"] <= 0:
+            return {"count": 0}
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options["concurrency"]) as pool:
+            sessions = list(pool.map(lambda rid: self._chat_session(rid, options), report_ids))
+        wall = time.perf_counter() - start
+        latencies = [seconds for session in sessions for seconds in session]
+        return {
+            "count": len(latencies), "sessions": len(sessions), "wall_s": round(wall, 2),
+            "throughput_per_s": round(len(latencies) / wall, 2) if wall else 0.0,
+            **percentiles(latencies),
+        }
+
+    def _wait_for_background_threads(self, timeout=30):
+        """Quick-answer and chat-summary threads still use the test database."""
+        deadline = time.monotonic() + timeout
+        main = threading.main_thread()
+        for thread in threading.enumerate():
+            if thread is not main and thread is not threading.current_thread() and thread.daemon:
+                thread.join(max(0.0, deadline - time.monotonic()))
+
+    def _report(self, results):
+        upload, chat, memory = results["upload"], results["chat"], results["memory"]
+        self.stdout.write(
+            f"Uploads: {upload['count']} ({upload['failed']} failed) in {upload['wall_s']} s  "
+            f"{upload['throughput_per_s']} reports/s  "
+            f"p50 {upload['p50']} ms  p95 {upload['p95']} ms  p99 {upload['p99']} ms")
+        batch = results["batch"]
+        if batch["count"]:
+            self.stdout.write(
+                f"Batch:   {batch['count']} jobs ({batch['failed']} failed) done {batch['wall_s']} s "
+                f"after queueing  {batch['throughput_per_s']} reports/s")
+        if chat["count"]:
+            self.stdout.write(
+                f"Chat:    {chat['count']} turns in {chat['wall_s']} s  {chat['throughput_per_s']} turns/s  "
+                f"p50 {chat['p50']} ms  p95 {chat['p95']} ms  p99 {chat['p99']} ms")
+        self.stdout.write(f"Memory per report (traced peak): median {memory['peak_mib_median']} MiB, "
+                          f"max {memory['peak_mib_max']} MiB; process max RSS {results['max_rss_mib']} MiB")
+        self.stdout.write(f"Groq calls: {results['groq_calls']}  injected errors: {results['groq_injected_errors']}")
@@ -0,0 +1,47 @@
+"""
+Status distribution of every vital across stored reports.
+
+    python manage.py vitals_summary [--since 2026-01-01]
+
+All reports are parsed into one value matrix and classified in one pass with
+the band tables from api/vitals.py.
+"""
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from api.models import MedicalReport
+from api.vitals import NO_DATA, VITAL_KEYS, VITALS, classify_matrix, values_matrix
+
+
+class Command(BaseCommand):
+    help = "Summarize vital values and statuses across all processed reports."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="Only reports created on or after this date (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        reports = MedicalReport.objects.exclude(extracted_data__isnull=True)
+        if options["since"]:
+            reports = reports.filter(created_at__date__gte=parse_date(options["since"]))
+        data = list(reports.values_list("extracted_data", flat=True).iterator(chunk_size=2000))
+        if not data:
+            self.stdout.write("No processed reports.")
+            return
+
+        matrix = values_matrix(data)
+        statuses = classify_matrix(matrix)
+        self.stdout.write(f"{len(data)} reports\n")
+        for col, key in enumerate(VITAL_KEYS):
+            spec, column = VITALS[key], matrix[:, col]
+            present = column[~np.isnan(column)]
+            line = f"{spec['label']:14s} n={present.size:<6d}"
+            if present.size:
+                p25, p50, p75 = np.percentile(present, [25, 50, 75])
+                line += f" median {p50:.1f} {spec['unit']} (IQR {p25:.1f}-{p75:.1f})"
+            self.stdout.write(line)
+            labels, counts = np.unique(statuses[:, col].astype(str), return_counts=True)
+            by_label = dict(zip(labels, counts))
+            self.stdout.write("    " + "  ".join(
+                f"{label}: {by_label.get(label, 0)}" for label in spec["statuses"] + [NO_DATA]
+            ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0002_medicalreport_extracted_data"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="medicalreport",
+            name="quick_answers",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
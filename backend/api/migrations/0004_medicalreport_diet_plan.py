@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_medicalreport_quick_answers"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="medicalreport",
+            name="diet_plan",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="medicalreport",
+            name="plan_source",
+            field=models.CharField(blank=True, default="", max_length=20),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_medicalreport_diet_plan"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Patient",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=255)),
+                ("name_key", models.CharField(db_index=True, max_length=255)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="medicalreport",
+            name="patient",
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="reports", to="api.patient"),
+        ),
+        migrations.CreateModel(
+            name="PatientSummary",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("report_count", models.PositiveIntegerField(default=0)),
+                ("first_report_at", models.DateTimeField(blank=True, null=True)),
+                ("last_report_at", models.DateTimeField(blank=True, null=True)),
+                ("latest", models.JSONField(blank=True, default=dict)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("patient", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name="summary", to="api.patient")),
+            ],
+        ),
+        migrations.CreateModel(
+            name="LabObservation",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("vital", models.CharField(max_length=32)),
+                ("value", models.FloatField()),
+                ("unit", models.CharField(max_length=16)),
+                ("status", models.CharField(max_length=20)),
+                ("observed_at", models.DateTimeField()),
+                ("report", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="observations", to="api.medicalreport")),
+                ("patient", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="observations", to="api.patient")),
+            ],
+            options={
+                "ordering": ["observed_at"],
+                "indexes": [models.Index(fields=["patient", "vital", "observed_at"], name="api_labobse_patient_6de23a_idx")],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0005_patient_history"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="medicalreport",
+            name="age",
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="medicalreport",
+            name="diet_type",
+            field=models.CharField(blank=True, default="", max_length=30),
+        ),
+    ]
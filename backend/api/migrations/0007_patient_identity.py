@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_medicalreport_plan_inputs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="patient",
+            name="birth_year",
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="patient",
+            name="gender",
+            field=models.CharField(blank=True, default="", max_length=1),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:24
+
+from django.db import migrations, models
+
+
+def settle_existing(apps, schema_editor):
+    # Precompute for existing reports has already run: no answers means it failed
+    MedicalReport = apps.get_model("api", "MedicalReport")
+    MedicalReport.objects.filter(quick_answers={}).update(quick_answers_status="failed")
+    MedicalReport.objects.exclude(quick_answers={}).update(quick_answers_status="ready")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_patient_identity"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="medicalreport",
+            name="plan_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="medicalreport",
+            name="quick_answers_status",
+            field=models.CharField(blank=True, default="pending", max_length=10),
+        ),
+        migrations.RunPython(settle_existing, migrations.RunPython.noop),
+    ]
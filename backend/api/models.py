@@ -1,10 +1,67 @@
 from django.db import models
 
+class Patient(models.Model):
+    """
+    A person whose reports are grouped together. Reports are linked by the
+    extracted patient name together with gender / age (see
+    patients.resolve_patient).
+    """
+    name = models.CharField(max_length=255)
+    # Lowercased, whitespace-collapsed name used to match new uploads
+    name_key = models.CharField(max_length=255, db_index=True)
+    # Second identifiers required to link a report by name: "M" / "F", and
+    # the year of birth implied by the reported age
+    gender = models.CharField(max_length=1, blank=True, default="")
+    birth_year = models.PositiveSmallIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
 class MedicalReport(models.Model):
+    patient = models.ForeignKey(Patient, null=True, blank=True, on_delete=models.SET_NULL,
+                                related_name="reports")
     patient_name = models.CharField(max_length=255, default="John Doe")
     report_file = models.FileField(upload_to='reports/')
     extracted_data = models.JSONField(default=dict, blank=True)
+    diet_plan = models.JSONField(default=dict, blank=True)
+    plan_source = models.CharField(max_length=20, blank=True, default="")
+    # Plan inputs, so the plan can be regenerated without re-running OCR
+    diet_type = models.CharField(max_length=30, blank=True, default="")
+    age = models.PositiveSmallIntegerField(null=True, blank=True)
+    quick_answers = models.JSONField(default=dict, blank=True)
+    # "pending" until the quick answers for the current plan are stored, "ready", or "failed"
+    quick_answers_status = models.CharField(max_length=10, blank=True, default="pending")
+    # Bumped whenever diet_plan is replaced, so background work for an older plan is dropped
+    plan_version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.patient_name} - {self.created_at}"
+
+class LabObservation(models.Model):
+    """One lab value from one report, in the canonical unit from api/vitals.py."""
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name="observations")
+    report = models.ForeignKey(MedicalReport, on_delete=models.CASCADE, related_name="observations")
+    vital = models.CharField(max_length=32)
+    value = models.FloatField()
+    unit = models.CharField(max_length=16)
+    status = models.CharField(max_length=20)
+    observed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=["patient", "vital", "observed_at"])]
+        ordering = ["observed_at"]
+
+class PatientSummary(models.Model):
+    """
+    Per-patient rollup kept up to date as reports are saved, so patient lists
+    and latest-value lookups never scan past reports.
+    `latest` maps vital -> {value, unit, status, observed_at, report_id}.
+    """
+    patient = models.OneToOneField(Patient, on_delete=models.CASCADE, related_name="summary")
+    report_count = models.PositiveIntegerField(default=0)
+    first_report_at = models.DateTimeField(null=True, blank=True)
+    last_report_at = models.DateTimeField(null=True, blank=True)
+    latest = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,205 @@
+"""
+Patient identity and history: links processed reports to a Patient, stores
+their lab values as indexed LabObservation rows and keeps a PatientSummary
+rollup current, so history and trend reads never re-parse extracted_data.
+"""
+import hashlib
+import re
+
+from django.db import transaction
+from django.db.models import Count, Max, Min
+
+from .locks import cache_lock
+from .models import LabObservation, Patient, PatientSummary
+from .vitals import VITALS, classify_report
+
+# Fallback names the extraction step uses when it finds nothing
+UNKNOWN_NAMES = {"", "patient", "n/a", "unknown", "not found", "null", "none", "john doe"}
+
+PAST_REPORTS_IN_CHAT = 5
+IDENTITY_LOCK_TIMEOUT = 10  # seconds
+
+
+def name_key(name):
+    """Lowercased, whitespace-collapsed name used to match uploads to a Patient."""
+    return re.sub(r"\s+", " ", (name or "").strip()).lower()
+
+
+def patient_identity(extracted, year):
+    """
+    (gender, birth_year) from a report's extracted data, each None when the
+    report does not give it. birth_year is `year` minus the reported age.
+    """
+    gender = (extracted.get("gender") or "").strip().lower()
+    gender = {"m": "M", "male": "M", "f": "F", "female": "F"}.get(gender)
+    match = re.match(r"\s*(\d{1,3})", str(extracted.get("age") or ""))
+    age = int(match.group(1)) if match else 0
+    return gender, (year - age if 0 < age < 120 else None)
+
+
+def same_person(patient, gender, birth_year):
+    """
+    Whether a same-name patient is this report's patient: no identifier known
+    on both sides may disagree (birth years within a year, since age is only
+    given in whole years), and at least one must agree.
+    """
+    agree = 0
+    if gender and patient.gender:
+        if gender != patient.gender:
+            return False
+        agree += 1
+    if birth_year and patient.birth_year:
+        if abs(birth_year - patient.birth_year) > 1:
+            return False
+        agree += 1
+    return agree > 0
+
+
+def resolve_patient(report, extracted):
+    """
+    Patient for a processed report: the one it was uploaded against, else an
+    existing patient with the same name and a matching gender / age, else a
+    new one. A name alone is not enough to link: reports without a usable
+    name, or with neither gender nor age, stay unlinked.
+    """
+    if report.patient_id:
+        return report.patient
+    name = (extracted.get("patient_name") or "").strip()
+    key = name_key(name)
+    if key in UNKNOWN_NAMES:
+        return None
+    gender, birth_year = patient_identity(extracted, report.created_at.year)
+    if gender is None and birth_year is None:
+        return None
+    # Find-or-create is serialized per name and committed before the lock is
+    # released, so concurrent uploads for one person share one Patient
+    with identity_lock(key), transaction.atomic():
+        for patient in Patient.objects.select_for_update().filter(name_key=key).order_by("id"):
+            if same_person(patient, gender, birth_year):
+                # Fill in an identifier the patient was first seen without
+                if (gender and not patient.gender) or (birth_year and not patient.birth_year):
+                    patient.gender = patient.gender or gender
+                    patient.birth_year = patient.birth_year or birth_year
+                    patient.save(update_fields=["gender", "birth_year"])
+                return patient
+        patient, _ = Patient.objects.get_or_create(
+            name_key=key, gender=gender or "", birth_year=birth_year, defaults={"name": name})
+        return patient
+
+
+def identity_lock(key):
+    """Serializes patient matching for one name key (see locks.cache_lock)."""
+    return cache_lock("patient-identity:" + hashlib.sha256(key.encode()).hexdigest(), IDENTITY_LOCK_TIMEOUT)
+
+
+def record_report(report):
+    """
+    Link a saved, processed report to its patient and update that patient's
+    observations and summary. Safe to call again when a report is re-processed:
+    the report's old observations are replaced.
+    """
+    extracted = report.extracted_data or {}
+    patient = resolve_patient(report, extracted)
+    if patient is None:
+        return None
+    with transaction.atomic():
+        return _record_observations(report, patient, extracted)
+
+
+def _record_observations(report, patient, extracted):
+    fields = {"patient": patient}
+    if extracted.get("patient_name"):
+        fields["patient_name"] = extracted["patient_name"][:255]
+    type(report).objects.filter(pk=report.pk).update(**fields)
+    for field, value in fields.items():
+        setattr(report, field, value)
+
+    LabObservation.objects.filter(report=report).delete()
+    observations = [
+        LabObservation(patient=patient, report=report, vital=vital, value=v["value"],
+                       unit=v["unit"], status=v["status"], observed_at=report.created_at)
+        for vital, v in classify_report(extracted).items()
+        if v["value"] is not None
+    ]
+    LabObservation.objects.bulk_create(observations)
+
+    summary = refresh_summary(patient)
+    print(f"[DATA] Report {report.id} recorded for patient {patient.id} "
+          f"({len(observations)} values, {summary.report_count} reports)")
+    return patient
+
+
+def refresh_summary(patient):
+    """
+    Rebuild the patient's rollup from the indexed observation table: the
+    newest observation of each vital (one index lookup per vital), so a
+    re-processed older report cannot replace a newer value.
+    """
+    summary, _ = PatientSummary.objects.select_for_update().get_or_create(patient=patient)
+    span = patient.reports.aggregate(count=Count("id"), first=Min("created_at"), last=Max("created_at"))
+    summary.report_count = span["count"]
+    summary.first_report_at, summary.last_report_at = span["first"], span["last"]
+    latest = {}
+    for vital in VITALS:
+        obs = (LabObservation.objects.filter(patient=patient, vital=vital)
+               .order_by("-observed_at", "-id").first())
+        if obs is not None:
+            latest[vital] = {
+                "value": obs.value, "unit": obs.unit, "status": obs.status,
+                "observed_at": obs.observed_at.isoformat(), "report_id": obs.report_id,
+            }
+    summary.latest = latest
+    summary.save()
+    return summary
+
+
+def patient_summary(patient):
+    """Patient + rollup as returned by the patients endpoints."""
+    summary = getattr(patient, "summary", None)
+    return {
+        "id": patient.id,
+        "name": patient.name,
+        "report_count": summary.report_count if summary else 0,
+        "first_report_at": summary.first_report_at if summary else None,
+        "last_report_at": summary.last_report_at if summary else None,
+        "latest": summary.latest if summary else {},
+    }
+
+
+def lab_trends(patient, vitals=None, since=None):
+    """
+    {vital: [{report_id, observed_at, value, unit, status}, ...]} oldest first,
+    read from the (patient, vital, observed_at) index.
+    """
+    vitals = [v for v in (vitals or VITALS) if v in VITALS]
+    rows = LabObservation.objects.filter(patient=patient, vital__in=vitals)
+    if since:
+        rows = rows.filter(observed_at__gte=since)
+    trends = {vital: [] for vital in vitals}
+    for vital, report_id, observed_at, value, unit, status in rows.order_by(
+            "vital", "observed_at").values_list(
+            "vital", "report_id", "observed_at", "value", "unit", "status"):
+        trends[vital].append({"report_id": report_id, "observed_at": observed_at,
+                              "value": value, "unit": unit, "status": status})
+    return trends
+
+
+def past_reports_for_chat(report, limit=PAST_REPORTS_IN_CHAT):
+    """
+    The patient's earlier reports as flat {created_at, vital: "value unit (status)"}
+    dicts for the chatbot's retrieval context, newest first.
+    """
+    if not report.patient_id:
+        return []
+    rows = (LabObservation.objects
+            .filter(patient_id=report.patient_id, observed_at__lt=report.created_at)
+            .order_by("-observed_at")
+            .values_list("report_id", "observed_at", "vital", "value", "unit", "status"))
+    past = {}
+    for report_id, observed_at, vital, value, unit, status in rows:
+        if report_id not in past:
+            if len(past) == limit:
+                break
+            past[report_id] = {"created_at": observed_at.date().isoformat()}
+        past[report_id][vital] = f"{value:g} {unit} ({status})"
+    return list(past.values())
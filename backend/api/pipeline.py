@@ -0,0 +1,215 @@
+"""
+Report processing pipeline shared by the synchronous upload view and
+background upload jobs: OCR -> extraction -> diet plan -> persist.
+"""
+import contextvars
+import copy
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db.models import F
+
+from .patients import record_report
+from .services import (MOCK_TEXT, check_plan_days, distribute_calories, extract_medical_data,
+                       generate_diet_plan, parse_report_values, start_quick_answer_precompute)
+from .vitals import VITAL_KEYS, classify_report, same_values
+
+# Speculative plan generation runs here while the extraction call is in flight
+_speculation_pool = ThreadPoolExecutor(max_workers=settings.SPECULATIVE_PLAN_WORKERS,
+                                       thread_name_prefix="plan-speculation")
+
+
+# Saved along with a replaced diet_plan (see start_new_plan)
+NEW_PLAN_FIELDS = ["plan_version", "quick_answers", "quick_answers_status"]
+
+
+def start_new_plan(report):
+    """
+    Mark the report's plan as replaced: saving NEW_PLAN_FIELDS bumps
+    plan_version and clears the quick answers, which described the old plan.
+    Refresh plan_version from the database after the save.
+    """
+    report.plan_version = F("plan_version") + 1
+    report.quick_answers = {}
+    report.quick_answers_status = "pending"
+
+
+def build_patient_sections(extracted, age="N/A"):
+    """patient_info + medical_data sections of the API response."""
+    return {
+        "patient_info": {
+            "name": extracted.get("patient_name", "N/A"),
+            "age": extracted.get("age", str(age)),
+            "gender": extracted.get("gender", "N/A"),
+        },
+        "medical_data": {
+            "blood_sugar": extracted.get("blood_sugar", "N/A"),
+            "cholesterol": extracted.get("cholesterol", "N/A"),
+            "bmi": extracted.get("bmi", "N/A"),
+            "hemoglobin": extracted.get("hemoglobin", "N/A"),
+            "total_protein": extracted.get("total_protein", "N/A"),
+            "albumin": extracted.get("albumin", "N/A"),
+            "abnormal_findings": extracted.get("abnormal_findings", []),
+        },
+        # Canonical-unit values with a status per vital, see api/vitals.py
+        "vitals": classify_report(extracted),
+    }
+
+
+def plan_days(diet_plan):
+    """Number of days in a stored plan (single-day plans have no "days" list)."""
+    return len((diet_plan or {}).get("days") or []) or 1
+
+
+def build_report_response(report, age="N/A", full_text="", ocr_stats=None):
+    """Shape a processed MedicalReport into the JSON returned to the frontend."""
+    if report.age is not None and age == "N/A":
+        age = report.age
+    return {
+        "message": "Report processed successfully",
+        "report_id": report.id,
+        "patient_id": report.patient_id,
+        **build_patient_sections(report.extracted_data or {}, age),
+        "diet_plan": report.diet_plan,
+        "plan_source": report.plan_source or "Unknown",
+        "preferences": {"diet_type": report.diet_type, "age": report.age,
+                        "days": plan_days(report.diet_plan)},
+        "raw_text_preview": full_text[:500] + "..." if full_text else "",
+        "ocr_stats": ocr_stats or {},
+    }
+
+
+def speculative_profile(full_text):
+    """
+    Lab values parsed locally from the OCR text to start the plan from, or
+    None when no lab value was found (the guess would almost surely miss).
+    """
+    predicted = parse_report_values(full_text)
+    if all(predicted[key] == "N/A" for key in VITAL_KEYS):
+        return None
+    return predicted
+
+
+def keep_speculation(predicted, extracted):
+    """
+    A plan generated from `predicted` stands only when every extracted lab value
+    is the same, since the plan text quotes the values it was given.
+    """
+    keep = same_values(predicted, extracted)
+    print(f"[PERF] Speculative plan {'kept' if keep else 'discarded: extracted values differ'}")
+    return keep
+
+
+def process_report(report, diet_type="Balanced", age=25, progress=None, days=1):
+    """
+    Run the full pipeline for a saved MedicalReport and store the results on it.
+
+    `progress(stage, **info)` is called as the pipeline advances (rendering,
+    ocr with page/pages, extraction, plan with the partial patient sections).
+    With SPECULATIVE_PLAN the plan is started from locally parsed OCR values
+    while the extraction call runs, and kept if the extracted values are the same.
+    Returns the response dict built by build_report_response.
+    """
+    progress = progress or (lambda stage, **info: None)
+
+    # 1. Extract Medical Data (Vision + LLM)
+    # Returns a FLAT dict with keys: patient_name, age, gender,
+    # blood_sugar, cholesterol, bmi, hemoglobin, total_protein,
+    # albumin, abnormal_findings
+    ocr_stats = {}
+    speculation = {}
+
+    def start_speculation(full_text):
+        # Plan from a local parse of the OCR text while the LLM extraction runs
+        predicted = speculative_profile(full_text)
+        if predicted:
+            # copy_context: the plan call is scheduled with this report's class and tenant
+            speculation.update(profile=predicted, future=_speculation_pool.submit(
+                contextvars.copy_context().run, generate_diet_plan, predicted, diet_type, age, days))
+
+    extracted, full_text = extract_medical_data(
+        report.report_file.path, progress=progress, stats=ocr_stats,
+        on_text=start_speculation if settings.SPECULATIVE_PLAN else None)
+
+    print(f"[VIEW] Diet Type received: {diet_type}")
+    print(f"[VIEW] Age received: {age}")
+    print(f"[VIEW] Extracted data keys: {list(extracted.keys())}")
+
+    # 2. Generate Diet Plan (LLM) with diet preference and age
+    progress("plan", partial=build_patient_sections(extracted, age))
+    if speculation and keep_speculation(speculation["profile"], extracted):
+        result = speculation["future"].result()
+    else:
+        if speculation:
+            speculation["future"].cancel()
+        result = generate_diet_plan(extracted, diet_type, age, days)
+
+    # Extract plan and source from hybrid response
+    diet_plan = result.get("plan", result)
+    plan_source = result.get("source", "Unknown")
+
+    # 3. Save extracted data and the generated plan
+    report.extracted_data = extracted
+    report.diet_plan = diet_plan
+    report.plan_source = plan_source
+    report.diet_type = diet_type
+    report.age = age
+    start_new_plan(report)
+    report.save()
+    report.refresh_from_db(fields=["plan_version"])
+    # Link to the patient and update their lab history / summary; mock
+    # profiles (OCR or extraction failed) are not the patient's values
+    if full_text != MOCK_TEXT:
+        record_report(report)
+
+    # 4. Pre-generate quick-start chat answers in the background
+    start_quick_answer_precompute(report, extracted, diet_plan)
+
+    return build_report_response(report, age, full_text, ocr_stats)
+
+
+def regenerate_plan(report, diet_type=None, age=None, days=None):
+    """
+    Rebuild a processed report's diet plan for new preferences, reusing the
+    stored extracted_data (no OCR or extraction).
+
+    - nothing changed: the stored plan is returned as is
+    - only age changed: calorie targets are redistributed, no LLM call
+    - diet type or number of days changed: generate_diet_plan runs again
+    Returns (response dict, what was done: "none" | "calories" | "plan").
+    """
+    start = time.perf_counter()
+    diet_type = diet_type or report.diet_type or "Balanced"
+    age = age if age is not None else (report.age or 25)
+    days = days or plan_days(report.diet_plan)
+    extracted = report.extracted_data or {}
+    same_plan = (report.diet_plan and diet_type == report.diet_type
+                 and days == plan_days(report.diet_plan))
+
+    if same_plan and age == report.age:
+        update = "none"
+    elif same_plan:
+        update = "calories"
+        diet_plan = distribute_calories(copy.deepcopy(report.diet_plan), age)
+        if "days" in diet_plan:
+            diet_plan["checks"] = check_plan_days(diet_plan["days"], age)
+        report.diet_plan = diet_plan
+    else:
+        update = "plan"
+        result = generate_diet_plan(extracted, diet_type, age, days)
+        report.diet_plan = result.get("plan", result)
+        report.plan_source = result.get("source", "Unknown")
+
+    if update != "none":
+        report.diet_type = diet_type
+        report.age = age
+        # Quick answers describe the old plan; rebuild them in the background
+        start_new_plan(report)
+        report.save(update_fields=["diet_plan", "plan_source", "diet_type", "age", *NEW_PLAN_FIELDS])
+        report.refresh_from_db(fields=["plan_version"])
+        start_quick_answer_precompute(report, extracted, report.diet_plan)
+
+    print(f"[PERF] Plan update '{update}' for report {report.id} in "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms")
+    return build_report_response(report, age), update
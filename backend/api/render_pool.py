@@ -0,0 +1,239 @@
+"""
+Process pool for the CPU-bound half of OCR: rendering PDF pages, cleaning them
+up (preprocess_page) and JPEG-encoding what is sent to Vision.
+
+Rendering a 300-DPI page and encoding it holds the GIL for most of its time,
+so on the request thread it serializes every upload in the process. With
+RENDER_PROCESSES > 0 that work runs in worker processes instead, and the
+request threads only wait on them and on the Groq calls.
+
+Page pixels and encoded JPEGs cross the process boundary in
+multiprocessing.shared_memory blocks; only their names and sizes go through
+the pool's pipe. Each block is unlinked by the parent once read.
+"""
+import multiprocessing
+import multiprocessing.util
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+from .ai_utils import EncodedBatch, iter_page_batches
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The shared render pool, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded Django process can copy held locks
+            _pool = ProcessPoolExecutor(max_workers=settings.RENDER_PROCESSES,
+                                        mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_worker)
+        return _pool
+
+
+# --- shared-memory handoff ---
+def _to_shared(data):
+    """Copy bytes-like `data` into a new shared-memory block; returns its name."""
+    block = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+    block.buf[:len(data)] = data
+    name = block.name
+    block.close()
+    return name
+
+
+def _read_shared(name, size, unlink=True):
+    """Bytes of a block written by _to_shared, unlinking it by default."""
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(block.buf[:size])
+    finally:
+        block.close()
+        if unlink:
+            block.unlink()
+
+
+def _unlink(name):
+    try:
+        block = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    block.close()
+    block.unlink()
+
+
+class SharedPage:
+    """
+    A rendered page held in shared memory. Has the width / height that
+    iter_page_batches groups by; the pixels stay in the block until release().
+    """
+
+    def __init__(self, name, mode, size):
+        self.name, self.mode, self.size = name, mode, size
+        self.width, self.height = size
+
+    def meta(self):
+        return self.name, self.mode, self.size
+
+    def release(self):
+        _unlink(self.name)
+
+
+# --- worker side (runs in the pool processes) ---
+_document = {}  # the PDF each worker opened last: {path: PdfDocument}
+
+
+def _close_pdf():
+    for document in _document.values():
+        document.close()
+    _document.clear()
+
+
+def _init_worker():
+    # Pool workers leave through os._exit, which skips atexit handlers
+    multiprocessing.util.Finalize(None, _close_pdf, exitpriority=10)
+
+
+def _open_pdf(file_path):
+    import pypdfium2 as pdfium
+
+    if file_path not in _document:
+        _close_pdf()
+        _document[file_path] = pdfium.PdfDocument(file_path)
+    return _document[file_path]
+
+
+def _render_worker(file_path, index, page_count, preprocess):
+    """
+    Render page `index` (0-based) and preprocess it. Returns the SharedPage
+    fields (name, mode, size), or None for a blank page. The PDF stays open
+    for the next page until the last one is rendered (or another file opened).
+    """
+    from .ai_utils import preprocess_page
+
+    try:
+        document = _open_pdf(file_path)
+        page = document[index]
+        img = page.render(scale=300/72).to_pil()
+        page.close()
+        if index == page_count - 1:
+            _close_pdf()
+    except Exception:
+        # Not a PDF: an image file, which is always one page
+        _close_pdf()
+        with Image.open(file_path) as source:
+            img = source.copy()
+    if preprocess:
+        img = preprocess_page(img)
+        if img is None:
+            return None
+    elif img.mode not in ("L", "RGB"):
+        img = img.convert("RGB")
+    return _to_shared(np.asarray(img).tobytes()), img.mode, img.size
+
+
+def _load_page(name, mode, size):
+    raw = _read_shared(name, size[0] * size[1] * len(mode), unlink=False)
+    return Image.frombytes(mode, size, raw)
+
+
+def _encode_worker(pages):
+    """
+    JPEG bytes of one OCR batch: the page itself, or the pages stitched into a
+    tile. `pages` is [(page_no, SharedPage meta), ...]. Returns (name, size).
+    """
+    import io
+
+    from .ai_utils import stitch_pages
+
+    images = [(page_no, _load_page(*meta)) for page_no, meta in pages]
+    image = images[0][1] if len(images) == 1 else stitch_pages(images)
+    out = io.BytesIO()
+    image.save(out, format="JPEG")
+    return _to_shared(out.getbuffer()), out.tell()
+
+
+# --- parent side ---
+def _discard(future):
+    """Free a render whose page will not be used, whenever it finishes."""
+    def release(done):
+        if not done.cancelled() and done.exception() is None and done.result():
+            _unlink(done.result()[0])
+    future.add_done_callback(release)
+
+
+def iter_rendered_pages(file_path, page_count, stats, preprocess=True):
+    """
+    (page_no, SharedPage) for each non-blank page, in order. Up to
+    RENDER_PROCESSES pages render ahead of the consumer; pages still pending
+    when it stops iterating (OCR early exit) are cancelled or freed.
+    """
+    pool = get_pool()
+    ahead = max(1, settings.RENDER_PROCESSES)
+    pending = deque()
+    next_index = 0
+    try:
+        while pending or next_index < page_count:
+            while next_index < page_count and len(pending) < ahead:
+                pending.append((next_index, pool.submit(_render_worker, file_path, next_index, page_count, preprocess)))
+                next_index += 1
+            index, future = pending.popleft()
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error rendering PDF page {index+1}: {e}")
+                stats["pages_failed"] += 1
+                continue
+            if result is None:
+                print(f"[SCAN] Page {index+1} is blank — skipping Vision call")
+                stats["pages_blank"] += 1
+                continue
+            yield index + 1, SharedPage(*result)
+    finally:
+        for _, future in pending:
+            if not future.cancel():
+                _discard(future)
+
+
+def encode_batch(batch):
+    """JPEG bytes for an OCR batch of SharedPages; frees the pages' pixels."""
+    try:
+        name, size = get_pool().submit(
+            _encode_worker, [(page_no, page.meta()) for page_no, page in batch]).result()
+        return _read_shared(name, size)
+    finally:
+        for _, page in batch:
+            page.release()
+
+
+def iter_encoded_batches(file_path, page_count, stats, tile=True):
+    """
+    iter_ocr_batches on the render pool: EncodedBatch objects carrying the
+    JPEG to send, grouped like iter_page_batches when `tile` is set.
+    """
+    rendered = iter_rendered_pages(file_path, page_count, stats, preprocess=settings.OCR_PREPROCESS)
+    held = {}  # pages rendered but not yet encoded (iter_page_batches may be holding them)
+
+    def pages():
+        for page_no, page in rendered:
+            held[page_no] = page
+            yield page_no, page
+
+    batches = iter_page_batches(pages()) if tile else ([page] for page in pages())
+    try:
+        for batch in batches:
+            for page_no, _ in batch:
+                held.pop(page_no, None)
+            yield EncodedBatch(batch, encode_batch(batch))
+    finally:
+        rendered.close()
+        for page in held.values():
+            page.release()
@@ -0,0 +1,304 @@
+"""
+Scheduling of the Groq-bound pipeline stages (OCR, extraction, plan, plus the
+field-fix calls of schema repair and the quick-answer precompute) between
+interactive uploads and bulk jobs. The stages share one pool of
+SCHEDULER_SLOTS concurrent Groq calls, since they draw on the same quota.
+
+- Priority classes: a free slot always goes to a waiting interactive call
+  before batch work, and SCHEDULER_INTERACTIVE_RESERVE slots are never given
+  to batch work, so an upload does not queue behind a pool full of bulk calls.
+- Per-tenant fairness: within a class, tenants with waiting calls take turns
+  (round robin), so one tenant's large import cannot starve another's.
+- Admission control: interactive reports beyond SCHEDULER_MAX_ACTIVE in
+  flight (503), or SCHEDULER_TENANT_MAX_ACTIVE for one tenant (429), are
+  turned away up front with Retry-After instead of queueing until they time
+  out. Batch work is never rejected; it waits for spare capacity.
+
+admit() / admitted() set the class and tenant of the current report in a
+contextvar; stage code wraps each Groq call in stage_slot(stage), or
+astage_slot(stage) on the async pipeline. SCHEDULER_SLOTS = 0 turns the
+stage gating and admission control off.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+
+INTERACTIVE, BATCH = "interactive", "batch"
+PRIORITIES = (INTERACTIVE, BATCH)  # highest first
+STAGES = ("ocr", "extraction", "plan", "repair", "quick_answers")
+
+# (priority, tenant) of the report being processed in this thread / task
+_current = contextvars.ContextVar("schedule", default=(INTERACTIVE, "default"))
+
+
+class Overloaded(Exception):
+    """An interactive report was not admitted; `status` is 503 or 429."""
+
+    def __init__(self, message, status=503):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = settings.SCHEDULER_RETRY_AFTER
+
+
+class _Waiter:
+    """One call waiting for a stage slot: a threading.Event, or a future on `loop`."""
+
+    def __init__(self, tenant, stage, loop=None):
+        self.tenant = tenant
+        self.stage = stage
+        self.loop = loop
+        self.granted = False
+        self.enqueued_at = time.perf_counter()
+        if loop:
+            self.future = loop.create_future()
+        else:
+            self.event = threading.Event()
+
+    def grant(self):
+        self.granted = True
+        if self.loop:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+        else:
+            self.event.set()
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class SlotScheduler:
+    """Slots for concurrent Groq calls, handed out by priority, then tenant round robin."""
+
+    def __init__(self, slots, reserve):
+        self.slots = slots
+        self.reserve = min(reserve, slots - 1)
+        self._lock = threading.Lock()
+        self.in_use = Counter()
+        # priority -> {tenant: deque of waiters}; a tenant moves to the end after each grant
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}
+        # Keyed by (stage, priority)
+        self.granted = Counter()
+        self.wait_s = Counter()
+        self.max_wait_s = Counter()
+
+    def _has_room(self, priority):
+        used = sum(self.in_use.values())
+        limit = self.slots - (self.reserve if priority == BATCH else 0)
+        return used < limit
+
+    def _pop(self, priority):
+        tenants = self._queues[priority]
+        tenant, waiters = next(iter(tenants.items()))
+        waiter = waiters.popleft()
+        del tenants[tenant]
+        if waiters:
+            tenants[tenant] = waiters
+        return waiter
+
+    def _dispatch(self):
+        """Grant free slots to waiters, highest priority first. Caller holds the lock."""
+        for priority in PRIORITIES:
+            while self._queues[priority] and self._has_room(priority):
+                waiter = self._pop(priority)
+                waited = time.perf_counter() - waiter.enqueued_at
+                key = (waiter.stage, priority)
+                self.in_use[priority] += 1
+                self.granted[key] += 1
+                self.wait_s[key] += waited
+                self.max_wait_s[key] = max(self.max_wait_s[key], waited)
+                waiter.grant()
+
+    def _enqueue(self, priority, tenant, stage, loop=None):
+        waiter = _Waiter(tenant, stage, loop)
+        with self._lock:
+            self._queues[priority].setdefault(tenant, deque()).append(waiter)
+            self._dispatch()
+        return waiter
+
+    def acquire(self, priority, tenant, stage):
+        self._enqueue(priority, tenant, stage).event.wait()
+
+    async def aacquire(self, priority, tenant, stage):
+        waiter = self._enqueue(priority, tenant, stage, asyncio.get_running_loop())
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            self._abandon(priority, waiter)
+            raise
+
+    def _abandon(self, priority, waiter):
+        """A cancelled async waiter gives back its slot, or leaves the queue."""
+        with self._lock:
+            if not waiter.granted:
+                waiters = self._queues[priority].get(waiter.tenant)
+                waiters.remove(waiter)
+                if not waiters:
+                    del self._queues[priority][waiter.tenant]
+                return
+        self.release(priority)
+
+    def release(self, priority):
+        with self._lock:
+            self.in_use[priority] -= 1
+            self._dispatch()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "slots": self.slots,
+                "interactive_reserve": self.reserve,
+                **{priority: {
+                    "in_use": self.in_use[priority],
+                    "waiting": sum(len(w) for w in self._queues[priority].values()),
+                    "waiting_tenants": len(self._queues[priority]),
+                    "stages": {stage: {
+                        "granted": self.granted[(stage, priority)],
+                        "avg_wait_ms": round(self.wait_s[(stage, priority)] / self.granted[(stage, priority)]
+                                             * 1000, 1) if self.granted[(stage, priority)] else 0.0,
+                        "max_wait_ms": round(float(self.max_wait_s[(stage, priority)]) * 1000, 1),
+                    } for stage in STAGES},
+                } for priority in PRIORITIES},
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """The process-wide SlotScheduler, or None when scheduling is off."""
+    global _scheduler
+    if settings.SCHEDULER_SLOTS <= 0:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = SlotScheduler(settings.SCHEDULER_SLOTS, settings.SCHEDULER_INTERACTIVE_RESERVE)
+        return _scheduler
+
+
+@contextmanager
+def stage_slot(stage):
+    """Hold a Groq slot for one `stage` call of the current report's class and tenant."""
+    scheduler = get_scheduler()
+    if scheduler is None:
+        yield
+        return
+    priority, tenant = _current.get()
+    scheduler.acquire(priority, tenant, stage)
+    try:
+        yield
+    finally:
+        scheduler.release(priority)
+
+
+@asynccontextmanager
+async def astage_slot(stage):
+    """stage_slot for the async pipeline; waiting does not block the event loop."""
+    scheduler = get_scheduler()
+    if scheduler is None:
+        yield
+        return
+    priority, tenant = _current.get()
+    await scheduler.aacquire(priority, tenant, stage)
+    try:
+        yield
+    finally:
+        scheduler.release(priority)
+
+
+# --- admission control ---
+_active = Counter()  # (priority, tenant) -> reports admitted and not yet finished
+_rejected = Counter()  # status -> count
+_admission_lock = threading.Lock()
+
+
+class Ticket:
+    """An admitted report. Run its stages inside active(); release() when it is done."""
+
+    def __init__(self, priority, tenant):
+        self.priority, self.tenant = priority, tenant
+        self._released = False
+
+    @contextmanager
+    def active(self):
+        token = _current.set((self.priority, self.tenant))
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def release(self):
+        with _admission_lock:
+            if not self._released:
+                self._released = True
+                _active[(self.priority, self.tenant)] -= 1
+
+
+def admit(priority=INTERACTIVE, tenant="default"):
+    """
+    Admit one report for processing, or raise Overloaded. Only interactive
+    reports are limited; batch reports are always admitted.
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+    with _admission_lock:
+        if priority == INTERACTIVE and settings.SCHEDULER_SLOTS > 0:
+            active = sum(count for (p, _), count in _active.items() if p == INTERACTIVE)
+            if active >= settings.SCHEDULER_MAX_ACTIVE:
+                _rejected[503] += 1
+                raise Overloaded("The server is busy processing other reports. Please retry shortly.")
+            if _active[(priority, tenant)] >= settings.SCHEDULER_TENANT_MAX_ACTIVE:
+                _rejected[429] += 1
+                raise Overloaded("Too many reports in progress for this client. Please wait for "
+                                 "one to finish.", status=429)
+        _active[(priority, tenant)] += 1
+    return Ticket(priority, tenant)
+
+
+@contextmanager
+def admitted(priority=INTERACTIVE, tenant="default"):
+    """admit() for work that finishes inside the block."""
+    ticket = admit(priority, tenant)
+    try:
+        with ticket.active():
+            yield ticket
+    finally:
+        ticket.release()
+
+
+def request_tenant(request):
+    """
+    Tenant of an API request, from nothing a client can pick for itself: the
+    authenticated user; else the X-Tenant-ID header, but only when the request
+    comes from a TENANT_HEADER_TRUSTED_PROXIES address (the Streamlit server
+    sends one id per browser session); else the client address.
+    Touches request.user, so async views call it through sync_to_async.
+    """
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    address = request.META.get("REMOTE_ADDR") or "unknown"
+    header = request.META.get("HTTP_X_TENANT_ID")
+    if header and address in settings.TENANT_HEADER_TRUSTED_PROXIES:
+        return f"session:{header[:64]}"
+    return f"addr:{address}"
+
+
+def scheduler_stats():
+    with _admission_lock:
+        active = {priority: sum(count for (p, _), count in _active.items() if p == priority)
+                  for priority in PRIORITIES}
+        rejected = {str(status): count for status, count in _rejected.items()}
+    scheduler = get_scheduler()
+    return {
+        "enabled": scheduler is not None,
+        "active_reports": active,
+        "rejected": rejected,
+        "slots": scheduler.stats() if scheduler else None,
+    }
@@ -0,0 +1,298 @@
+"""
+Declarative schemas for LLM JSON outputs, with coercion and repair.
+
+Instead of rejecting a near-valid response (a list sent as a comma-separated
+string, "Breakfast" instead of "breakfast", values nested one level deeper
+than asked), conform() coerces it to the schema and reports what it changed.
+Whatever still cannot be repaired is returned as a list of problem paths, so
+the caller can ask the model to fix just those fields instead of regenerating
+everything. Outcomes are counted per schema (see repair_stats).
+
+A schema is a dict of field name -> spec with:
+    type      "str" | "list" | "object"
+    required  field must end up present and non-empty (default False)
+    default   value used when the field is missing and not required
+    aliases   other key names the model uses for this field
+    schema    nested schema for "object" fields, or for the items of a "list"
+"""
+import copy
+import json
+import re
+
+from django.core.cache import cache
+
+MEAL_SCHEMA = {
+    "food_items": {"type": "list", "required": True, "aliases": ["items", "foods", "food"]},
+    "total_calories": {"type": "str", "default": "N/A", "aliases": ["calories", "kcal"]},
+}
+
+DAY_SCHEMA = {
+    "breakfast": {"type": "object", "required": True, "schema": MEAL_SCHEMA},
+    "lunch": {"type": "object", "required": True, "schema": MEAL_SCHEMA},
+    "dinner": {"type": "object", "required": True, "schema": MEAL_SCHEMA},
+}
+
+DIET_PLAN_SCHEMA = {
+    **DAY_SCHEMA,
+    "doctor_note": {"type": "str", "default": "", "aliases": ["note", "doctors_note", "advice"]},
+}
+
+MULTI_DAY_PLAN_SCHEMA = {
+    "days": {"type": "list", "required": True, "schema": DAY_SCHEMA, "aliases": ["plan", "meal_plan"]},
+    "doctor_note": {"type": "str", "default": "", "aliases": ["note", "doctors_note", "advice"]},
+}
+
+# Answers keyed by question number ("1", "2", ...); the caller maps them to its questions
+QUICK_ANSWERS_SCHEMA = {
+    "answers": {"type": "object", "required": True, "schema": {}, "aliases": ["responses"]},
+}
+
+EXTRACTION_SCHEMA = {
+    "patient_name": {"type": "str", "default": "", "aliases": ["name", "patient"]},
+    "age": {"type": "str", "default": "N/A"},
+    "gender": {"type": "str", "default": "N/A", "aliases": ["sex"]},
+    "blood_sugar": {"type": "str", "default": "N/A",
+                    "aliases": ["glucose", "blood_glucose", "fasting_blood_sugar", "fbs", "sugar"]},
+    "cholesterol": {"type": "str", "default": "N/A", "aliases": ["total_cholesterol", "serum_cholesterol"]},
+    "bmi": {"type": "str", "default": "N/A", "aliases": ["body_mass_index"]},
+    "hemoglobin": {"type": "str", "default": "N/A", "aliases": ["haemoglobin", "hb", "hgb"]},
+    "total_protein": {"type": "str", "default": "N/A", "aliases": ["protein", "serum_protein"]},
+    "albumin": {"type": "str", "default": "N/A", "aliases": ["serum_albumin", "alb"]},
+    "abnormal_findings": {"type": "list", "default": [], "aliases": ["findings", "abnormalities"]},
+}
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_LIST_SPLIT = re.compile(r"\s*(?:\n|;|,(?![^(]*\)))\s*")
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+
+def _norm(key):
+    return re.sub(r"[^a-z0-9]+", "_", str(key).lower()).strip("_")
+
+
+def parse_llm_json(text):
+    """
+    json.loads with the usual LLM slips repaired: code fences, prose around the
+    object, trailing commas. Raises ValueError when nothing usable is found.
+    """
+    text = _FENCE.sub("", (text or "").strip())
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        raise ValueError("no JSON object in model output")
+    try:
+        return json.loads(_TRAILING_COMMA.sub(r"\1", text[start:end + 1]))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"unparseable model output: {e}") from e
+
+
+def _find(data, name, spec, depth=2):
+    """
+    (value, source key path) for a field: exact key, then case/format-insensitive
+    key or alias, then the same inside nested objects (e.g. patient_info.name).
+    """
+    if name in data:
+        return data[name], name
+    wanted = {_norm(name)} | {_norm(a) for a in spec.get("aliases", [])}
+    for key, value in data.items():
+        if _norm(key) in wanted:
+            return value, key
+    if depth:
+        for key, value in data.items():
+            if isinstance(value, dict):
+                found, path = _find(value, name, spec, depth - 1)
+                if path is not None:
+                    return found, f"{key}.{path}"
+    return None, None
+
+
+def _to_str(value):
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return f"{value:g}"
+    if isinstance(value, list):
+        return ", ".join(s for s in (_to_str(v) for v in value) if s)
+    if isinstance(value, dict):
+        # {"value": 110, "unit": "mg/dL"} -> "110 mg/dL"; other objects are flattened
+        keys = ("value", "unit") if "value" in value else value
+        parts = [_to_str(value.get(k)) for k in keys]
+        return (" " if "value" in value else " - ").join(p for p in parts if p) or None
+    return str(value)
+
+
+def _to_list(value):
+    if isinstance(value, list):
+        return value
+    if isinstance(value, str):
+        text = value.strip()
+        if text.startswith("["):
+            try:
+                parsed = json.loads(text)
+                if isinstance(parsed, list):
+                    return parsed
+            except json.JSONDecodeError:
+                pass
+        return [_BULLET.sub("", part) for part in _LIST_SPLIT.split(text) if _BULLET.sub("", part)]
+    if isinstance(value, dict):
+        return list(value.values())
+    return None if value is None else [value]
+
+
+def _conform_value(value, spec, path, repairs, problems):
+    kind = spec["type"]
+    if kind == "str":
+        result = _to_str(value)
+        if result is not None and not isinstance(value, str):
+            repairs.append(f"{path}: {type(value).__name__} -> str")
+        return result
+
+    if kind == "list":
+        result = _to_list(value)
+        if result is None:
+            return None
+        if not isinstance(value, list):
+            repairs.append(f"{path}: {type(value).__name__} -> list")
+        if "schema" in spec:
+            items = []
+            for i, item in enumerate(result):
+                item = _conform_value(item, {"type": "object", "schema": spec["schema"]},
+                                      f"{path}[{i}]", repairs, problems)
+                if item is not None:
+                    items.append(item)
+            return items
+        items = [_to_str(item) for item in result]
+        return [item for item in items if item]
+
+    # object
+    if isinstance(value, str):
+        try:
+            value = parse_llm_json(value)
+            repairs.append(f"{path}: JSON string -> object")
+        except ValueError:
+            pass
+    schema = spec["schema"]
+    if isinstance(value, list):
+        # A bare list where an object with one required list field was expected
+        # (e.g. "breakfast": ["oats", "milk"])
+        list_fields = [k for k, s in schema.items() if s["type"] == "list" and s.get("required")]
+        if len(list_fields) != 1:
+            return None
+        value = {list_fields[0]: value}
+        repairs.append(f"{path}: list -> {{{list_fields[0]}}}")
+    if not isinstance(value, dict):
+        return None
+    result, sub_repairs, sub_problems = conform(value, schema, path)
+    repairs.extend(sub_repairs)
+    problems.extend(sub_problems)
+    return result
+
+
+def conform(data, schema, path="", keep_extra=True):
+    """
+    Coerce `data` to `schema`. Returns (result, repairs, problems):
+    result has the schema's fields, repairs describes each change made,
+    problems lists paths of required fields that are still missing or empty
+    (e.g. "days[2].lunch"). Unknown extra keys are kept unless keep_extra=False.
+    """
+    if not isinstance(data, dict):
+        return {}, [], [path or "<root>"]
+    result, repairs, problems = {}, [], []
+    used = set()
+    for name, spec in schema.items():
+        field_path = f"{path}.{name}" if path else name
+        value, source = _find(data, name, spec)
+        if source is not None and source != name:
+            repairs.append(f"{field_path}: taken from '{source}'")
+        if source is not None:
+            used.add(source.split(".")[0])
+            value = _conform_value(value, spec, field_path, repairs, problems)
+        if value in (None, "", [], {}):
+            if spec.get("required"):
+                problems.append(field_path)
+                continue
+            value = spec.get("default")
+        result[name] = value
+    if keep_extra:
+        for key, value in data.items():
+            if key not in used and key not in result:
+                result[key] = value
+    return result, repairs, problems
+
+
+_PATH_PART = re.compile(r"([^.\[\]]+)|\[(\d+)\]")
+
+
+def set_path(data, path, value):
+    """
+    Set a value by problem path ("days[2].lunch"), creating missing objects;
+    an index one past the end of a list appends.
+    """
+    parts = [int(i) if i else key for key, i in _PATH_PART.findall(path)]
+    target = data
+    for part, nxt in zip(parts, parts[1:]):
+        empty = [] if isinstance(nxt, int) else {}
+        if isinstance(part, int):
+            while len(target) <= part:
+                target.append(copy.deepcopy(empty))
+            target = target[part]
+        else:
+            if not isinstance(target.get(part), type(empty)):
+                target[part] = empty
+            target = target[part]
+    last = parts[-1]
+    if isinstance(last, int):
+        while len(target) <= last:
+            target.append(None)
+    target[last] = value
+
+
+def skeleton(schema):
+    """Example object for a schema, used to show the model the expected shape."""
+    example = {}
+    for name, spec in schema.items():
+        if spec["type"] == "object":
+            example[name] = skeleton(spec["schema"])
+        elif spec["type"] == "list":
+            example[name] = [skeleton(spec["schema"])] if "schema" in spec else ["..."]
+        else:
+            example[name] = "..."
+    return example
+
+
+def _stats_key(schema_name, outcome):
+    return f"llm_output:{schema_name}:{outcome}"
+
+
+OUTCOMES = ("valid", "repaired", "field_fixed", "failed")
+
+
+def record_outcome(schema_name, outcome):
+    """Count one parse outcome (valid | repaired | field_fixed | failed) for a schema."""
+    key = _stats_key(schema_name, outcome)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def repair_stats(schema_names=("extraction", "diet_plan", "multi_day_plan", "quick_answers")):
+    """Per-schema outcome counts with repair and failure rates."""
+    stats = {}
+    for name in schema_names:
+        counts = {o: cache.get(_stats_key(name, o), 0) for o in OUTCOMES}
+        total = sum(counts.values())
+        stats[name] = {
+            **counts,
+            "total": total,
+            "repair_rate": round((counts["repaired"] + counts["field_fixed"]) / total, 3) if total else 0.0,
+            "failure_rate": round(counts["failed"] / total, 3) if total else 0.0,
+        }
+    return stats
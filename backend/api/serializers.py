@@ -5,3 +5,8 @@ class MedicalReportSerializer(serializers.ModelSerializer):
     class Meta:
         model = MedicalReport
         fields = '__all__'
+        # Uploads only supply the file; everything else is filled in by the pipeline
+        read_only_fields = [
+            'patient', 'patient_name', 'extracted_data', 'diet_plan', 'plan_source', 'diet_type', 'age',
+            'quick_answers', 'quick_answers_status', 'plan_version', 'created_at',
+        ]
@@ -1,12 +1,51 @@
+import contextvars
+import copy
 import json
 import random
 import re
+import threading
 from django.conf import settings
+from django.db import connection
 from groq import Groq
-from .ai_utils import load_document_images, get_markdown_from_page
+from .fakegroq import FakeGroq, RecordingGroq
+from .render_pool import iter_encoded_batches
+from .scheduler import stage_slot
+from .schemas import (DIET_PLAN_SCHEMA, EXTRACTION_SCHEMA, MULTI_DAY_PLAN_SCHEMA, QUICK_ANSWERS_SCHEMA,
+                      conform, parse_llm_json, record_outcome, set_path, skeleton)
+from .vitals import VITALS, classify_batch, classify_report, reference_ranges_text
+from .ai_utils import (iter_document_images, count_document_pages, get_markdown_from_batch,
+                       iter_page_batches, preprocess_page)
 
-# Initialize Client
-client = Groq(api_key=settings.GROQ_API_KEY)
+def make_client():
+    """The Groq client from settings (the offline stand-in when GROQ_FAKE is set)."""
+    if settings.GROQ_FAKE:
+        print("[WARN] GROQ_FAKE is on: LLM calls are answered from recordings")
+        return FakeGroq.from_settings()
+    groq_client = Groq(api_key=settings.GROQ_API_KEY)
+    if settings.GROQ_RECORD_PATH:
+        groq_client = RecordingGroq(groq_client, settings.GROQ_RECORD_PATH)
+    return groq_client
+
+class LazyClient:
+    """
+    Builds the shared client on first use, so importing this module (in tests,
+    management commands, migrations) needs no GROQ_API_KEY.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return getattr(self._client, name)
+
+# Initialize Client (shared connection pool, created on the first LLM call)
+client = LazyClient(make_client)
 
 # Model configuration with fallbacks (primary → legacy → fast)
 TEXT_MODELS = ["llama-3.3-70b-versatile", "llama3-70b-8192", "llama-3.1-8b-instant"]
@@ -27,37 +66,190 @@ def call_groq_with_fallback(messages, response_format=None):
             print(f"[WARN] Model {model} failed: {type(e).__name__}: {e}")
     raise last_error
 
+# --- STRUCTURED OUTPUT: coerce near-valid JSON, fix only what is still missing ---
+# More broken fields than this are not worth a targeted fix; the caller falls back instead
+MAX_FIELD_FIXES = 6
+
+def request_field_fixes(result, problems, schema, context):
+    """
+    One small follow-up call asking the model for just the listed paths.
+    Returns {path: value} (possibly empty).
+    """
+    prompt = f"""You produced this JSON, but some required fields are missing or invalid:
+
+{json.dumps(result, indent=1)[:4000]}
+
+Paths to fix: {json.dumps(problems)}
+Expected overall shape: {json.dumps(skeleton(schema))}
+
+{context}
+
+Return ONLY a JSON object {{"fixes": {{"<path>": <value>, ...}}}} with a value for every path listed above, each in the expected shape."""
+    with stage_slot("repair"):
+        response = call_groq_with_fallback(
+            messages=[{"role": "user", "content": prompt}],
+            response_format={"type": "json_object"}
+        )
+    fixes = parse_llm_json(response.choices[0].message.content).get("fixes", {})
+    return {path: value for path, value in fixes.items() if path in problems} if isinstance(fixes, dict) else {}
+
+def parse_llm_output(content, schema, schema_name, context=None, check=None, keep_extra=True):
+    """
+    Parse and conform a model's JSON to `schema` instead of rejecting it on the
+    first slip. Paths still missing afterwards (plus any from `check(result)`)
+    get one targeted fix call when `context` is given.
+    Records the outcome (valid / repaired / field_fixed / failed) and returns
+    the conformed dict, or None when it could not be made valid.
+    """
+    try:
+        data = parse_llm_json(content)
+    except ValueError as e:
+        print(f"[REPAIR] {schema_name}: {e}")
+        record_outcome(schema_name, "failed")
+        return None
+
+    result, repairs, problems = conform(data, schema, keep_extra=keep_extra)
+    problems += check(result) if check else []
+    outcome = "repaired" if repairs else "valid"
+    if repairs:
+        print(f"[REPAIR] {schema_name}: {'; '.join(repairs[:5])}")
+
+    if problems and context is not None and len(problems) <= MAX_FIELD_FIXES:
+        print(f"[REPAIR] {schema_name}: asking for {len(problems)} field(s): {', '.join(problems)}")
+        try:
+            for path, value in request_field_fixes(result, problems, schema, context).items():
+                set_path(result, path, value)
+            result, _, problems = conform(result, schema, keep_extra=keep_extra)
+            problems += check(result) if check else []
+            outcome = "field_fixed"
+        except Exception as e:
+            print(f"[WARN] Field fix failed: {type(e).__name__}: {e}")
+
+    if problems:
+        print(f"[REPAIR] {schema_name}: still invalid at {', '.join(problems[:5])}")
+        record_outcome(schema_name, "failed")
+        return None
+    record_outcome(schema_name, outcome)
+    return result
+
 # --- HELPER FUNCTION: NAME EXTRACTION ---
+_NAME = r"[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*"
+
+# Common prefixes for name extraction, highest priority first
+NAME_PREFIXES = [
+    r"Name\s*[:\-]\s*",  # Name: John Doe
+    r"Patient(?:'s)?\s+Name\s*[:\-]\s*",  # Patient Name: John Doe
+    r"Patient\s*[:\-]\s*",  # Patient: John Doe
+    r"Mr\.?\s+",  # Mr. John Doe
+    r"Ms\.?\s+",  # Ms. Jane Doe
+    r"Mrs\.?\s+",  # Mrs. Jane Doe
+    r"Dr\.?\s+",  # Dr. John Doe (might be doctor, but worth trying)
+]
+
+# Compiled once; each is searched only within the report header (see _name_header)
+NAME_PATTERNS = [re.compile(f"{prefix}({_NAME})") for prefix in NAME_PREFIXES]
+_DIGIT = re.compile(r"\d")
+_PAGE_BREAK = re.compile(r"\n--- PAGE \d+ ---\n")
+
+NAME_HEADER_CHARS = 3000  # patient details sit in the report header
+
+def _name_header(text):
+    """First page of the OCR text (page markers stripped), capped at NAME_HEADER_CHARS."""
+    pages = [page for page in _PAGE_BREAK.split(text, maxsplit=2) if page.strip()]
+    return pages[0][:NAME_HEADER_CHARS] if pages else ""
+
 def find_patient_name(text):
     """
-    Extract patient name from raw text using regex patterns.
-    Returns the first valid name found, or None.
+    Extract patient name from the header of the first page using regex patterns.
+    Returns the name from the highest-priority pattern that matches, or None.
     """
     if not text:
         return None
-    
-    # Common patterns for name extraction
-    patterns = [
-        r"Name\s*[:\-]\s*([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",  # Name: John Doe
-        r"Patient(?:'s)?\s+Name\s*[:\-]\s*([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",  # Patient Name: John Doe
-        r"Patient\s*[:\-]\s*([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",  # Patient: John Doe
-        r"Mr\.?\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",  # Mr. John Doe
-        r"Ms\.?\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",  # Ms. Jane Doe
-        r"Mrs\.?\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",  # Mrs. Jane Doe
-        r"Dr\.?\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",  # Dr. John Doe (might be doctor, but worth trying)
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text)
+
+    header = _name_header(text)
+    for pattern in NAME_PATTERNS:
+        match = pattern.search(header)
         if match:
             name = match.group(1).strip()
             # Validate: name should be 2-50 chars and not contain numbers
-            if 2 <= len(name) <= 50 and not re.search(r'\d', name):
+            if 2 <= len(name) <= 50 and not _DIGIT.search(name):
                 print(f"[OK] Regex found name: {name}")
                 return name
-    
+
     return None
 
+# --- HELPER FUNCTION: LOCAL FIELD DETECTION (early-exit OCR) ---
+# A label followed by a number on the same line, e.g. "Fasting Blood Sugar : 182 mg/dL"
+_VALUE = r"[^\n\d]{0,40}?\d+(?:\.\d+)?"
+
+LAB_FIELD_PATTERNS = {
+    "blood_sugar": re.compile(r"\b(?:glucose|blood\s+sugar|fasting\s+sugar|sugar\s+level|FBS)\b" + _VALUE, re.IGNORECASE),
+    "cholesterol": re.compile(r"(?<!HDL\s)(?<!LDL\s)(?<!VLDL\s)\b(?:cholesterol|TC)\b" + _VALUE, re.IGNORECASE),
+    "bmi": re.compile(r"\b(?:BMI|body\s+mass\s+index)\b" + _VALUE, re.IGNORECASE),
+    "hemoglobin": re.compile(r"\b(?:ha?emoglobin|Hb|Hgb)\b(?!\s*A1c)" + _VALUE, re.IGNORECASE),
+    "total_protein": re.compile(r"\b(?:total|serum)\s+protein\b" + _VALUE, re.IGNORECASE),
+    "albumin": re.compile(r"\b(?:albumin|alb)\b(?!\s*/)" + _VALUE, re.IGNORECASE),
+}
+
+PATIENT_FIELD_PATTERNS = {
+    "age": re.compile(r"\bage\b[^\n\d]{0,15}\d{1,3}|\b\d{1,3}\s*(?:y|yrs?|years?)\b", re.IGNORECASE),
+    "gender": re.compile(r"\b(?:sex|gender)\s*[:\-/]?\s*(?:m|f|male|female)\b|\b(?:male|female)\b", re.IGNORECASE),
+}
+
+HEIGHT_PATTERN = re.compile(r"\bheight\b" + _VALUE, re.IGNORECASE)
+WEIGHT_PATTERN = re.compile(r"\bweight\b" + _VALUE, re.IGNORECASE)
+
+# Every field extract_medical_data returns; abnormal_findings is derived from the lab values
+TARGET_FIELDS = ("patient_name", "age", "gender", *LAB_FIELD_PATTERNS, "abnormal_findings")
+
+def detect_report_fields(text, found=None):
+    """
+    Cheap local check of which target fields a page's OCR text already covers.
+    Adds to and returns the `found` set. Only used to decide when to stop OCR —
+    the LLM extraction still reads the values themselves.
+    """
+    found = set() if found is None else found
+    if not text:
+        return found
+    if "patient_name" not in found and find_patient_name(text):
+        found.add("patient_name")
+    for field, pattern in {**PATIENT_FIELD_PATTERNS, **LAB_FIELD_PATTERNS}.items():
+        if field not in found and pattern.search(text):
+            found.add(field)
+    # BMI can be calculated from height and weight
+    if "bmi" not in found and HEIGHT_PATTERN.search(text) and WEIGHT_PATTERN.search(text):
+        found.add("bmi")
+    if found.issuperset(LAB_FIELD_PATTERNS):
+        found.add("abnormal_findings")
+    return found
+
+_NUMBER_AT_END = re.compile(r"\d+(?:\.\d+)?$")
+
+def parse_report_values(text):
+    """
+    Fast local guess at the lab values in OCR text, in the flat shape
+    extract_medical_data returns ("182 mg/dL", or "N/A" when not found).
+    Only used to start a speculative diet plan; abnormal_findings lists each
+    vital outside its Normal band.
+    """
+    data = {}
+    for field, pattern in LAB_FIELD_PATTERNS.items():
+        match = pattern.search(text or "")
+        if not match:
+            data[field] = "N/A"
+            continue
+        # The pattern ends at the number; the unit follows on the same line
+        number = _NUMBER_AT_END.search(match.group()).group()
+        rest = text[match.end():].split("\n", 1)[0]
+        unit = re.match(r"\s*([a-zA-Zµμ²/0-9]*(?:/[a-zA-Z0-9²]+)?)", rest).group(1)
+        data[field] = f"{number} {unit}".strip()
+    data["abnormal_findings"] = [
+        f"{vital['status']} {VITALS[key]['label']}"
+        for key, vital in classify_report(data).items()
+        if vital["status"] not in ("Normal", "No Data")
+    ]
+    return data
+
 # --- MOCK PROFILES FOR DEMO (Safety Net) ---
 MOCK_PROFILES = [
     {
@@ -268,43 +460,8 @@ MOCK_PROFILES = [
     }
 ]
 
-def extract_medical_data(file_path):
-    print(f"[VIEW] PROCESSING FILE: {file_path}")
-    
-    # --- PHASE 1: SEE (Vision OCR) ---
-    full_text = ""
-    try:
-        images = load_document_images(file_path)
-        print(f"[SCAN] Found {len(images)} pages. Reading with Vision AI...")
-        
-        for i, img in enumerate(images):
-            try:
-                page_text = get_markdown_from_page(img, client)
-                full_text += f"\n--- PAGE {i+1} ---\n{page_text}"
-            except Exception as e:
-                print(f"[WARN] Page read error: {e}")
-                
-        if not full_text:
-            raise Exception("No text extracted")
-            
-        print("[OK] Text Extracted Successfully")
-
-    except Exception as e:
-        print(f"[ERROR] OCR FAILED: {e}")
-        # RETURN RANDOM MOCK MEDICAL DATA (diet plan will be generated based on preference later)
-        mock = random.choice(MOCK_PROFILES)
-        print(f"[WARN] Switching to Mock Medical Data: {mock['condition']}")
-        # Use realistic name from mock profile
-        mock_name = "Rahul Sharma" if "Diabetes" in mock['condition'] else "Priya Patel"
-        mock_med = mock['medical_data'].copy()
-        mock_med["patient_name"] = mock_name
-        mock_med["age"] = "35"
-        mock_med["gender"] = "N/A"
-        return mock_med, "Mock Text Used"
-
-    # --- PHASE 2: THINK (Extraction) ---
-    print("[AI] Extracting structured health data...")
-    EXTRACTION_PROMPT = """You are a Medical Data Extraction AI. Analyze the following medical report and extract structured data.
+# --- EXTRACTION (shared by the sync pipeline and api/async_pipeline.py) ---
+EXTRACTION_PROMPT = """You are a Medical Data Extraction AI. Analyze the following medical report and extract structured data.
 
 You MUST return a JSON object with EXACTLY this structure:
 {
@@ -332,89 +489,185 @@ EXTRACTION RULES:
 4. Always include the unit (mg/dL, g/dL, etc.) with the value
 5. For abnormal_findings: compare values against normal ranges and list ALL issues
    Normal ranges for reference:
-   - Blood sugar: 70-100 mg/dL (fasting)
-   - Cholesterol: <200 mg/dL
-   - Hemoglobin: 12-17 g/dL
-   - Total protein: 6.0-8.3 g/dL
-   - Albumin: 3.5-5.5 g/dL
-   - BMI: 18.5-24.9
+""" + reference_ranges_text() + """
 6. Return ONLY the JSON object"""
+
+def extraction_messages(full_text):
+    return [{"role": "user", "content": f"{EXTRACTION_PROMPT}\n\nREPORT:\n{full_text}"}]
+
+def finish_extraction(content, full_text):
+    """
+    Conform the extraction model's JSON to the flat dict the views consume and
+    fill a missing name from the report text. Raises ValueError if unusable.
+    """
+    # Nested (patient_info/medical_data), renamed or mistyped fields are
+    # coerced to the flat dict the view consumes
+    data = parse_llm_output(content, EXTRACTION_SCHEMA, "extraction", keep_extra=False)
+    if data is None:
+        raise ValueError("extraction output is not a JSON object")
     
-    try:
-        response = call_groq_with_fallback(
-            messages=[{"role": "user", "content": f"{EXTRACTION_PROMPT}\n\nREPORT:\n{full_text}"}],
-            response_format={"type": "json_object"}
-        )
-        raw = json.loads(response.choices[0].message.content)
-        print(f"[DEBUG] Raw LLM extraction: {json.dumps(raw, indent=2)[:500]}")
-        
-        # --- NORMALIZE to flat structure ---
-        # The LLM might return nested (patient_info/medical_data) or flat keys.
-        # We normalize to a FLAT dict the view can consume directly.
-        if "patient_info" in raw and "medical_data" in raw:
-            # Nested format — flatten it
-            pi = raw["patient_info"]
-            md = raw["medical_data"]
-            data = {
-                "patient_name": pi.get("name", pi.get("patient_name", "")),
-                "age": pi.get("age", "N/A"),
-                "gender": pi.get("gender", "N/A"),
-                "blood_sugar": md.get("blood_sugar", "N/A"),
-                "cholesterol": md.get("cholesterol", "N/A"),
-                "bmi": md.get("bmi", "N/A"),
-                "hemoglobin": md.get("hemoglobin", "N/A"),
-                "total_protein": md.get("total_protein", "N/A"),
-                "albumin": md.get("albumin", "N/A"),
-                "abnormal_findings": md.get("abnormal_findings", []),
-            }
-        else:
-            # Already flat or custom format
-            data = {
-                "patient_name": raw.get("patient_name", raw.get("name", "")),
-                "age": raw.get("age", "N/A"),
-                "gender": raw.get("gender", "N/A"),
-                "blood_sugar": raw.get("blood_sugar", "N/A"),
-                "cholesterol": raw.get("cholesterol", "N/A"),
-                "bmi": raw.get("bmi", "N/A"),
-                "hemoglobin": raw.get("hemoglobin", "N/A"),
-                "total_protein": raw.get("total_protein", "N/A"),
-                "albumin": raw.get("albumin", "N/A"),
-                "abnormal_findings": raw.get("abnormal_findings", []),
-            }
-        
-        # Ensure abnormal_findings is a list
-        if not isinstance(data.get("abnormal_findings"), list):
-            data["abnormal_findings"] = [str(data["abnormal_findings"])] if data.get("abnormal_findings") else []
-        
-        # --- REGEX FALLBACK FOR NAME ---
-        patient_name = data.get("patient_name", "")
-        print(f"[SEARCH] DEBUG: AI extracted name = '{patient_name}'")
-        
-        if not patient_name or patient_name.strip() in ["N/A", "Unknown", "Not Found", "", "null", "None"]:
-            print("[WARN] AI failed to extract name, trying regex...")
-            regex_name = find_patient_name(full_text)
-            if regex_name:
-                data["patient_name"] = regex_name
-                print(f"[OK] Using regex name: {regex_name}")
-            else:
-                print("[ERROR] Regex also failed, using fallback name")
-                data["patient_name"] = "Patient"
+    # --- REGEX FALLBACK FOR NAME ---
+    patient_name = data.get("patient_name", "")
+    print(f"[SEARCH] DEBUG: AI extracted name = '{patient_name}'")
+    
+    if not patient_name or patient_name.strip() in ["N/A", "Unknown", "Not Found", "", "null", "None"]:
+        print("[WARN] AI failed to extract name, trying regex...")
+        regex_name = find_patient_name(full_text)
+        if regex_name:
+            data["patient_name"] = regex_name
+            print(f"[OK] Using regex name: {regex_name}")
         else:
-            print(f"[OK] Using AI-extracted name: {patient_name}")
-        
-        print(f"[OK] Final extracted data: {json.dumps(data, indent=2)[:500]}")
-        return data, full_text
+            print("[ERROR] Regex also failed, using fallback name")
+            data["patient_name"] = "Patient"
+    else:
+        print(f"[OK] Using AI-extracted name: {patient_name}")
+    
+    print(f"[OK] Final extracted data: {json.dumps(data, indent=2)[:500]}")
+    return data
+
+# full_text returned with a mock profile when OCR or extraction fails
+MOCK_TEXT = "Mock Text Used"
+
+
+def ocr_failure_mock():
+    """Random mock medical data used when no text could be read (diet plan is generated later)."""
+    mock = random.choice(MOCK_PROFILES)
+    print(f"[WARN] Switching to Mock Medical Data: {mock['condition']}")
+    # Use realistic name from mock profile
+    mock_name = "Rahul Sharma" if "Diabetes" in mock['condition'] else "Priya Patel"
+    mock_med = copy.deepcopy(mock["medical_data"])
+    mock_med["patient_name"] = mock_name
+    mock_med["age"] = "35"
+    mock_med["gender"] = "N/A"
+    return mock_med
+
+def extraction_failure_mock():
+    """Random mock medical data used when the extraction call fails."""
+    mock = random.choice(MOCK_PROFILES)
+    # Use realistic name from mock profile
+    mock_name = "Anita Desai" if "Cholesterol" in mock['condition'] else "Vikram Singh"
+    mock_med = copy.deepcopy(mock["medical_data"])
+    mock_med["patient_name"] = mock_name
+    mock_med["age"] = "N/A"
+    mock_med["gender"] = "N/A"
+    return mock_med
+
+def iter_ocr_batches(file_path, stats):
+    """
+    Lazily rendered, preprocessed pages grouped into OCR batches
+    ([(page_no, image), ...]). Blank pages are counted in stats["pages_blank"].
+    With RENDER_PROCESSES the pages are rendered and encoded on the render
+    pool instead (EncodedBatch objects, see render_pool).
+    """
+    if settings.RENDER_PROCESSES:
+        return iter_encoded_batches(file_path, stats["pages"], stats,
+                                    tile=settings.OCR_TILE_PAGES and settings.OCR_PREPROCESS)
+
+    def rendered_pages():
+        # Lazy: pages are only rendered as the OCR loop asks for them
+        for page_no, img in iter_document_images(file_path):
+            if img is None:
+                stats["pages_failed"] += 1
+                continue
+            if settings.OCR_PREPROCESS:
+                img = preprocess_page(img)
+                if img is None:
+                    print(f"[SCAN] Page {page_no} is blank — skipping Vision call")
+                    stats["pages_blank"] += 1
+                    continue
+            yield page_no, img
+
+    # Tiling needs cropped pages to tell sparse from dense ones
+    if settings.OCR_TILE_PAGES and settings.OCR_PREPROCESS:
+        return iter_page_batches(rendered_pages())
+    return ([page] for page in rendered_pages())
+
+def extract_medical_data(file_path, progress=None, stats=None, on_text=None):
+    """
+    OCR the report and extract a flat dict of patient + lab values.
+    `progress(stage, **info)` is called for rendering, each OCR page and extraction.
+    If a `stats` dict is passed it is filled with page counts (pages, pages_ocr,
+    pages_blank, pages_failed, pages_skipped, early_exit).
+    `on_text(full_text)` is called once OCR succeeds, before the extraction call.
+    Returns (data, full_text).
+    """
+    progress = progress or (lambda stage, **info: None)
+    stats = {} if stats is None else stats
+    print(f"[VIEW] PROCESSING FILE: {file_path}")
+    
+    # --- PHASE 1: SEE (Vision OCR) ---
+    full_text = ""
+    try:
+        progress("rendering")
+        page_count = count_document_pages(file_path)
+        stats.update(pages=page_count, pages_ocr=0, pages_blank=0, pages_failed=0,
+                     pages_skipped=0, early_exit=False)
+        print(f"[SCAN] Found {page_count} pages. Reading with Vision AI...")
+
+        batches = iter_ocr_batches(file_path, stats)
+
+        page_texts = {}
+        found = set()
+        try:
+            for batch in batches:
+                progress("ocr", page=batch[-1][0], pages=page_count)
+                try:
+                    with stage_slot("ocr"):
+                        batch_texts = get_markdown_from_batch(batch, client)
+                except Exception as e:
+                    print(f"[WARN] Page read error: {e}")
+                    stats["pages_failed"] += len(batch)
+                    continue
+                page_texts.update(batch_texts)
+                stats["pages_ocr"] += len(batch)
+
+                if settings.OCR_EARLY_EXIT:
+                    for text in batch_texts.values():
+                        detect_report_fields(text, found)
+                    if found.issuperset(TARGET_FIELDS) and batch[-1][0] < page_count:
+                        stats["early_exit"] = True
+                        print(f"[SCAN] All target fields found by page {batch[-1][0]} — skipping the rest")
+                        break
+        finally:
+            # Early exit or an error: stop rendering, free pages already rendered
+            batches.close()
+
+        if stats["early_exit"]:
+            stats["pages_skipped"] = max(
+                page_count - stats["pages_ocr"] - stats["pages_blank"] - stats["pages_failed"], 0)
+        print(f"[PERF] OCR pages: {stats['pages_ocr']} read, {stats['pages_blank']} blank, "
+              f"{stats['pages_skipped']} skipped of {page_count}")
+
+        for page_no in sorted(page_texts):
+            full_text += f"\n--- PAGE {page_no} ---\n{page_texts[page_no]}"
+                
+        if not full_text:
+            raise Exception("No text extracted")
+            
+        print("[OK] Text Extracted Successfully")
+
+    except Exception as e:
+        print(f"[ERROR] OCR FAILED: {e}")
+        return ocr_failure_mock(), MOCK_TEXT
+
+    if on_text:
+        on_text(full_text)
+
+    # --- PHASE 2: THINK (Extraction) ---
+    progress("extraction")
+    print("[AI] Extracting structured health data...")
+    
+    try:
+        with stage_slot("extraction"):
+            response = call_groq_with_fallback(
+                messages=extraction_messages(full_text),
+                response_format={"type": "json_object"}
+            )
+        return finish_extraction(response.choices[0].message.content, full_text), full_text
 
     except Exception as e:
         print(f"[ERROR] EXTRACTION FAILED: {e}")
-        mock = random.choice(MOCK_PROFILES)
-        # Use realistic name from mock profile
-        mock_name = "Anita Desai" if "Cholesterol" in mock['condition'] else "Vikram Singh"
-        mock_med = mock['medical_data'].copy()
-        mock_med["patient_name"] = mock_name
-        mock_med["age"] = "N/A"
-        mock_med["gender"] = "N/A"
-        return mock_med, "Mock Text Used"
+        return extraction_failure_mock(), MOCK_TEXT
 
 # --- HELPER FUNCTIONS FOR CALORIE CALCULATION ---
 def get_daily_calories(age):
@@ -451,13 +704,14 @@ def distribute_calories(data, age):
     ln_range = f"{int(min_daily * 0.40)}-{int(max_daily * 0.40)} kcal"
     dn_range = f"{int(min_daily * 0.35)}-{int(max_daily * 0.35)} kcal"
     
-    # Overwrite the calorie values in the diet plan
-    if "breakfast" in data and isinstance(data["breakfast"], dict):
-        data["breakfast"]["total_calories"] = bk_range
-    if "lunch" in data and isinstance(data["lunch"], dict):
-        data["lunch"]["total_calories"] = ln_range
-    if "dinner" in data and isinstance(data["dinner"], dict):
-        data["dinner"]["total_calories"] = dn_range
+    # Overwrite the calorie values in the diet plan (and in every day of a multi-day plan)
+    for day in [data] + [d for d in data.get("days", []) if isinstance(d, dict)]:
+        if "breakfast" in day and isinstance(day["breakfast"], dict):
+            day["breakfast"]["total_calories"] = bk_range
+        if "lunch" in day and isinstance(day["lunch"], dict):
+            day["lunch"]["total_calories"] = ln_range
+        if "dinner" in day and isinstance(day["dinner"], dict):
+            day["dinner"]["total_calories"] = dn_range
     
     print(f"[DATA] Calorie Distribution for Age {age}: Daily {min_daily}-{max_daily} kcal")
     print(f"   Breakfast: {bk_range}, Lunch: {ln_range}, Dinner: {dn_range}")
@@ -490,32 +744,28 @@ def validate_diet_plan(plan):
     print("[OK] Diet plan structure validated")
     return True
 
-def try_llm_generation(structured_data, diet_type, age):
+def build_diet_prompt_parts(structured_data, diet_type, age):
     """
-    Attempt LLM generation with error handling.
-    Returns diet plan dict or None if failed.
+    Patient summary, diet-type instruction and age/calorie instruction shared by
+    the single-day and multi-day plan prompts.
     """
-    try:
-        print(f"[AI] ATTEMPTING LLM GENERATION...")
-        print(f"   Diet Type: {diet_type}, Age: {age}")
-        
-        # Get medical data (now a flat dict)
-        blood_sugar = structured_data.get("blood_sugar", "N/A")
-        cholesterol = structured_data.get("cholesterol", "N/A")
-        bmi = structured_data.get("bmi", "N/A")
-        hemoglobin = structured_data.get("hemoglobin", "N/A")
-        total_protein = structured_data.get("total_protein", "N/A")
-        albumin = structured_data.get("albumin", "N/A")
-        abnormal_findings = structured_data.get("abnormal_findings", [])
-        
-        # Get daily calorie range
-        min_daily, max_daily = get_daily_calories(age)
-        daily_range = f"{min_daily}-{max_daily} kcal"
-        
-        # Build diet instruction based on type
-        # IMPORTANT: Check Non-Vegetarian FIRST — "Vegetarian" is a substring of "Non-Vegetarian"
-        if diet_type == "Non-Vegetarian" or "Non-Veg" in diet_type or "non-veg" in diet_type.lower():
-            diet_instruction = f"""CRITICAL: This is a NON-VEGETARIAN meal plan. You MUST include animal protein in EVERY SINGLE MEAL.
+    # Get medical data (now a flat dict)
+    blood_sugar = structured_data.get("blood_sugar", "N/A")
+    cholesterol = structured_data.get("cholesterol", "N/A")
+    bmi = structured_data.get("bmi", "N/A")
+    hemoglobin = structured_data.get("hemoglobin", "N/A")
+    total_protein = structured_data.get("total_protein", "N/A")
+    albumin = structured_data.get("albumin", "N/A")
+    abnormal_findings = structured_data.get("abnormal_findings", [])
+    
+    # Get daily calorie range
+    min_daily, max_daily = get_daily_calories(age)
+    daily_range = f"{min_daily}-{max_daily} kcal"
+    
+    # Build diet instruction based on type
+    # IMPORTANT: Check Non-Vegetarian FIRST — "Vegetarian" is a substring of "Non-Vegetarian"
+    if diet_type == "Non-Vegetarian" or "Non-Veg" in diet_type or "non-veg" in diet_type.lower():
+        diet_instruction = f"""CRITICAL: This is a NON-VEGETARIAN meal plan. You MUST include animal protein in EVERY SINGLE MEAL.
 
 *** MANDATORY NON-VEG REQUIREMENTS (CANNOT BE SKIPPED):
 
@@ -539,15 +789,15 @@ X DO NOT skip animal protein in any meal
 > Breakfast = Eggs (always)
 > Lunch = Chicken or Fish
 > Dinner = Fish or Chicken"""
-        elif diet_type == "Vegetarian" or "veg" in diet_type.lower():
-            diet_instruction = """STRICTLY generate a VEGETARIAN meal plan. 
+    elif diet_type == "Vegetarian" or "veg" in diet_type.lower():
+        diet_instruction = """STRICTLY generate a VEGETARIAN meal plan. 
 DO NOT include any meat, fish, eggs, or poultry. 
 Use plant-based proteins like lentils, beans, tofu, paneer, nuts, chickpeas, soy products."""
-        else:
-            diet_instruction = "Generate a balanced meal plan with appropriate protein sources."
-        
-        # Build age instruction
-        age_instruction = f"""
+    else:
+        diet_instruction = "Generate a balanced meal plan with appropriate protein sources."
+    
+    # Build age instruction
+    age_instruction = f"""
 PATIENT AGE: {age} years old.
 DAILY CALORIE TARGET: {daily_range}
 
@@ -558,12 +808,8 @@ Generate portion sizes appropriate for a daily intake of {daily_range}.
 - Dinner should be approximately 35% of daily calories
 
 IMPORTANT: Adjust ALL meal portions to fit within the daily target of {daily_range}."""
-        
-        # Build full prompt
-        DIET_PROMPT = f"""
-You are a nutrition expert creating a personalized meal plan.
-
-PATIENT INFORMATION:
+    
+    patient_info = f"""PATIENT INFORMATION:
 - Age: {age} years
 - Blood Sugar: {blood_sugar}
 - Cholesterol: {cholesterol}
@@ -572,7 +818,23 @@ PATIENT INFORMATION:
 - Total Protein: {total_protein}
 - Albumin: {albumin}
 - Abnormal Findings: {', '.join(abnormal_findings) if abnormal_findings else 'None detected'}
-- Diet Preference: {diet_type}
+- Diet Preference: {diet_type}"""
+
+    return patient_info, diet_instruction, age_instruction
+
+def build_diet_prompt(structured_data, diet_type, age):
+    """
+    Single-day plan prompt, plus the patient context reused by field-fix calls.
+    Returns (prompt, context).
+    """
+    patient_info, diet_instruction, age_instruction = build_diet_prompt_parts(
+        structured_data, diet_type, age)
+
+    # Build full prompt
+    DIET_PROMPT = f"""
+You are a nutrition expert creating a personalized meal plan.
+
+{patient_info}
 
 {diet_instruction}
 
@@ -601,79 +863,293 @@ IMPORTANT:
 - Food items must include specific quantities (e.g., '150g grilled chicken breast', '2 boiled eggs')
 - Return ONLY valid JSON following this structure.
 """
+    return DIET_PROMPT, f"{patient_info}\n\n{diet_instruction}"
+
+def finish_llm_generation(content, context, age):
+    """Repaired, validated and calorie-distributed plan from the model's reply, or None."""
+    diet_plan = parse_llm_output(content, DIET_PLAN_SCHEMA, "diet_plan", context=context)
+    
+    # Validate structure
+    if diet_plan is not None and validate_diet_plan(diet_plan):
+        # Apply age-based calorie distribution
+        final_plan = distribute_calories(diet_plan, age)
+        print(f"[OK] LLM GENERATION SUCCESSFUL")
+        return final_plan
+    print(f"[WARN] LLM returned invalid structure")
+    return None
+
+def try_llm_generation(structured_data, diet_type, age):
+    """
+    Attempt LLM generation with error handling.
+    Returns diet plan dict or None if failed.
+    """
+    try:
+        print(f"[AI] ATTEMPTING LLM GENERATION...")
+        print(f"   Diet Type: {diet_type}, Age: {age}")
+        
+        DIET_PROMPT, context = build_diet_prompt(structured_data, diet_type, age)
         
         # Call Groq API
         print(f"[API] Calling Groq API...")
-        response = call_groq_with_fallback(
-            messages=[{"role": "user", "content": DIET_PROMPT}],
-            response_format={"type": "json_object"}
-        )
+        with stage_slot("plan"):
+            response = call_groq_with_fallback(
+                messages=[{"role": "user", "content": DIET_PROMPT}],
+                response_format={"type": "json_object"}
+            )
         
         print(f"[OK] LLM Response received")
-        diet_plan = json.loads(response.choices[0].message.content)
-        
-        # Validate structure
-        if validate_diet_plan(diet_plan):
-            # Apply age-based calorie distribution
-            final_plan = distribute_calories(diet_plan, age)
-            print(f"[OK] LLM GENERATION SUCCESSFUL")
-            return final_plan
-        else:
-            print(f"[WARN] LLM returned invalid structure")
-            return None
+        return finish_llm_generation(response.choices[0].message.content, context, age)
             
     except Exception as e:
         print(f"[ERROR] LLM GENERATION FAILED: {type(e).__name__}: {str(e)}")
         return None
 
+# --- MULTI-DAY PLANS (one batched LLM call, template rotation as fallback) ---
+MAX_PLAN_DAYS = 7
+MEALS = ("breakfast", "lunch", "dinner")
+DAY_CALORIE_TOLERANCE = 0.10  # a day's own estimate may sit this far outside the target range
+
+def validate_multi_day_plan(plan, days):
+    """
+    Validate every day of a {"days": [...]} plan in one pass.
+    Returns the list of problems (empty when valid).
+    """
+    problems = []
+    day_list = plan.get("days")
+    if not isinstance(day_list, list):
+        return ["'days' is missing or not a list"]
+    if len(day_list) < days:
+        problems.append(f"expected {days} days, got {len(day_list)}")
+    for i, day in enumerate(day_list[:days], start=1):
+        if not isinstance(day, dict):
+            problems.append(f"day {i} is not an object")
+            continue
+        for meal in MEALS:
+            items = day.get(meal, {}).get("food_items") if isinstance(day.get(meal), dict) else None
+            if not isinstance(items, list) or not items:
+                problems.append(f"day {i} {meal} has no food_items list")
+    return problems
+
+def _normalize_item(item):
+    """'150g Grilled Chicken Breast' -> 'grilled chicken breast' for variety comparisons."""
+    return re.sub(r"^[\d./\s]*(?:g|kg|ml|cups?|tbsp|tsp|slices?|small|medium|large|bowl)?\b\s*", "",
+                  str(item).lower()).strip(" ()")
+
+def check_plan_days(day_list, age):
+    """
+    Variety and calorie checks across days.
+    - repeated_meals: (day, meal) pairs identical to the previous day's same meal
+    - variety: share of distinct food items across the whole plan (1.0 = no repeats)
+    - calorie_outliers: days whose own `day_calories` estimate misses the age target
+    """
+    min_daily, max_daily = get_daily_calories(age)
+    seen, total, repeated, outliers = set(), 0, [], []
+    previous = {}
+    for i, day in enumerate(day_list, start=1):
+        for meal in MEALS:
+            items = [_normalize_item(x) for x in day.get(meal, {}).get("food_items", [])]
+            seen.update(items)
+            total += len(items)
+            if items and sorted(items) == previous.get(meal):
+                repeated.append({"day": i, "meal": meal})
+            previous[meal] = sorted(items)
+        estimate = day.get("day_calories")
+        try:
+            estimate = float(estimate)
+        except (TypeError, ValueError):
+            continue
+        if not (min_daily * (1 - DAY_CALORIE_TOLERANCE) <= estimate <= max_daily * (1 + DAY_CALORIE_TOLERANCE)):
+            outliers.append({"day": i, "day_calories": estimate})
+    return {
+        "variety": round(len(seen) / total, 2) if total else 0.0,
+        "repeated_meals": repeated,
+        "calorie_outliers": outliers,
+        "daily_target": f"{min_daily}-{max_daily} kcal",
+    }
+
+def build_multi_day_prompt(structured_data, diet_type, age, days):
+    """
+    Prompt asking for `days` days of meals in one call, plus the patient
+    context reused by field-fix calls. Returns (prompt, context).
+    """
+    patient_info, diet_instruction, age_instruction = build_diet_prompt_parts(
+        structured_data, diet_type, age)
+
+    MULTI_DAY_PROMPT = f"""
+You are a nutrition expert creating a personalized {days}-day meal plan.
+
+{patient_info}
+
+{diet_instruction}
+
+{age_instruction}
+
+VARIETY RULES:
+- Plan {days} different days. Do not repeat the same breakfast, lunch or dinner on consecutive days.
+- Rotate protein sources, grains and vegetables across the days.
+- Every day must follow the diet preference and the daily calorie target above.
+
+CRITICAL: YOU MUST return a JSON object following this EXACT schema, with exactly {days} entries in "days":
+
+{{
+  "days": [
+    {{
+      "breakfast": {{"food_items": ["Qty Item 1", "Qty Item 2", "Qty Item 3"], "total_calories": "Range kcal"}},
+      "lunch": {{"food_items": ["Qty Item 1", "Qty Item 2", "Qty Item 3", "Qty Item 4"], "total_calories": "Range kcal"}},
+      "dinner": {{"food_items": ["Qty Item 1", "Qty Item 2", "Qty Item 3"], "total_calories": "Range kcal"}},
+      "day_calories": 2100
+    }}
+  ],
+  "doctor_note": "Personalized medical advice referencing the patient's SPECIFIC lab values and health conditions"
+}}
+
+IMPORTANT:
+- "day_calories" is your estimate of that day's total intake (a number)
+- Food items must include specific quantities (e.g., '150g grilled chicken breast', '2 boiled eggs')
+- Return ONLY valid JSON following this structure.
+"""
+    context = f"{patient_info}\n\n{diet_instruction}\nEach missing day must differ from the other days."
+    return MULTI_DAY_PROMPT, context
+
+def finish_multi_day_generation(content, context, days):
+    """Repaired and validated {"days": [...], "doctor_note"} from the model's reply, or None."""
+    plan = parse_llm_output(
+        content, MULTI_DAY_PLAN_SCHEMA, "multi_day_plan", context=context,
+        check=lambda p: [f"days[{i}]" for i in range(len(p["days"]), days)] if "days" in p else [])
+    if plan is None:
+        return None
+
+    problems = validate_multi_day_plan(plan, days)
+    if problems:
+        print(f"[WARN] {days}-day plan failed validation: {'; '.join(problems[:5])}")
+        return None
+    plan["days"] = plan["days"][:days]
+    print(f"[OK] {days}-DAY LLM GENERATION SUCCESSFUL")
+    return plan
+
+def try_llm_multi_day_generation(structured_data, diet_type, age, days):
+    """
+    Ask for `days` days of meals in ONE structured call (instead of one call
+    per day) and validate all days together.
+    Returns {"days": [...], "doctor_note": ...} or None if failed.
+    """
+    try:
+        print(f"[AI] ATTEMPTING {days}-DAY LLM GENERATION (single call)...")
+        MULTI_DAY_PROMPT, context = build_multi_day_prompt(structured_data, diet_type, age, days)
+        print(f"[API] Calling Groq API...")
+        with stage_slot("plan"):
+            response = call_groq_with_fallback(
+                messages=[{"role": "user", "content": MULTI_DAY_PROMPT}],
+                response_format={"type": "json_object"}
+            )
+        return finish_multi_day_generation(response.choices[0].message.content, context, days)
+
+    except Exception as e:
+        print(f"[ERROR] MULTI-DAY LLM GENERATION FAILED: {type(e).__name__}: {str(e)}")
+        return None
+
+def build_template_days(structured_data, diet_type, days):
+    """
+    Fill `days` days from the template library: day 1 is the best mock match,
+    later days rotate breakfast / lunch / dinner independently through the
+    templates for the same diet type, so consecutive days differ.
+    """
+    best = get_best_mock_match(structured_data, diet_type)
+    # Exact diet type here: "Vegetarian" is a substring of "Non-Vegetarian"
+    pool = [m["diet_plan"] for m in MOCK_PROFILES if m["diet_type"] == diet_type] or \
+           [m["diet_plan"] for m in MOCK_PROFILES]
+    day_list = []
+    for meal in MEALS:
+        # Distinct options for this meal, starting with the best match's
+        options = [best[meal]]
+        for plan in pool:
+            if plan[meal] not in options:
+                options.append(plan[meal])
+        for i in range(days):
+            if meal == MEALS[0]:
+                day_list.append({})
+            day_list[i][meal] = copy.deepcopy(options[i % len(options)])
+    return {"days": day_list, "doctor_note": best.get("doctor_note", "")}
+
+def finalize_multi_day_plan(plan, age):
+    """
+    Apply calorie targets to every day, run the cross-day checks and mirror
+    day 1 at the top level so single-day consumers (UI cards, chat context,
+    quick answers) keep working.
+    """
+    plan = distribute_calories(plan, age)
+    plan["checks"] = check_plan_days(plan["days"], age)
+    for meal in MEALS:
+        plan[meal] = plan["days"][0][meal]
+    print(f"[DATA] {len(plan['days'])}-day plan: variety {plan['checks']['variety']}, "
+          f"{len(plan['checks']['repeated_meals'])} repeated meals, "
+          f"{len(plan['checks']['calorie_outliers'])} calorie outliers")
+    return plan
+
+# Vital bands of each mock profile, classified once
+_MOCK_BANDS = [{key: v["status"] for key, v in bands.items()}
+               for bands in classify_batch([m["medical_data"] for m in MOCK_PROFILES])]
+
 def get_best_mock_match(structured_data, diet_type):
     """
     Find best matching mock profile.
-    Priority: exact blood sugar + diet type > diet type only > random
+    Priority: same blood sugar + cholesterol bands and diet type >
+    same blood sugar band and diet type > diet type only > random
     """
-    sugar_val = structured_data.get("blood_sugar", "")
+    bands = {key: v["status"] for key, v in classify_report(structured_data).items()}
     
     print(f"[SEARCH] Searching for mock match...")
-    print(f"   Blood Sugar: {sugar_val}")
+    print(f"   Blood Sugar: {structured_data.get('blood_sugar', '')} ({bands['blood_sugar']})")
+    print(f"   Cholesterol: {structured_data.get('cholesterol', '')} ({bands['cholesterol']})")
     print(f"   Diet Type: {diet_type}")
     
-    # Try exact match (blood sugar + diet type)
-    exact_matches = [m for m in MOCK_PROFILES 
-                     if m["medical_data"]["blood_sugar"] == sugar_val 
-                     and diet_type in m["diet_type"]]
-    
-    if exact_matches:
-        selected = exact_matches[0]
-        print(f"[OK] Found exact mock match: {selected['condition']} - {selected['diet_type']}")
-        return selected["diet_plan"].copy()
+    diet_matches = [(m, mb) for m, mb in zip(MOCK_PROFILES, _MOCK_BANDS) if diet_type in m["diet_type"]]
     
-    # Try diet type match only
-    diet_matches = [m for m in MOCK_PROFILES if diet_type in m["diet_type"]]
+    # Try band match (blood sugar + cholesterol, then blood sugar alone)
+    for keys in (("blood_sugar", "cholesterol"), ("blood_sugar",)):
+        band_matches = [m for m, mb in diet_matches if all(mb[k] == bands[k] for k in keys)]
+        if band_matches:
+            selected = band_matches[0]
+            print(f"[OK] Found {'+'.join(keys)} band mock match: {selected['condition']} - {selected['diet_type']}")
+            return copy.deepcopy(selected["diet_plan"])
     
     if diet_matches:
-        selected = diet_matches[0]
+        selected = diet_matches[0][0]
         print(f"[WARN] Using diet-type mock match: {selected['condition']} - {selected['diet_type']}")
-        return selected["diet_plan"].copy()
+        return copy.deepcopy(selected["diet_plan"])
     
     # Last resort: random
     selected = random.choice(MOCK_PROFILES)
     print(f"[WARN] Using random mock profile: {selected['condition']} - {selected['diet_type']}")
-    return selected["diet_plan"].copy()
+    return copy.deepcopy(selected["diet_plan"])
 
-def generate_diet_plan(structured_data, diet_type="Balanced", age=25):
+def generate_diet_plan(structured_data, diet_type="Balanced", age=25, days=1):
     """
     Generate diet plan using hybrid approach:
     1. Try LLM generation first (personalized)
     2. Fall back to mock data if LLM fails (reliable)
+    With days > 1 the plan also has a "days" list (one LLM call for all days,
+    or rotated templates) plus cross-day "checks"; day 1 stays at the top level.
     Returns: dict with 'plan' and 'source' keys
     """
+    days = max(1, min(int(days or 1), MAX_PLAN_DAYS))
     print(f"\n{'='*60}")
     print(f"[TARGET] MEAL GENERATION START")
     print(f"   Diet Type: {diet_type}")
     print(f"   Age: {age}")
+    print(f"   Days: {days}")
     print(f"   Blood Sugar: {structured_data.get('blood_sugar', 'N/A')}")
     print(f"{'='*60}\n")
     
+    if days > 1:
+        llm_result = try_llm_multi_day_generation(structured_data, diet_type, age, days)
+        if llm_result:
+            print(f"\n[OK] USING AI-GENERATED {days}-DAY PLAN")
+            return {"plan": finalize_multi_day_plan(llm_result, age), "source": "AI"}
+        print(f"\n[WARN] LLM FAILED - FILLING {days} DAYS FROM TEMPLATES")
+        template = build_template_days(structured_data, diet_type, days)
+        return {"plan": finalize_multi_day_plan(template, age), "source": "Template"}
+
     # STEP 1: Try LLM generation first
     llm_result = try_llm_generation(structured_data, diet_type, age)
     
@@ -690,3 +1166,103 @@ def generate_diet_plan(structured_data, diet_type="Balanced", age=25):
     
     print(f"\n[OK] USING TEMPLATE PLAN")
     return {"plan": final_mock, "source": "Template"}
+
+# --- QUICK-START ANSWERS (pre-generated for the chat suggestion buttons) ---
+# Keep in sync with the quick-start prompts in frontend_streamlit/app.py
+QUICK_START_QUESTIONS = [
+    "What should I eat for breakfast and why?",
+    "Can you suggest alternatives for my lunch?",
+    "What are the total calories for each meal?",
+    "Why did you recommend this specific diet based on my medical data?",
+]
+
+def format_report_context(structured_data, diet_plan):
+    """Compact text view of the extracted data + diet plan for LLM prompts."""
+    lines = ["MEDICAL DATA:"]
+    for key in ("age", "gender", "blood_sugar", "cholesterol", "bmi",
+                "hemoglobin", "total_protein", "albumin"):
+        lines.append(f"- {key.replace('_', ' ').title()}: {structured_data.get(key, 'N/A')}")
+    findings = structured_data.get("abnormal_findings", [])
+    lines.append(f"- Abnormal Findings: {', '.join(findings) if findings else 'None detected'}")
+    lines.append("")
+    lines.append("DIET PLAN:")
+    for meal in ("breakfast", "lunch", "dinner"):
+        info = diet_plan.get(meal, {})
+        if isinstance(info, dict):
+            items = ", ".join(info.get("food_items", []))
+            lines.append(f"- {meal.title()}: {items} ({info.get('total_calories', 'N/A')})")
+        else:
+            lines.append(f"- {meal.title()}: {info}")
+    if diet_plan.get("doctor_note"):
+        lines.append(f"- Doctor's Note: {diet_plan['doctor_note']}")
+    return "\n".join(lines)
+
+def generate_quick_answers(structured_data, diet_plan):
+    """
+    Answer all QUICK_START_QUESTIONS in one batched LLM call.
+    Returns {question: answer}, or {} if generation failed.
+    """
+    numbered = "\n".join(f"{i}. {q}" for i, q in enumerate(QUICK_START_QUESTIONS, start=1))
+    prompt = f"""You are Dr. AI, a friendly and knowledgeable dietitian assistant for the AI-NutriCare app.
+
+Answer each of the patient's questions below using their diet plan and medical data.
+Be warm, encouraging, and concise. Use bullet points for lists. Reference specific foods,
+calories, and medical values. Never diagnose conditions — only provide dietary guidance.
+
+{format_report_context(structured_data, diet_plan)}
+
+QUESTIONS:
+{numbered}
+
+Return a JSON object mapping each question number to its Markdown answer:
+{{"answers": {{"1": "...", "2": "...", "3": "...", "4": "..."}}}}"""
+
+    try:
+        with stage_slot("quick_answers"):
+            response = call_groq_with_fallback(
+                messages=[{"role": "user", "content": prompt}],
+                response_format={"type": "json_object"}
+            )
+        parsed = parse_llm_output(response.choices[0].message.content, QUICK_ANSWERS_SCHEMA, "quick_answers")
+        raw = parsed["answers"] if parsed else {}
+        answers = {}
+        for i, question in enumerate(QUICK_START_QUESTIONS, start=1):
+            answer = raw.get(str(i))
+            if isinstance(answer, str) and answer.strip():
+                answers[question] = answer.strip()
+        print(f"[OK] Pre-generated {len(answers)}/{len(QUICK_START_QUESTIONS)} quick answers")
+        return answers
+    except Exception as e:
+        print(f"[WARN] Quick answer generation failed: {type(e).__name__}: {e}")
+        return {}
+
+def start_quick_answer_precompute(report, structured_data, diet_plan):
+    """
+    Generate quick-start answers in a background thread and store them on the
+    report, with quick_answers_status "ready" or "failed". Answers for a plan
+    that was replaced meanwhile (plan_version changed) are dropped.
+    No-op when PRECOMPUTE_QUICK_ANSWERS is disabled.
+    """
+    if not settings.PRECOMPUTE_QUICK_ANSWERS:
+        return None
+
+    version = report.plan_version
+
+    def _run():
+        from .models import MedicalReport
+        try:
+            try:
+                answers = generate_quick_answers(structured_data, diet_plan)
+            except Exception as e:
+                print(f"[WARN] Quick answer precompute failed: {type(e).__name__}: {e}")
+                answers = {}
+            # Only stored while the plan they describe is still the report's plan
+            MedicalReport.objects.filter(pk=report.pk, plan_version=version).update(
+                quick_answers=answers, quick_answers_status="ready" if answers else "failed")
+        finally:
+            connection.close()
+
+    # The copied context carries the report's scheduler class and tenant into the thread
+    worker = threading.Thread(target=contextvars.copy_context().run, args=(_run,), daemon=True)
+    worker.start()
+    return worker
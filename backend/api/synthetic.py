@@ -0,0 +1,219 @@
+"""
+Synthetic lab reports with known ground truth, for scale and accuracy testing
+without real patient data.
+
+generate_report() renders one report as a PDF or a scanned-looking PNG/JPEG.
+Layouts, page counts, test-name synonyms ("FBS", "Hb", "TC") and units
+(mg/dL vs mmol/L, g/dL vs g/L) vary. The returned truth holds every target
+field as printed and in canonical units (see vitals.normalize_vital), along
+with the text of each page. write_corpus() writes many reports plus a
+ground_truth.jsonl manifest.
+"""
+import io
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from .vitals import normalize_vital
+
+LAYOUTS = ("table", "list", "two_column")
+FORMATS = ("pdf", "png", "jpg")
+
+FIRST_NAMES = ["Rahul", "Priya", "Anita", "Vikram", "John", "Sara", "Amit", "Meera", "Ravi", "Leela",
+               "Arjun", "Kavya", "David", "Fatima", "Suresh", "Nisha"]
+LAST_NAMES = ["Sharma", "Patel", "Desai", "Singh", "Smith", "Lee", "Rao", "Iyer", "Kumar", "Nair",
+              "Menon", "Khan", "Gupta", "Reddy", "Joshi", "Das"]
+LABS = ["City Diagnostics Laboratory", "Apollo Path Labs", "Sunrise Clinical Laboratory",
+        "Metro Health Diagnostics"]
+
+# Target fields: printed names and (unit, low, high, decimals) choices
+TARGETS = {
+    "blood_sugar": (["Fasting Blood Sugar", "FBS", "Glucose (Fasting)", "Blood Glucose", "Sugar Level"],
+                    [("mg/dL", 65, 260, 0), ("mmol/L", 3.6, 14.4, 1)]),
+    "cholesterol": (["Total Cholesterol", "TC", "Serum Cholesterol", "Cholesterol, Total"],
+                    [("mg/dL", 120, 320, 0), ("mmol/L", 3.1, 8.3, 1)]),
+    "hemoglobin": (["Hemoglobin", "Hb", "Hgb", "Haemoglobin"],
+                   [("g/dL", 8, 18, 1), ("g/L", 80, 180, 0)]),
+    "total_protein": (["Total Protein", "TP", "Serum Protein", "Protein, Total"],
+                      [("g/dL", 5.0, 9.0, 1), ("g/L", 50, 90, 0)]),
+    "albumin": (["Albumin", "Alb", "Serum Albumin"],
+                [("g/dL", 2.5, 5.8, 1), ("g/L", 25, 58, 0)]),
+    "bmi": (["BMI", "Body Mass Index"], [("kg/m2", 16, 40, 1)]),
+}
+
+# Other tests that fill the pages (and share words with the targets: "HDL Cholesterol")
+FILLER = [
+    ("HDL Cholesterol", "mg/dL", 30, 80), ("LDL Cholesterol", "mg/dL", 60, 200),
+    ("Triglycerides", "mg/dL", 60, 300), ("Creatinine", "mg/dL", 0.5, 1.8),
+    ("Urea", "mg/dL", 10, 50), ("TSH", "uIU/mL", 0.3, 6.0), ("HbA1c", "%", 4.5, 10.0),
+    ("WBC Count", "10^3/uL", 4, 12), ("Platelet Count", "10^3/uL", 150, 450),
+    ("Sodium", "mmol/L", 132, 148), ("Potassium", "mmol/L", 3.2, 5.4), ("Vitamin D", "ng/mL", 8, 60),
+    ("SGPT (ALT)", "U/L", 8, 80), ("Uric Acid", "mg/dL", 3, 9), ("Calcium", "mg/dL", 8, 11),
+]
+
+PAGE_SIZE = (1240, 1754)  # A4 at 150 DPI
+LINE_HEIGHT = 44
+TOP, BOTTOM = 90, 80
+PER_PAGE = (PAGE_SIZE[1] - TOP - BOTTOM) // LINE_HEIGHT - 1  # text lines that fit above the footer
+
+
+def _fmt(value, decimals):
+    return f"{value:.{decimals}f}" if decimals else str(int(round(value)))
+
+
+def _header(rng, truth):
+    name, sex = truth["patient_name"], truth["gender"]
+    name_line = rng.choice(["Patient Name: {}", "Name: {}", "Patient: {}",
+                            ("Mr. {}" if sex == "Male" else "Mrs. {}")]).format(name)
+    age_line = rng.choice([
+        f"Age/Sex: {truth['age']} Y / {sex[0]}",
+        f"Age: {truth['age']} Years    Sex: {sex}",
+        f"Age / Gender : {truth['age']} Yrs / {sex}",
+    ])
+    return [rng.choice(LABS), name_line, age_line,
+            f"Sample: Serum    Ref. Dr. {rng.choice(LAST_NAMES)}", ""]
+
+
+def _rows(rng, truth, max_filler):
+    """(test, value, unit) rows: every present target once, plus shuffled filler."""
+    rows = []
+    for field, (names, units) in TARGETS.items():
+        if truth["printed"].get(field) is None:
+            continue
+        value, unit = truth["printed"][field].split(" ", 1)
+        rows.append((rng.choice(names), value, unit))
+    for _ in range(rng.randint(min(6, max_filler), max_filler)):
+        test, unit, low, high = rng.choice(FILLER)
+        rows.append((test, _fmt(rng.uniform(low, high), 1), unit))
+    rng.shuffle(rows)
+    return rows
+
+
+def _render_lines(rng, layout, rows):
+    """Text lines in the chosen layout."""
+    if layout == "table":
+        lines = ["Test                         Result    Units      "]
+        lines += [f"{test:<28} {value:>8}   {unit}" for test, value, unit in rows]
+    elif layout == "list":
+        sep = rng.choice([": ", " - ", " = "])
+        lines = [f"{test}{sep}{value} {unit}" for test, value, unit in rows]
+    else:  # two_column
+        cells = [f"{test}: {value} {unit}" for test, value, unit in rows]
+        lines = [f"{left:<44}{right}" for left, right in
+                 zip(cells[0::2], cells[1::2] + [""] * (len(cells) % 2))]
+    return lines
+
+
+def _paginate(header, lines, pages):
+    """Spread header + lines evenly over `pages` pages."""
+    lines = header + lines
+    chunk = max(1, -(-len(lines) // pages))
+    return [lines[i * chunk:(i + 1) * chunk] for i in range(pages)]
+
+
+def _draw_page(lines, page_no, pages, font):
+    img = Image.new("L", PAGE_SIZE, 255)
+    draw = ImageDraw.Draw(img)
+    for i, line in enumerate(lines):
+        draw.text((90, TOP + i * LINE_HEIGHT), line, fill=0, font=font)
+    draw.text((90, PAGE_SIZE[1] - BOTTOM + 20), f"Page {page_no} of {pages}", fill=0, font=font)
+    return img
+
+
+def _scan(rng, img):
+    """Make a rendered page look photographed: slight tilt, blur and sensor noise."""
+    img = img.rotate(rng.uniform(-2, 2), resample=Image.BICUBIC, expand=True, fillcolor=235)
+    img = img.filter(ImageFilter.GaussianBlur(rng.uniform(0, 0.8)))
+    noise = np.random.default_rng(rng.randrange(2**32)).normal(0, 6, (img.height, img.width))
+    return Image.fromarray(np.clip(np.asarray(img, dtype=np.float32) + noise, 0, 255).astype(np.uint8))
+
+
+def random_truth(rng, missing_rate=0.15):
+    """Patient and lab values for one report; each lab is absent with `missing_rate`."""
+    truth = {
+        "patient_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        "age": str(rng.randint(18, 85)),
+        "gender": rng.choice(["Male", "Female"]),
+        "printed": {},
+        "values": {},
+    }
+    for field, (_, units) in TARGETS.items():
+        if rng.random() < missing_rate:
+            truth["printed"][field] = truth["values"][field] = None
+            continue
+        unit, low, high, decimals = rng.choice(units)
+        printed = f"{_fmt(rng.uniform(low, high), decimals)} {unit}"
+        truth["printed"][field] = printed
+        truth["values"][field] = normalize_vital(field, printed)
+    return truth
+
+
+def generate_report(rng, fmt="pdf", pages=None, layout=None, missing_rate=0.15):
+    """
+    One synthetic report. Returns (file bytes, extension, truth); truth also
+    records the layout, page count and the text printed on each page.
+    Image formats are single-page scans.
+    """
+    layout = layout or rng.choice(LAYOUTS)
+    pages = 1 if fmt != "pdf" else (pages or rng.randint(1, 6))
+    truth = random_truth(rng, missing_rate)
+    font = ImageFont.load_default(size=26)
+    header = _header(rng, truth)
+    # Filler is capped so every row fits on the pages (two_column packs two rows per line)
+    capacity = (PER_PAGE * pages - len(header) - 1) * (2 if layout == "two_column" else 1)
+    rows = _rows(rng, truth, max_filler=min(40, capacity - len(TARGETS)))
+    page_lines = _paginate(header, _render_lines(rng, layout, rows), pages)
+    images = [_draw_page(lines, i + 1, pages, font) for i, lines in enumerate(page_lines)]
+
+    out = io.BytesIO()
+    if fmt == "pdf":
+        images[0].save(out, format="PDF", save_all=True, append_images=images[1:], resolution=150)
+    elif fmt == "png":
+        _scan(rng, images[0]).save(out, format="PNG")
+    else:
+        _scan(rng, images[0]).save(out, format="JPEG", quality=rng.randint(60, 90))
+    truth.update(layout=layout, pages=pages, page_text=["\n".join(lines) for lines in page_lines])
+    return out.getvalue(), fmt, truth
+
+
+def _write_one(args):
+    out_dir, index, seed, fmt, max_pages, missing_rate = args
+    # One RNG per report, so the corpus is the same whatever the worker count
+    rng = random.Random(f"{seed}:{index}")
+    data, ext, truth = generate_report(rng, fmt, pages=rng.randint(1, max_pages),
+                                       missing_rate=missing_rate)
+    name = f"report_{index:05d}.{ext}"
+    with open(os.path.join(out_dir, name), "wb") as report:
+        report.write(data)
+    return {"file": name, "format": fmt, **truth}
+
+
+def write_corpus(out_dir, count, seed=7, formats=FORMATS, max_pages=6, missing_rate=0.15, workers=1):
+    """
+    Write `count` reports to out_dir plus ground_truth.jsonl (one line per file),
+    rendering on `workers` processes. Returns the manifest path.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = [(out_dir, i, seed, formats[i % len(formats)], max_pages, missing_rate) for i in range(count)]
+    manifest = os.path.join(out_dir, "ground_truth.jsonl")
+    with open(manifest, "w", encoding="utf-8") as f:
+        if workers > 1:
+            with ProcessPoolExecutor(workers) as pool:
+                entries = pool.map(_write_one, jobs, chunksize=8)
+                for entry in entries:
+                    f.write(json.dumps(entry) + "\n")
+        else:
+            for entry in map(_write_one, jobs):
+                f.write(json.dumps(entry) + "\n")
+    return manifest
+
+
+def read_corpus(corpus_dir):
+    """[(file path, truth), ...] from a corpus written by write_corpus."""
+    with open(os.path.join(corpus_dir, "ground_truth.jsonl"), encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    return [(os.path.join(corpus_dir, entry["file"]), entry) for entry in entries]
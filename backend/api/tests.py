@@ -1,3 +1,1252 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from . import ai_utils, async_pipeline, chat_engine, jobs, pipeline, services
+from .chat_engine import AnswerCache, BM25Index, ChatSessionStore, ConversationMemory, DrAIChatbot, build_context_chunks
+from .fakegroq import DEFAULT_RECORDINGS, FakeGroq, FakeGroqError, RecordingGroq, load_recordings
+from .idempotency import DONE, RUNNING, Flight, IdempotencyConflict, StillRunning
+from .models import MedicalReport, Patient
+from .patients import record_report
+from .render_pool import iter_encoded_batches
+from .scheduler import BATCH, INTERACTIVE, SlotScheduler, request_tenant
+from .management.commands.bench_extraction import score_report
+from .schemas import DIET_PLAN_SCHEMA, EXTRACTION_SCHEMA, MULTI_DAY_PLAN_SCHEMA, conform, parse_llm_json
+from .serializers import MedicalReportSerializer
+from .services import (MOCK_PROFILES, NAME_PREFIXES, QUICK_START_QUESTIONS, distribute_calories,
+                       find_patient_name, get_best_mock_match)
+from .synthetic import TARGETS, generate_report, read_corpus, write_corpus
+from .vitals import VITALS, classify_report, normalize_vital, parse_measurement
+
+
+def legacy_find_patient_name(text):
+    """The original loop, which searched the whole text rather than the first-page header."""
+    for prefix in NAME_PREFIXES:
+        match = re.search(prefix + r"([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)", text)
+        if match:
+            name = match.group(1).strip()
+            if 2 <= len(name) <= 50 and not re.search(r"\d", name):
+                return name
+    return None
+
+
+class FindPatientNameTests(SimpleTestCase):
+    TOKENS = ["Name:", "Name -", "Patient Name:", "Patient's Name -", "Patient:", "Mr.", "Mr", "Ms",
+              "Mrs.", "Dr.", "Meera", "Nair", "Kiran", "Nia", "Long", "A", "Bb", "x1", "123", "\n",
+              "Abcdefghijklmnopqrst", "Report", "Name", "Patient", ":", "-", "FirstName:"]
+
+    def find(self, text):
+        with redirect_stdout(StringIO()):
+            return find_patient_name(text)
+
+    def test_priority_order(self):
+        self.assertEqual(self.find("Dr. Rao\nPatient Name: Meera Nair, age 40"), "Meera Nair")
+        self.assertEqual(self.find("Mr. Arjun Das"), "Arjun Das")
+        self.assertIsNone(self.find("Lipid profile 182 mg/dL"))
+
+    def test_invalid_first_name_hit_falls_through(self):
+        run_on = " ".join(["Abcdefghijklmnopqrst"] * 3)
+        self.assertEqual(self.find(f"Name - {run_on}\nPatient's Name: Meera Nair"), "Meera Nair")
+        self.assertEqual(self.find(f"Name - {run_on} Ms Nia Long Patient Name - Kiran"), "Kiran")
+
+    def test_matches_legacy_loop(self):
+        rng = random.Random(0)
+        for _ in range(5000):
+            text = " ".join(rng.choice(self.TOKENS) for _ in range(rng.randint(1, 30)))
+            self.assertEqual(self.find(text), legacy_find_patient_name(text), text)
+
+
+class NormalizeVitalTests(SimpleTestCase):
+    def test_canonical_and_converted_units(self):
+        self.assertEqual(normalize_vital("blood_sugar", "180 mg/dL (High)"), 180.0)
+        self.assertEqual(normalize_vital("blood_sugar", "6.1 mmol/L"), 109.9)
+        self.assertEqual(normalize_vital("hemoglobin", "38 g/L"), 3.8)
+        self.assertEqual(normalize_vital("bmi", "27.1 kg/m²"), 27.1)
+        self.assertEqual(normalize_vital("cholesterol", "245"), 245.0)
+
+    def test_indian_lab_unit_spellings(self):
+        self.assertEqual(normalize_vital("hemoglobin", "13.5 gm/dL"), 13.5)
+        self.assertEqual(normalize_vital("hemoglobin", "13 g%"), 13.0)
+        self.assertEqual(normalize_vital("blood_sugar", "120 mg%"), 120.0)
+        self.assertEqual(normalize_vital("bmi", "24.1 kg/m^2"), 24.1)
+
+    def test_thousands_and_decimal_commas(self):
+        self.assertEqual(parse_measurement("1,200"), (1200.0, ""))
+        self.assertEqual(parse_measurement("1,200.5 mg/dL"), (1200.5, "mg/dl"))
+        self.assertEqual(parse_measurement("6,1 mmol/L"), (6.1, "mmol/l"))
+        self.assertEqual(parse_measurement("1,2000"), (1.2, ""))
+
+    def test_missing_and_unknown(self):
+        self.assertIsNone(normalize_vital("blood_sugar", "N/A"))
+        self.assertIsNone(normalize_vital("blood_sugar", None))
+        self.assertIsNone(normalize_vital("hemoglobin", "13 furlongs"))
+
+
+def legacy_status(vital, value):
+    """The if-chains the band tables replaced (frontend classify_vital and BMI card)."""
+    if vital == "blood_sugar":
+        if value < 70:
+            return "Low"
+        if value <= 85:
+            return "Slightly Low"
+        if value <= 100:
+            return "Normal"
+        if value <= 125:
+            return "Elevated"
+        return "High"
+    if vital == "cholesterol":
+        if value < 150:
+            return "Normal"
+        if value <= 199:
+            return "Borderline"
+        if value <= 239:
+            return "High"
+        return "Very High"
+    if value < 18.5:
+        return "Underweight"
+    if value < 25:
+        return "Normal"
+    if value < 30:
+        return "Overweight"
+    return "Obese"
+
+
+class ClassifyVitalTests(SimpleTestCase):
+    def status(self, vital, value):
+        return classify_report({vital: str(value)})[vital]["status"]
+
+    def test_boundaries_match_the_original_if_chains(self):
+        for vital in ("blood_sugar", "cholesterol", "bmi"):
+            for _, bound in VITALS[vital]["bands"]:
+                for value in (bound - 0.5, bound, bound + 0.5):
+                    with self.subTest(vital=vital, value=value):
+                        self.assertEqual(self.status(vital, value), legacy_status(vital, value))
+
+    def test_fractional_readings(self):
+        self.assertEqual(self.status("blood_sugar", 100.5), "Elevated")
+        self.assertEqual(self.status("blood_sugar", 85.5), "Normal")
+        self.assertEqual(self.status("cholesterol", 199.5), "High")
+
+    def test_normal_range_ends_are_normal(self):
+        for vital, low, high in (("hemoglobin", 12, 17), ("total_protein", 6.0, 8.3), ("albumin", 3.5, 5.5)):
+            with self.subTest(vital=vital):
+                self.assertEqual(self.status(vital, low - 0.05), "Low")
+                self.assertEqual(self.status(vital, low), "Normal")
+                self.assertEqual(self.status(vital, high), "Normal")
+                self.assertEqual(self.status(vital, high + 0.05), "High")
+
+
+class MockPlanTests(SimpleTestCase):
+    def test_template_plans_do_not_share_state(self):
+        data = {"blood_sugar": "180 mg/dL", "cholesterol": "190 mg/dL"}
+        before = [profile["diet_plan"]["breakfast"]["total_calories"] for profile in MOCK_PROFILES]
+        with redirect_stdout(StringIO()):
+            young = distribute_calories(get_best_mock_match(data, "Vegetarian"), 25)
+            old = distribute_calories(get_best_mock_match(data, "Vegetarian"), 70)
+        self.assertNotEqual(young["breakfast"]["total_calories"], old["breakfast"]["total_calories"])
+        self.assertEqual([profile["diet_plan"]["breakfast"]["total_calories"] for profile in MOCK_PROFILES], before)
+
+
+class SchemaConformTests(SimpleTestCase):
+    MEAL = {"food_items": ["1 cup oats"], "total_calories": "400 kcal"}
+
+    def test_valid_plan_is_unchanged(self):
+        plan = {"breakfast": self.MEAL, "lunch": self.MEAL, "dinner": self.MEAL, "doctor_note": "Eat well"}
+        self.assertEqual(conform(plan, DIET_PLAN_SCHEMA), (plan, [], []))
+
+    def test_aliases_and_coercion(self):
+        plan = {"Breakfast": {"items": "- oats\n- milk", "calories": 400},
+                "lunch": ["rice", "dal"], "dinner": self.MEAL, "note": "Less sugar"}
+        result, repairs, problems = conform(plan, DIET_PLAN_SCHEMA)
+        self.assertEqual(result["breakfast"], {"food_items": ["oats", "milk"], "total_calories": "400"})
+        self.assertEqual(result["lunch"], {"food_items": ["rice", "dal"], "total_calories": "N/A"})
+        self.assertEqual(result["doctor_note"], "Less sugar")
+        self.assertNotIn("Breakfast", result)
+        self.assertTrue(repairs)
+        self.assertEqual(problems, [])
+
+    def test_missing_required_fields_are_reported_by_path(self):
+        _, _, problems = conform({"breakfast": self.MEAL, "lunch": self.MEAL}, DIET_PLAN_SCHEMA)
+        self.assertEqual(problems, ["dinner"])
+        day = {"breakfast": self.MEAL, "lunch": self.MEAL, "dinner": self.MEAL}
+        _, _, problems = conform({"plan": [day, {"breakfast": self.MEAL, "dinner": self.MEAL}]},
+                                 MULTI_DAY_PLAN_SCHEMA)
+        self.assertEqual(problems, ["days[1].lunch"])
+
+    def test_extraction_from_nested_and_structured_values(self):
+        data = {"patient_info": {"name": "Asha Rao", "sex": "F"},
+                "glucose": {"value": 110, "unit": "mg/dL"}, "findings": "High sugar; Low Hb"}
+        result, _, problems = conform(data, EXTRACTION_SCHEMA, keep_extra=False)
+        self.assertEqual(result["patient_name"], "Asha Rao")
+        self.assertEqual(result["gender"], "F")
+        self.assertEqual(result["blood_sugar"], "110 mg/dL")
+        self.assertEqual(result["abnormal_findings"], ["High sugar", "Low Hb"])
+        self.assertEqual(result["cholesterol"], "N/A")
+        self.assertEqual(problems, [])
+
+    def test_parse_llm_json_repairs(self):
+        self.assertEqual(parse_llm_json('```json\n{"a": 1,}\n```'), {"a": 1})
+        self.assertEqual(parse_llm_json('Here you go: {"a": [1, 2,]} Hope it helps'), {"a": [1, 2]})
+        with self.assertRaises(ValueError):
+            parse_llm_json("no json here")
+
+
+@override_settings(UPLOAD_COALESCE_WAIT=5, UPLOAD_COALESCE_GRACE=30)
+class FlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_follower_gets_leader_response(self):
+        leader = Flight("upload", "t1", "fp1")
+        self.assertIsNone(leader.join())
+        follower = Flight("upload", "t1", "fp1")
+        record = follower.join()
+        self.assertEqual(record["status"], RUNNING)
+        threading.Timer(0.3, leader.settle, (201, {"report_id": 7})).start()
+        done = follower.wait(record)
+        self.assertEqual((done["status"], done["status_code"], done["data"]), (DONE, 201, {"report_id": 7}))
+        # Late duplicates replay the response during the grace period
+        self.assertEqual(Flight("upload", "t1", "fp1").join()["data"], {"report_id": 7})
+
+    def test_flights_are_scoped_by_tenant_and_endpoint(self):
+        self.assertIsNone(Flight("upload", "t1", "fp1").join())
+        self.assertIsNone(Flight("upload", "t2", "fp1").join())
+        self.assertIsNone(Flight("jobs", "t1", "fp1").join())
+
+    def test_idempotency_key_replay_and_conflict(self):
+        leader = Flight("upload", "t1", "fp1", "key1")
+        self.assertIsNone(leader.join())
+        leader.settle(201, {"report_id": 7})
+        cache.delete(leader.content_key)  # past the grace period: only the key remembers
+        replay = Flight("upload", "t1", "fp1", "key1").join()
+        self.assertEqual((replay["status_code"], replay["data"]), (201, {"report_id": 7}))
+        with self.assertRaises(IdempotencyConflict):
+            Flight("upload", "t1", "fp2", "key1").join()
+
+    def test_failed_response_frees_the_key(self):
+        leader = Flight("upload", "t1", "fp1", "key1")
+        leader.join()
+        leader.settle(500, {"error": "boom"})
+        self.assertIsNone(Flight("upload", "t1", "fp2", "key1").join())
+
+    def test_retry_after_error_runs_again(self):
+        for status_code in (500, 429):
+            with self.subTest(status_code=status_code):
+                cache.clear()
+                leader = Flight("upload", "t1", "fp1", "key1")
+                leader.join()
+                leader.settle(status_code, {"error": "failed"})
+                # Neither the same content nor the same key replays the failure
+                retry = Flight("upload", "t1", "fp1", "key1")
+                self.assertIsNone(retry.join())
+                self.assertTrue(retry.leader)
+
+    def test_waiting_follower_is_told_to_retry_after_error(self):
+        leader = Flight("upload", "t1", "fp1")
+        leader.join()
+        follower = Flight("upload", "t1", "fp1")
+        record = follower.join()
+        threading.Timer(0.3, leader.settle, (500, {"error": "boom"})).start()
+        with self.assertRaises(StillRunning):
+            follower.wait(record)
+
+    def test_in_flight_job_until_release(self):
+        leader = Flight("jobs", "t1", "fp1")
+        leader.join()
+        leader.settle(202, {"job_id": "abc"}, in_flight=True)
+        self.assertEqual(Flight("jobs", "t1", "fp1").join()["data"], {"job_id": "abc"})
+        leader.release()
+        self.assertIsNone(Flight("jobs", "t1", "fp1").join())
+
+    def test_follower_gives_up(self):
+        Flight("upload", "t1", "fp1").join()
+        follower = Flight("upload", "t1", "fp1")
+        record = follower.join()
+        with self.settings(UPLOAD_COALESCE_WAIT=0), self.assertRaises(StillRunning):
+            follower.wait(record)
+
+
+class SlotSchedulerTests(SimpleTestCase):
+    def wait_until(self, condition):
+        deadline = time.monotonic() + 2
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "timed out")
+            time.sleep(0.01)
+
+    def waiting(self, scheduler, priority):
+        return scheduler.stats()[priority]["waiting"]
+
+    def start(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        return thread
+
+    def test_interactive_before_batch(self):
+        scheduler = SlotScheduler(2, 0)
+        scheduler.acquire(BATCH, "a", "ocr")
+        scheduler.acquire(BATCH, "a", "ocr")
+        granted = []
+
+        def take(priority, tag):
+            scheduler.acquire(priority, tag, "ocr")
+            granted.append(tag)
+
+        batch = self.start(take, BATCH, "batch")
+        self.wait_until(lambda: self.waiting(scheduler, BATCH) == 1)
+        interactive = self.start(take, INTERACTIVE, "interactive")
+        self.wait_until(lambda: self.waiting(scheduler, INTERACTIVE) == 1)
+        scheduler.release(BATCH)
+        interactive.join(2)
+        self.assertEqual(granted, ["interactive"])
+        scheduler.release(BATCH)
+        batch.join(2)
+        self.assertEqual(granted, ["interactive", "batch"])
+
+    def test_reserve_is_never_given_to_batch(self):
+        scheduler = SlotScheduler(2, 1)
+        scheduler.acquire(BATCH, "a", "ocr")
+        batch = self.start(scheduler.acquire, BATCH, "a", "ocr")
+        self.wait_until(lambda: self.waiting(scheduler, BATCH) == 1)
+        # The free slot is the interactive reserve
+        scheduler.acquire(INTERACTIVE, "u", "ocr")
+        self.assertEqual(self.waiting(scheduler, BATCH), 1)
+        scheduler.release(INTERACTIVE)
+        self.assertEqual(self.waiting(scheduler, BATCH), 1)
+        scheduler.release(BATCH)
+        batch.join(2)
+        self.assertFalse(batch.is_alive())
+
+    def test_tenants_take_turns(self):
+        scheduler = SlotScheduler(1, 0)
+        scheduler.acquire(BATCH, "hold", "ocr")
+        order = []
+
+        def take(tag):
+            scheduler.acquire(BATCH, tag[0], "ocr")
+            order.append(tag)
+            scheduler.release(BATCH)
+
+        threads = []
+        for i, tag in enumerate(["A1", "A2", "B1"], start=1):
+            threads.append(self.start(take, tag))
+            self.wait_until(lambda: self.waiting(scheduler, BATCH) == i)
+        scheduler.release(BATCH)
+        for thread in threads:
+            thread.join(2)
+        self.assertEqual(order, ["A1", "B1", "A2"])
+
+
+class PatientViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+
+    def add_report(self, days_ago, sugar, name="Meera Nair", age="40", gender="Female"):
+        report = MedicalReport.objects.create(
+            report_file="reports/x.pdf",
+            extracted_data={"patient_name": name, "age": age, "gender": gender, "blood_sugar": sugar})
+        MedicalReport.objects.filter(pk=report.pk).update(
+            created_at=timezone.now() - timezone.timedelta(days=days_ago))
+        report.refresh_from_db()
+        with redirect_stdout(StringIO()):
+            record_report(report)
+        return report
+
+    def test_reports_link_by_name_and_identity(self):
+        first = self.add_report(10, "95 mg/dL")
+        second = self.add_report(5, "140 mg/dL", name="meera  nair", age="40 years", gender="F")
+        other = self.add_report(1, "90 mg/dL", gender="Male")
+        unlinked = self.add_report(1, "90 mg/dL", name="Asha Rao", age="", gender="")
+        self.assertEqual(first.patient_id, second.patient_id)
+        self.assertNotEqual(first.patient_id, other.patient_id)
+        self.assertIsNone(unlinked.patient_id)
+        self.assertEqual(Patient.objects.count(), 2)
+
+    def test_patient_list_and_detail(self):
+        old = self.add_report(10, "95 mg/dL")
+        new = self.add_report(2, "140 mg/dL")
+        self.add_report(1, "90 mg/dL", name="Ravi Kumar", gender="Male")
+
+        patients = self.api.get("/api/patients/").json()["patients"]
+        self.assertEqual([p["name"] for p in patients], ["Ravi Kumar", "Meera Nair"])
+        meera = patients[1]
+        self.assertEqual(meera["report_count"], 2)
+        self.assertEqual(meera["latest"]["blood_sugar"]["value"], 140.0)
+        self.assertEqual(meera["latest"]["blood_sugar"]["status"], "High")
+        self.assertEqual(len(self.api.get("/api/patients/?name=meera").json()["patients"]), 1)
+
+        detail = self.api.get(f"/api/patients/{meera['id']}/").json()
+        self.assertEqual([r["id"] for r in detail["reports"]], [new.id, old.id])
+        self.assertEqual(self.api.get("/api/patients/9999/").status_code, 404)
+
+    def test_trends_oldest_first_with_filters(self):
+        old = self.add_report(10, "95 mg/dL")
+        self.add_report(2, "7.8 mmol/L")
+        patient_id = old.patient_id
+
+        trends = self.api.get(f"/api/patients/{patient_id}/trends/?vital=blood_sugar").json()["trends"]
+        self.assertEqual(list(trends), ["blood_sugar"])
+        self.assertEqual([round(p["value"]) for p in trends["blood_sugar"]], [95, 141])
+        self.assertEqual(trends["blood_sugar"][1]["unit"], "mg/dL")
+
+        since = (timezone.now() - timezone.timedelta(days=5)).date().isoformat()
+        recent = self.api.get(f"/api/patients/{patient_id}/trends/?since={since}").json()["trends"]
+        self.assertEqual(len(recent["blood_sugar"]), 1)
+        self.assertEqual(self.api.get(f"/api/patients/{patient_id}/trends/?since=soon").status_code, 400)
+
+    def test_reprocessing_an_older_report_keeps_the_newest_value(self):
+        old = self.add_report(10, "95 mg/dL")
+        self.add_report(2, "140 mg/dL")
+        old.extracted_data["blood_sugar"] = "110 mg/dL"
+        old.save()
+        with redirect_stdout(StringIO()):
+            record_report(old)
+        summary = Patient.objects.get(pk=old.patient_id).summary
+        self.assertEqual(summary.latest["blood_sugar"]["value"], 140.0)
+        self.assertEqual(summary.report_count, 2)
+        self.assertEqual(summary.first_report_at, old.created_at)
+
+    def test_upload_cannot_set_pipeline_fields(self):
+        patient = Patient.objects.create(name="Someone Else", name_key="someone else")
+        serializer = MedicalReportSerializer(data={
+            "patient": patient.id, "extracted_data": {"blood_sugar": "1 mg/dL"},
+            "diet_plan": {"breakfast": "x"}, "plan_version": 7, "quick_answers": {"q": "a"},
+        })
+        self.assertFalse(serializer.is_valid())  # report_file is the only writable field
+        self.assertEqual(list(serializer.errors), ["report_file"])
+        for field in ("patient", "extracted_data", "diet_plan", "plan_version", "quick_answers"):
+            self.assertTrue(serializer.fields[field].read_only, field)
+
+
+@override_settings(TENANT_HEADER_TRUSTED_PROXIES=["10.0.0.5"])
+class RequestTenantTests(SimpleTestCase):
+    def tenant(self, address, header=None, user=None):
+        extra = {"HTTP_X_TENANT_ID": header} if header else {}
+        request = RequestFactory().post("/api/jobs/", REMOTE_ADDR=address, **extra)
+        request.user = user or AnonymousUser()
+        return request_tenant(request)
+
+    def test_header_only_trusted_from_proxy(self):
+        self.assertEqual(self.tenant("10.0.0.5", "browser-1"), "session:browser-1")
+        self.assertEqual(self.tenant("10.0.0.5"), "addr:10.0.0.5")
+        # Anyone else cannot pick (or spoof) a tenant
+        self.assertEqual(self.tenant("203.0.113.9", "browser-1"), "addr:203.0.113.9")
+
+    def test_authenticated_user_wins(self):
+        user = User(pk=3, username="meera")
+        self.assertEqual(self.tenant("10.0.0.5", "browser-1", user), "user:3")
+
+
+class ReprocessViewTests(TestCase):
+    def test_report_ids_must_be_integers(self):
+        api = APIClient()
+        for report_ids in (["abc"], [1, "2x"], [0], "1,2", []):
+            with self.subTest(report_ids=report_ids):
+                resp = api.post("/api/reports/reprocess/", {"report_ids": report_ids}, format="json")
+                self.assertEqual(resp.status_code, 400)
+        resp = api.post("/api/reports/reprocess/", {"report_ids": ["12"]}, format="json")
+        self.assertEqual(resp.json()["jobs"], [])
+
+
+class UploadValidationTests(TestCase):
+    def test_bad_age_or_days_is_rejected_before_saving(self):
+        api = APIClient()
+        for url in ("/api/upload/", "/api/upload/async/", "/api/jobs/"):
+            for fields in ({"age": "forty"}, {"days": "two"}):
+                with self.subTest(url=url, fields=fields):
+                    upload = SimpleUploadedFile("report.pdf", b"%PDF-1.4", content_type="application/pdf")
+                    resp = api.post(url, {"report_file": upload, **fields}, format="multipart")
+                    self.assertEqual(resp.status_code, 400)
+                    self.assertEqual(resp.json()["error"], "age and days must be integers")
+        self.assertEqual(MedicalReport.objects.count(), 0)
+
+
+class JobPollingTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_patch = override_settings(MEDIA_ROOT=media.name)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+
+    def submit(self, process_report, **fields):
+        patcher = mock.patch.object(jobs, "process_report", process_report)  # until the worker has run it
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        upload = SimpleUploadedFile("report.pdf", b"%PDF-1.4", content_type="application/pdf")
+        resp = self.api.post("/api/jobs/", {"report_file": upload, **fields}, format="multipart")
+        self.assertEqual(resp.status_code, 202)
+        return resp.json()
+
+    def poll_until(self, job_id, statuses):
+        deadline = time.monotonic() + 5
+        while True:
+            job = self.api.get(f"/api/jobs/{job_id}/").json()
+            if job["status"] in statuses:
+                return job
+            self.assertLess(time.monotonic(), deadline, f"job stuck in {job['stage']}")
+            time.sleep(0.01)
+
+    def test_stages_partial_result_and_final_response(self):
+        ocr_done, finish = threading.Event(), threading.Event()
+
+        def process_report(report, diet_type, age, progress=None, days=1):
+            progress("ocr", page=1, pages=2)
+            ocr_done.set()
+            finish.wait(5)
+            progress("plan", partial={"patient_info": {"age": age}})
+            return {"report_id": report.id, "diet_type": diet_type, "days": days}
+
+        job = self.submit(process_report, diet_type="Vegan", age=52, days=3)
+        self.assertEqual(job["status"], "queued")
+        self.assertTrue(ocr_done.wait(5))
+        running = self.api.get(f"/api/jobs/{job['job_id']}/").json()
+        self.assertEqual((running["status"], running["stage"], running["page"], running["pages"]),
+                         ("running", "ocr", 1, 2))
+        self.assertIsNone(running["result"])
+        finish.set()
+
+        done = self.poll_until(job["job_id"], ("done",))
+        self.assertEqual(done["partial"], {"patient_info": {"age": 52}})
+        self.assertEqual(done["result"], {"report_id": job["report_id"], "diet_type": "Vegan", "days": 3})
+
+    def test_failure_is_reported(self):
+        def process_report(report, diet_type, age, progress=None, days=1):
+            raise RuntimeError("OCR quota exceeded")
+
+        with redirect_stdout(StringIO()):
+            job = self.submit(process_report)
+            failed = self.poll_until(job["job_id"], ("done", "error"))
+        self.assertEqual((failed["status"], failed["error"]), ("error", "OCR quota exceeded"))
+
+    def test_unknown_job(self):
+        self.assertEqual(self.api.get("/api/jobs/nope/").status_code, 404)
+
+
+def llm_reply(content):
+    """A chat-completion response object as returned by the Groq client."""
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@override_settings(PRECOMPUTE_QUICK_ANSWERS=True)
+class QuickAnswerTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.report = MedicalReport.objects.create(report_file="reports/x.pdf", diet_plan={"breakfast": {}})
+
+    def run_precompute(self, generate):
+        with mock.patch.object(services, "generate_quick_answers", generate), redirect_stdout(StringIO()):
+            services.start_quick_answer_precompute(self.report, {}, {}).join(5)
+        self.report.refresh_from_db()
+
+    def test_generate_repairs_sloppy_json(self):
+        content = '```json\n{"Answers": {"1": "Oats.", "3": "About 1800 kcal.",},}\n```'
+        with mock.patch.object(services, "call_groq_with_fallback", return_value=llm_reply(content)), \
+                redirect_stdout(StringIO()):
+            answers = services.generate_quick_answers({}, {})
+        self.assertEqual(answers, {QUICK_START_QUESTIONS[0]: "Oats.", QUICK_START_QUESTIONS[2]: "About 1800 kcal."})
+
+    def test_generate_gives_up_on_garbage(self):
+        with mock.patch.object(services, "call_groq_with_fallback", return_value=llm_reply("no idea")), \
+                redirect_stdout(StringIO()):
+            self.assertEqual(services.generate_quick_answers({}, {}), {})
+
+    def test_precompute_stores_answers(self):
+        self.run_precompute(lambda data, plan: {QUICK_START_QUESTIONS[0]: "Oats."})
+        self.assertEqual(self.report.quick_answers_status, "ready")
+        self.assertEqual(self.report.quick_answers, {QUICK_START_QUESTIONS[0]: "Oats."})
+
+    def test_precompute_failure_is_marked(self):
+        def fail(data, plan):
+            raise RuntimeError("quota")
+        self.run_precompute(fail)
+        self.assertEqual((self.report.quick_answers_status, self.report.quick_answers), ("failed", {}))
+
+    def test_answers_for_a_replaced_plan_are_dropped(self):
+        def regenerate_meanwhile(data, plan):
+            MedicalReport.objects.filter(pk=self.report.pk).update(plan_version=1)
+            return {QUICK_START_QUESTIONS[0]: "Answer for the old plan."}
+        self.run_precompute(regenerate_meanwhile)
+        self.assertEqual((self.report.quick_answers_status, self.report.quick_answers), ("pending", {}))
+
+    def test_view_status(self):
+        api = APIClient()
+        url = f"/api/reports/{self.report.id}/quick-answers/"
+        body = api.get(url).json()
+        self.assertEqual((body["status"], body["answers"], body["questions"]), ("pending", {}, QUICK_START_QUESTIONS))
+        MedicalReport.objects.filter(pk=self.report.pk).update(quick_answers_status="failed")
+        self.assertEqual(api.get(url).json()["status"], "failed")
+        MedicalReport.objects.filter(pk=self.report.pk).update(
+            quick_answers={QUICK_START_QUESTIONS[0]: "Oats."}, quick_answers_status="ready")
+        self.assertEqual(api.get(url).json()["answers"], {QUICK_START_QUESTIONS[0]: "Oats."})
+        with self.settings(PRECOMPUTE_QUICK_ANSWERS=False):
+            MedicalReport.objects.filter(pk=self.report.pk).update(quick_answers={})
+            self.assertEqual(api.get(url).json()["status"], "disabled")
+        self.assertEqual(api.get("/api/reports/9999/quick-answers/").status_code, 404)
+
+
+REPORT_DATA = {
+    "patient_info": {"name": "Meera Nair", "age": "40", "gender": "Female"},
+    "medical_data": {"blood_sugar": "140 mg/dL", "hemoglobin": "10.5 g/dL", "abnormal_findings": ["Low Hemoglobin"]},
+    "diet_plan": {
+        "breakfast": {"food_items": ["Oats", "Walnuts"], "total_calories": "350 kcal"},
+        "lunch": {"food_items": ["Brown rice", "Dal"], "total_calories": "600 kcal"},
+        "dinner": {"food_items": ["Roti", "Paneer"], "total_calories": "500 kcal"},
+        "doctor_note": "Low GI foods.",
+    },
+}
+
+
+class RetrievalTests(SimpleTestCase):
+    def search(self, query, top_k=3, past_reports=None):
+        index = BM25Index(build_context_chunks(REPORT_DATA, past_reports))
+        return [chunk["source"] for chunk in index.search(query, top_k=top_k)]
+
+    def test_top_chunks_for_the_question(self):
+        self.assertEqual(self.search("What is for lunch?")[0], "Diet plan - Lunch")
+        self.assertIn("Nutrition knowledge - Hemoglobin and iron", self.search("Which foods are rich in iron?"))
+        self.assertLessEqual(len(self.search("rice dal roti oats paneer walnuts", top_k=2)), 2)
+
+    def test_results_keep_document_order(self):
+        chunks = build_context_chunks(REPORT_DATA)
+        order = [chunk["source"] for chunk in chunks]
+        found = self.search("breakfast lunch dinner calories", top_k=4)
+        self.assertEqual(found, sorted(found, key=order.index))
+
+    def test_past_reports_are_searchable(self):
+        past = [{"created_at": "2026-01-10", "cholesterol": "245 mg/dL"}]
+        self.assertIn("Past report (2026-01-10)", self.search("What was my earlier cholesterol?", past_reports=past))
+
+    def test_no_match_falls_back_to_plan_overview(self):
+        self.assertEqual(self.search("hi"), ["Patient information", "Medical data (lab values)", "Abnormal findings"])
+
+    def test_prompt_gets_only_the_retrieved_chunks(self):
+        bot = DrAIChatbot(REPORT_DATA, client=None, memory=None, top_k=2)
+        context = bot.retrieve_context("What is for lunch?")
+        self.assertIn("Brown rice", context)
+        self.assertNotIn("Paneer", context)
+
+
+def turns(count):
+    """count alternating user / assistant messages, 'm0', 'm1', ..."""
+    return [{"role": ("user", "assistant")[i % 2], "content": f"m{i}"} for i in range(count)]
+
+
+class ConversationMemoryTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.store = ChatSessionStore()
+        self.llm = mock.Mock(return_value=llm_reply("Likes oats, dislikes karela."))
+        self.client = mock.Mock(chat=mock.Mock(completions=mock.Mock(create=self.llm)))
+
+    def memory(self, **kwargs):
+        return ConversationMemory(self.client, self.store, 1, "s1", keep_recent=4, **kwargs)
+
+    def wait_for_summary(self):
+        deadline = time.monotonic() + 5
+        while not self.store.get_summary(1, "s1")["summary"]:
+            self.assertLess(time.monotonic(), deadline, "summary never written")
+            time.sleep(0.01)
+        return self.store.get_summary(1, "s1")
+
+    def test_older_turns_are_folded_into_the_summary(self):
+        history = turns(10)
+        self.memory().compact_async(history)
+        self.assertEqual(self.wait_for_summary(),
+                         {"summary": "Likes oats, dislikes karela.", "summarized_upto": 6})
+        prompt = self.llm.call_args.kwargs["messages"][0]["content"]
+        self.assertIn("ASSISTANT: m5", prompt)
+        self.assertNotIn("m6", prompt)
+
+        messages = self.memory().build_messages("system", history, "next?")
+        self.assertEqual(messages[1]["content"], "Summary of the earlier conversation:\nLikes oats, dislikes karela.")
+        self.assertEqual([m["content"] for m in messages[2:]], ["m6", "m7", "m8", "m9", "next?"])
+
+    def test_short_conversations_are_not_summarized(self):
+        self.memory().compact_async(turns(4))
+        self.llm.assert_not_called()
+        messages = self.memory().build_messages("system", turns(4), "next?")
+        self.assertEqual([m["content"] for m in messages], ["system", "m0", "m1", "m2", "m3", "next?"])
+
+    def test_prompt_stays_under_the_token_ceiling(self):
+        history = [{"role": "user", "content": "x" * 400} for _ in range(10)]  # ~100 tokens each
+        messages = self.memory(max_prompt_tokens=350).build_messages("system", history, "next?")
+        self.assertEqual(len(messages), 5)  # system, the 3 newest turns that fit, question
+
+    def test_summary_of_a_reset_history_is_ignored(self):
+        self.store.set_summary(1, "s1", {"summary": "Old chat.", "summarized_upto": 8})
+        messages = self.memory().build_messages("system", turns(2), "next?")
+        self.assertEqual([m["content"] for m in messages], ["system", "m0", "m1", "next?"])
+
+    def test_failed_summary_keeps_the_old_state(self):
+        self.llm.side_effect = RuntimeError("quota")
+        memory = self.memory()
+        with redirect_stdout(StringIO()):
+            memory._compact(turns(10))
+        self.assertEqual(self.store.get_summary(1, "s1"), {"summary": "", "summarized_upto": 0})
+
+
+def llm_stream(*pieces):
+    """A streamed chat completion: one delta chunk per piece."""
+    return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+                 for piece in pieces])
+
+
+class AnswerCacheTests(SimpleTestCase):
+    def test_hits_exact_and_near_duplicate_questions(self):
+        answers = AnswerCache()
+        self.assertIsNone(answers.get("What should I eat for breakfast?", "ctx1"))
+        answers.put("What should I eat for breakfast?", "ctx1", "Oats.")
+        self.assertEqual(answers.get("what should i eat for BREAKFAST", "ctx1"), "Oats.")
+        self.assertIsNone(answers.get("What should I eat for breakfast today?", "ctx1"))  # 2 of 3 words shared
+        answers.put("What can I eat for breakfast on busy weekdays?", "ctx1", "Poha.")
+        self.assertEqual(answers.get("What can I eat for breakfast on busy working weekdays?", "ctx1"), "Poha.")
+        self.assertEqual((answers.hits, answers.misses), (2, 2))
+
+    def test_other_plan_context_misses(self):
+        answers = AnswerCache()
+        answers.put("Can I eat rice?", "ctx1", "Brown rice, yes.")
+        self.assertIsNone(answers.get("Can I eat rice?", "ctx2"))
+
+    def test_least_recently_used_and_expired_entries_go(self):
+        answers = AnswerCache(max_entries=2, ttl_seconds=60)
+        answers.put("rice", "ctx", "a")
+        answers.put("roti", "ctx", "b")
+        answers.get("rice", "ctx")
+        answers.put("dal", "ctx", "c")
+        self.assertIsNone(answers.get("roti", "ctx"))
+        self.assertEqual(answers.get("rice", "ctx"), "a")
+        with mock.patch.object(chat_engine.time, "time", return_value=time.time() + 61):
+            self.assertIsNone(answers.get("rice", "ctx"))
+
+    def test_chatbot_answers_repeated_opening_question_from_cache(self):
+        create = mock.Mock(side_effect=lambda **kwargs: llm_stream("Oats ", "with nuts."))
+        client = mock.Mock(chat=mock.Mock(completions=mock.Mock(create=create)))
+        memory = mock.Mock(build_messages=mock.Mock(return_value=[]))
+        with mock.patch.object(chat_engine, "ANSWER_CACHE", AnswerCache()):
+            bot = DrAIChatbot(REPORT_DATA, client, memory)
+            self.assertEqual(bot.chat("What should I eat for breakfast?", []), "Oats with nuts.")
+            self.assertEqual(bot.chat("what should I eat for breakfast", []), "Oats with nuts.")
+            self.assertEqual(create.call_count, 1)
+            # Follow-ups depend on the conversation, so they always reach the model
+            history = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "Hello!"}]
+            bot.chat("What should I eat for breakfast?", history)
+            self.assertEqual(create.call_count, 2)
+
+
+class FakeGroqTests(SimpleTestCase):
+    def ask(self, fake, content, **kwargs):
+        return fake.chat.completions.create(model="m", messages=[{"role": "user", "content": content}], **kwargs)
+
+    def test_pipeline_prompts_replay_their_recordings(self):
+        fake = FakeGroq(latency_scale=0)
+        with mock.patch.object(services, "client", fake), redirect_stdout(StringIO()):
+            single = services.generate_diet_plan({"blood_sugar": "182 mg/dL"}, "Vegetarian", 45)
+            week = services.generate_diet_plan({"blood_sugar": "182 mg/dL"}, "Vegetarian", 45, days=4)
+            answers = services.generate_quick_answers({}, single["plan"])
+        self.assertEqual((single["source"], week["source"]), ("AI", "AI"))
+        self.assertEqual(len(week["plan"]["days"]), 4)  # the one recorded day, cycled to the requested length
+        self.assertEqual(len(answers), len(QUICK_START_QUESTIONS))
+        self.assertEqual(dict(fake.calls), {"diet_plan": 1, "multi_day_plan": 1, "quick_answers": 1})
+
+    def test_recordings_replay_in_turn_after_scripted_replies(self):
+        fake = FakeGroq(recordings={"summary": ["first", "second"]}, latency_scale=0)
+        fake.script("summary", ["scripted"])
+        prompt = "You maintain a running summary of a conversation"
+        replies = [self.ask(fake, prompt).choices[0].message.content for _ in range(4)]
+        self.assertEqual(replies, ["scripted", "first", "second", "first"])
+
+    def test_streamed_reply_and_injected_errors(self):
+        fake = FakeGroq(latency_scale=0, stream_chunks=3)
+        chunks = [c.choices[0].delta.content for c in self.ask(fake, "Can I eat rice?", stream=True)]
+        self.assertEqual(len(chunks), 3)
+        self.assertTrue("".join(chunks).startswith("Based on your plan"))
+        with self.assertRaises(FakeGroqError):
+            self.ask(FakeGroq(latency_scale=0, error_rate=1.0), "Can I eat rice?", stream=True)
+
+    def test_unknown_prompt_fails_loudly(self):
+        with redirect_stdout(StringIO()), self.assertRaises(FakeGroqError):
+            self.ask(FakeGroq(latency_scale=0), "Translate this report into Hindi")
+
+    def test_recorded_responses_load_back(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "recordings.json")
+            recorder = RecordingGroq(FakeGroq(recordings={"chat": ["Eat more dal."]}, latency_scale=0), path)
+            prompt = "You maintain a running summary of a conversation"
+            self.ask(recorder, prompt)
+            self.assertEqual("".join(c.choices[0].delta.content for c in self.ask(recorder, "hi", stream=True)),
+                             "Eat more dal.")
+            recorder.flush()
+            recordings = load_recordings(path)
+        self.assertEqual(recordings["chat"], ["Eat more dal."])
+        self.assertEqual(recordings["summary"], ["The patient asked about breakfast options and sugar control."])
+        self.assertTrue(recordings["ocr"])  # kinds not recorded keep the defaults
+
+
+class ChatViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        self.report = MedicalReport.objects.create(
+            report_file="reports/x.pdf",
+            extracted_data={"patient_name": "Meera Nair", "blood_sugar": "140 mg/dL"},
+            diet_plan={"breakfast": {"food_items": ["Oats"], "total_calories": "350 kcal"}},
+            quick_answers={QUICK_START_QUESTIONS[0]: "Oats, for the fiber."})
+
+    def chat(self, message, **extra):
+        return self.api.post("/api/chat/", {"report_id": self.report.id, "session_id": "s1",
+                                            "message": message, **extra}, format="json")
+
+    def history(self):
+        return self.api.get(f"/api/chat/?report_id={self.report.id}&session_id=s1").json()["history"]
+
+    def test_bad_requests(self):
+        self.assertEqual(self.api.post("/api/chat/", {"report_id": self.report.id}, format="json").status_code, 400)
+        self.assertEqual(self.api.post("/api/chat/", {"report_id": "x", "session_id": "s", "message": "hi"},
+                                       format="json").status_code, 400)
+        self.assertEqual(self.api.get("/api/chat/?report_id=x&session_id=s").status_code, 400)
+        self.assertEqual(self.api.post("/api/chat/", {"report_id": 9999, "session_id": "s", "message": "hi"},
+                                       format="json").status_code, 404)
+
+    def test_quick_answer_opens_without_llm_call(self):
+        llm = mock.Mock(side_effect=AssertionError("no LLM call expected"))
+        with mock.patch.object(services, "client", mock.Mock(chat=mock.Mock(completions=mock.Mock(create=llm)))):
+            resp = self.chat(QUICK_START_QUESTIONS[0])
+        self.assertEqual(resp.json()["reply"], "Oats, for the fiber.")
+        self.assertEqual([m["role"] for m in self.history()], ["user", "assistant"])
+
+    def test_turns_are_kept_per_session(self):
+        with mock.patch.object(services, "client", FakeGroq(latency_scale=0)), redirect_stdout(StringIO()):
+            first = self.chat("Can I eat rice?").json()["reply"]
+            resp = self.chat("And bananas?", stream=True)
+            streamed = b"".join(resp.streaming_content).decode()
+        self.assertTrue(first)
+        self.assertTrue(streamed)
+        self.assertEqual(resp["Content-Type"], "text/plain; charset=utf-8")
+        history = self.history()
+        self.assertEqual([m["content"] for m in history[::2]], ["Can I eat rice?", "And bananas?"])
+        self.assertEqual(history[3]["content"], streamed)
+        other = self.api.get(f"/api/chat/?report_id={self.report.id}&session_id=s2").json()["history"]
+        self.assertEqual(other, [])
+
+    def test_concurrent_turns_keep_all_messages(self):
+        store = ChatSessionStore()
+
+        def append(tag):
+            for i in range(20):
+                store.append_history(self.report.id, "s1", [{"role": "user", "content": f"{tag}{i}"}])
+
+        threads = [threading.Thread(target=append, args=(tag,)) for tag in "ab"]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(store.get_history(self.report.id, "s1")), 40)
+
+
+def plan_day(breakfast, lunch, dinner, calories=None):
+    day = {meal: {"food_items": items, "total_calories": "N/A"}
+           for meal, items in zip(("breakfast", "lunch", "dinner"), (breakfast, lunch, dinner))}
+    if calories is not None:
+        day["day_calories"] = calories
+    return day
+
+
+class MultiDayPlanTests(SimpleTestCase):
+    def generate(self, days, reply=None, error=None):
+        llm = mock.Mock(return_value=llm_reply(reply), side_effect=error)
+        with mock.patch.object(services, "call_groq_with_fallback", llm), redirect_stdout(StringIO()):
+            result = services.generate_diet_plan({"blood_sugar": "140 mg/dL"}, "Vegetarian", 30, days)
+        return result, llm
+
+    def test_all_days_from_one_llm_call(self):
+        reply = json.dumps({"days": [plan_day(["Poha"], ["Dal", "Rice"], ["Roti"], 2200),
+                                     plan_day(["Idli"], ["Rajma"], ["Khichdi"], 2300),
+                                     plan_day(["Upma"], ["Chole"], ["Paneer"], 2400)],
+                            "doctor_note": "Low GI."})
+        result, llm = self.generate(3, reply)
+        plan = result["plan"]
+        self.assertEqual((result["source"], llm.call_count, len(plan["days"])), ("AI", 1, 3))
+        self.assertEqual(plan["breakfast"], plan["days"][0]["breakfast"])  # day 1 mirrored for single-day views
+        self.assertEqual({day["lunch"]["total_calories"] for day in plan["days"]}, {"800-1040 kcal"})
+        self.assertEqual(plan["checks"], {"variety": 1.0, "repeated_meals": [], "calorie_outliers": [],
+                                          "daily_target": "2000-2600 kcal"})
+
+    def test_templates_rotate_when_the_llm_fails(self):
+        result, _ = self.generate(9, error=RuntimeError("quota"))
+        days = result["plan"]["days"]
+        self.assertEqual((result["source"], len(days)), ("Template", services.MAX_PLAN_DAYS))
+        self.assertEqual(result["plan"]["checks"]["repeated_meals"], [])
+        for previous, day in zip(days, days[1:]):
+            self.assertNotEqual(previous["breakfast"], day["breakfast"])
+
+    def test_checks_flag_repeats_and_calorie_outliers(self):
+        checks = services.check_plan_days([
+            plan_day(["1 cup Oats"], ["Dal"], ["Roti"], 2100),
+            plan_day(["2 cups oats"], ["Rajma"], ["Roti"], "1200"),
+            plan_day(["Idli"], ["Dal"], ["Khichdi"], "about 2000"),
+        ], age=30)
+        self.assertEqual(checks["repeated_meals"], [{"day": 2, "meal": "breakfast"}, {"day": 2, "meal": "dinner"}])
+        self.assertEqual(checks["calorie_outliers"], [{"day": 2, "day_calories": 1200.0}])
+        self.assertEqual(checks["variety"], round(6 / 9, 2))
+
+    def test_later_days_are_retrievable_in_chat(self):
+        plan = {"days": [plan_day(["Poha"], ["Dal"], ["Roti"]), plan_day(["Idli"], ["Rajma"], ["Khichdi"])]}
+        chunks = {chunk["source"]: chunk["text"] for chunk in build_context_chunks({"diet_plan": plan})}
+        self.assertEqual(chunks["Diet plan - Day 2"], "Day 2 meals. Breakfast: Idli; Lunch: Rajma; Dinner: Khichdi")
+
+
+@override_settings(PRECOMPUTE_QUICK_ANSWERS=False)
+class ReportPlanTests(TestCase):
+    PLAN = {"breakfast": {"food_items": ["Oats"], "total_calories": "500-650 kcal"},
+            "lunch": {"food_items": ["Dal"], "total_calories": "800-1040 kcal"},
+            "dinner": {"food_items": ["Roti"], "total_calories": "700-910 kcal"},
+            "doctor_note": "Low GI."}
+
+    def setUp(self):
+        self.api = APIClient()
+        self.report = MedicalReport.objects.create(
+            report_file="reports/x.pdf", extracted_data={"patient_name": "Meera Nair", "blood_sugar": "140 mg/dL"},
+            diet_plan=self.PLAN, plan_source="AI", diet_type="Vegetarian", age=30,
+            quick_answers={QUICK_START_QUESTIONS[0]: "Oats."}, quick_answers_status="ready")
+        self.generate = mock.Mock(return_value={"plan": {**self.PLAN, "doctor_note": "Vegan plan."}, "source": "AI"})
+        patcher = mock.patch.object(pipeline, "generate_diet_plan", self.generate)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def replan(self, **fields):
+        with redirect_stdout(StringIO()):
+            resp = self.api.post(f"/api/reports/{self.report.id}/plan/", fields, format="json")
+        self.report.refresh_from_db()
+        return resp
+
+    def test_same_preferences_change_nothing(self):
+        body = self.replan(diet_type="Vegetarian", age=30).json()
+        self.assertEqual(body["plan_update"], "none")
+        self.assertEqual(body["diet_plan"], self.PLAN)
+        self.generate.assert_not_called()
+        self.assertEqual((self.report.plan_version, self.report.quick_answers_status), (0, "ready"))
+
+    def test_age_only_redistributes_calories(self):
+        body = self.replan(age=65).json()
+        self.assertEqual(body["plan_update"], "calories")
+        self.generate.assert_not_called()
+        self.assertEqual(body["diet_plan"]["lunch"]["total_calories"], "640-800 kcal")
+        self.assertEqual(body["diet_plan"]["lunch"]["food_items"], ["Dal"])
+        self.assertEqual(body["preferences"], {"diet_type": "Vegetarian", "age": 65, "days": 1})
+        self.assertEqual((self.report.plan_version, self.report.quick_answers), (1, {}))
+
+    def test_diet_type_or_days_regenerate_the_plan(self):
+        body = self.replan(diet_type="Vegan").json()
+        self.assertEqual((body["plan_update"], body["diet_plan"]["doctor_note"]), ("plan", "Vegan plan."))
+        self.generate.assert_called_once_with(self.report.extracted_data, "Vegan", 30, 1)
+        self.replan(days=3)
+        self.assertEqual(self.generate.call_args.args[1:], ("Vegan", 30, 3))
+        self.assertEqual(self.report.plan_version, 2)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.replan(age="old").status_code, 400)
+        MedicalReport.objects.filter(pk=self.report.pk).update(extracted_data={})
+        self.assertEqual(self.replan(age=40).status_code, 409)
+        self.assertEqual(self.api.post("/api/reports/9999/plan/", {}, format="json").status_code, 404)
+
+
+@override_settings(SPECULATIVE_PLAN=True, PRECOMPUTE_QUICK_ANSWERS=False)
+class SpeculativePlanTests(TestCase):
+    OCR_TEXT = "Patient Name: Meera Nair\nFasting Blood Sugar : 182 mg/dL\nTotal Cholesterol : 210 mg/dL\n"
+
+    def run_pipeline(self, extracted):
+        def extract(path, progress=None, stats=None, on_text=None):
+            on_text(self.OCR_TEXT)
+            return extracted, self.OCR_TEXT
+
+        plans = []
+
+        def plan(data, diet_type, age, days):
+            plans.append(data)
+            return {"plan": {"doctor_note": f"Sugar {data['blood_sugar']}, hemoglobin {data.get('hemoglobin', 'N/A')}."},
+                    "source": "AI"}
+
+        report = MedicalReport.objects.create(report_file="reports/x.pdf")
+        with mock.patch.object(pipeline, "extract_medical_data", extract), \
+                mock.patch.object(pipeline, "generate_diet_plan", plan), redirect_stdout(StringIO()):
+            pipeline.process_report(report, "Vegetarian", 40)
+        return report, plans
+
+    def test_kept_when_values_match(self):
+        report, plans = self.run_pipeline({
+            "patient_name": "Meera Nair", "blood_sugar": "182 mg/dL (High)", "cholesterol": "210 mg/dL",
+            "abnormal_findings": ["High Blood Sugar"]})
+        self.assertEqual(len(plans), 1)  # only the speculative plan was generated
+        self.assertEqual(report.diet_plan["doctor_note"], "Sugar 182 mg/dL, hemoglobin N/A.")
+
+    def test_discarded_when_a_value_differs_within_its_band(self):
+        report, _ = self.run_pipeline({
+            "patient_name": "Meera Nair", "blood_sugar": "190 mg/dL", "cholesterol": "210 mg/dL",
+            "abnormal_findings": ["High Blood Sugar"]})
+        self.assertEqual(report.diet_plan["doctor_note"], "Sugar 190 mg/dL, hemoglobin N/A.")
+
+    def test_discarded_when_extraction_finds_another_value(self):
+        report, _ = self.run_pipeline({
+            "patient_name": "Meera Nair", "blood_sugar": "182 mg/dL", "cholesterol": "210 mg/dL",
+            "hemoglobin": "11 g/dL", "abnormal_findings": []})
+        self.assertEqual(report.diet_plan["doctor_note"], "Sugar 182 mg/dL, hemoglobin 11 g/dL.")
+
+
+@unittest.skipUnless(os.path.isdir("/dev/shm"), "needs POSIX shared memory in /dev/shm")
+@override_settings(RENDER_PROCESSES=2, OCR_PREPROCESS=True)
+class RenderPoolTests(SimpleTestCase):
+    @staticmethod
+    def blocks():
+        return {name for name in os.listdir("/dev/shm") if name.startswith("psm_")}
+
+    def test_stopping_early_frees_shared_memory(self):
+        from .management.commands.bench_pipeline import build_report_pdf
+
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+            f.write(build_report_pdf(random.Random(1), 5))
+        self.addCleanup(os.unlink, f.name)
+        before = self.blocks()
+        stats = {"pages_blank": 0}
+        batches = iter_encoded_batches(f.name, 5, stats, tile=True)
+        self.assertTrue(next(batches).jpeg)
+        batches.close()  # as extract_medical_data does on early exit
+        # Renders still running when the consumer stopped are freed as they finish
+        deadline = time.monotonic() + 30
+        while self.blocks() - before and time.monotonic() < deadline:
+            time.sleep(0.1)
+        self.assertEqual(self.blocks() - before, set())
+
+
+def page(height, width=1000):
+    return Image.new("L", (width, height), 255)
+
+
+class PageBatchTests(SimpleTestCase):
+    def batches(self, heights):
+        return [[page_no for page_no, _ in batch]
+                for batch in ai_utils.iter_page_batches((i, page(h)) for i, h in enumerate(heights, start=1))]
+
+    def test_sparse_pages_share_a_call_dense_pages_go_alone(self):
+        self.assertEqual(self.batches([500, 600, 3000, 400, 700]), [[1, 2], [3], [4, 5]])
+
+    def test_tile_height_limit_starts_a_new_batch(self):
+        # Each sparse page plus its banner is 1310 px: two fit in 3600, a third does not
+        self.assertEqual(self.batches([1200] * 5), [[1, 2], [3, 4], [5]])
+
+    def test_pages_are_consumed_lazily(self):
+        rendered = []
+
+        def pages():
+            for page_no in (1, 2, 3):
+                rendered.append(page_no)
+                yield page_no, page(3000)
+
+        batches = ai_utils.iter_page_batches(pages())
+        self.assertEqual(next(batches)[0][0], 1)
+        self.assertEqual(rendered, [1])
+
+    def test_tile_is_transcribed_once_and_split_per_page(self):
+        text = "Report header\n=== PAGE 4 ===\nSugar 140\n## === Page 5 ===\nHb 11\n=== PAGE 9 ===\nstray"
+        ocr = mock.Mock(return_value=text)
+        batch = [(4, page(500)), (5, page(600))]
+        with mock.patch.object(ai_utils, "get_markdown_from_page", ocr), redirect_stdout(StringIO()):
+            result = ai_utils.get_markdown_from_batch(batch, client=None)
+        self.assertEqual(ocr.call_count, 1)
+        tile = ocr.call_args.args[0]
+        self.assertEqual(tile.size, (1000, 500 + 600 + 2 * ai_utils.MARKER_HEIGHT))
+        self.assertEqual(result, {4: "Report header\nSugar 140\nstray", 5: "Hb 11"})
+
+
+class SyntheticCorpusTests(SimpleTestCase):
+    def test_truth_matches_what_is_printed(self):
+        data, ext, truth = generate_report(random.Random(3), "pdf", pages=3, missing_rate=0.3)
+        self.assertEqual((ext, truth["pages"], len(truth["page_text"])), ("pdf", 3, 3))
+        self.assertEqual(len(ai_utils.pdfium.PdfDocument(data)), 3)
+        text = "\n".join(truth["page_text"])
+        self.assertIn(truth["patient_name"], text)
+        for field, printed in truth["printed"].items():
+            self.assertEqual(truth["values"][field], normalize_vital(field, printed))
+            if printed:
+                self.assertIn(printed.split(" ")[0], text)
+
+    def test_same_seed_same_report(self):
+        first = generate_report(random.Random(5), "png")
+        self.assertEqual(first, generate_report(random.Random(5), "png"))
+        self.assertEqual(first[2]["pages"], 1)  # scans are single pages
+
+    def test_missing_labs_are_not_printed(self):
+        _, _, truth = generate_report(random.Random(1), "pdf", missing_rate=1.0)
+        self.assertEqual(set(truth["values"].values()), {None})
+
+    def test_corpus_manifest_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            write_corpus(tmp, 4, seed=2, max_pages=2)
+            corpus = read_corpus(tmp)
+            self.assertEqual([truth["format"] for _, truth in corpus], ["pdf", "png", "jpg", "pdf"])
+            self.assertTrue(all(os.path.exists(path) for path, _ in corpus))
+
+    def test_score_report(self):
+        _, _, truth = generate_report(random.Random(4), "pdf", pages=1, missing_rate=0.0)
+        data = {"patient_name": truth["patient_name"].upper(), "age": f"{truth['age']} Years",
+                "gender": truth["gender"][0], **truth["printed"], "hemoglobin": "N/A", "bmi": "99"}
+        truth["values"]["albumin"] = None
+        scores = score_report(data, truth)
+        self.assertEqual((scores["patient_name"], scores["age"], scores["gender"]), ("correct",) * 3)
+        self.assertEqual((scores["hemoglobin"], scores["bmi"], scores["albumin"]),
+                         ("missed", "wrong", "false_positive"))
+        self.assertEqual(scores["blood_sugar"], "correct")
+
+    @override_settings(RENDER_PROCESSES=0)
+    def test_offline_benchmark_scores_every_field(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            write_corpus(tmp, 3, max_pages=1)
+            output = os.path.join(tmp, "results.json")
+            call_command("bench_extraction", corpus=tmp, offline=True, output=output, stdout=StringIO())
+            with open(output, encoding="utf-8") as f:
+                results = json.load(f)
+        self.assertEqual([r["format"] for r in results], ["pdf", "png", "jpg"])
+        for r in results:
+            self.assertEqual(set(r["scores"]), {"patient_name", "age", "gender", *TARGETS})
+            self.assertEqual(set(r["scores"].values()), {"correct"}, r)
+
+
+def write_report_pdf(pages):
+    from .management.commands.bench_pipeline import build_report_pdf
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(build_report_pdf(random.Random(1), pages))
+    return f.name
+
+
+@override_settings(OCR_ASYNC_CONCURRENCY=2)
+class AsyncOcrTests(SimpleTestCase):
+    FULL_PAGE = ("Patient Name: Rahul Sharma\nAge: 45 Years    Sex: Male\nFasting Blood Sugar: 182 mg/dL\n"
+                 "Total Cholesterol: 245 mg/dL\nHemoglobin: 11.2 g/dL\nTotal Protein: 6.4 g/dL\n"
+                 "Albumin: 3.9 g/dL\nBMI: 27.1")
+
+    def ocr(self, page_text, pages=5):
+        rendered, in_flight, peak = [], 0, []
+
+        def batches(file_path, stats):
+            for page_no in range(1, pages + 1):
+                rendered.append(page_no)
+                yield [(page_no, None)]
+
+        async def read(batch, client):
+            nonlocal in_flight
+            in_flight += 1
+            peak.append(in_flight)
+            await asyncio.sleep(0.05)
+            in_flight -= 1
+            return {page_no: page_text(page_no) for page_no, _ in batch}
+
+        stats = {"pages": pages, "pages_ocr": 0, "pages_blank": 0, "pages_failed": 0, "pages_skipped": 0,
+                 "early_exit": False}
+        with mock.patch.object(async_pipeline, "iter_ocr_batches", batches), \
+                mock.patch.object(async_pipeline, "aget_markdown_from_batch", read), \
+                mock.patch.object(async_pipeline, "get_async_client"), redirect_stdout(StringIO()):
+            texts = asyncio.run(async_pipeline.aocr_document("report.pdf", lambda stage, **info: None, stats))
+        return texts, stats, rendered, max(peak)
+
+    @override_settings(OCR_EARLY_EXIT=False)
+    def test_pages_are_read_concurrently_up_to_the_limit(self):
+        texts, stats, _, peak = self.ocr(lambda page_no: f"page {page_no}")
+        self.assertEqual(texts, {page_no: f"page {page_no}" for page_no in range(1, 6)})
+        self.assertEqual((stats["pages_ocr"], stats["early_exit"], peak), (5, False, 2))
+
+    @override_settings(OCR_EARLY_EXIT=True)
+    def test_stops_rendering_once_every_field_is_found(self):
+        texts, stats, rendered, _ = self.ocr(lambda page_no: self.FULL_PAGE if page_no == 1 else "", pages=8)
+        self.assertTrue(stats["early_exit"])
+        self.assertLess(len(rendered), 8)
+        self.assertEqual(stats["pages_skipped"], 8 - len(texts))
+
+
+@override_settings(GROQ_FAKE=True, GROQ_FAKE_LATENCY_SCALE=0, GROQ_FAKE_ERROR_RATE=0, RENDER_PROCESSES=0,
+                   SPECULATIVE_PLAN=False, PRECOMPUTE_QUICK_ANSWERS=False)
+class AsyncUploadTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_patch = override_settings(MEDIA_ROOT=media.name)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+
+    def upload(self, **fields):
+        path = write_report_pdf(2)
+        self.addCleanup(os.unlink, path)
+        with open(path, "rb") as f:
+            upload = SimpleUploadedFile("report.pdf", f.read(), content_type="application/pdf")
+        with redirect_stdout(StringIO()):
+            return self.client.post("/api/upload/async/", {"report_file": upload, **fields})
+
+    def test_report_is_processed_end_to_end(self):
+        resp = self.upload(diet_type="Vegetarian", age="45", days="3")
+        self.assertEqual(resp.status_code, 201, resp.content)
+        body = resp.json()
+        self.assertEqual((body["patient_info"]["name"], body["plan_source"]), ("Rahul Sharma", "AI"))
+        self.assertEqual(body["preferences"], {"diet_type": "Vegetarian", "age": 45, "days": 3})
+        self.assertEqual(body["vitals"]["blood_sugar"]["status"], "High")
+        report = MedicalReport.objects.get(pk=body["report_id"])
+        self.assertEqual((report.plan_version, len(report.diet_plan["days"])), (1, 3))
+        self.assertEqual(report.patient.name, "Rahul Sharma")
+
+    @override_settings(GROQ_FAKE_ERROR_RATE=1.0)
+    def test_groq_outage_falls_back_to_templates(self):
+        body = self.upload(diet_type="Vegetarian", age="45").json()
+        self.assertEqual(body["plan_source"], "Template")
+        self.assertIsNone(MedicalReport.objects.get(pk=body["report_id"]).patient_id)  # mock data is not linked
+
+
+class FakePdfPage:
+    def __init__(self, page_no):
+        self.page_no = page_no
+
+    def render(self, scale):
+        if self.page_no == 2:
+            raise RuntimeError("damaged page")
+        return SimpleNamespace(to_pil=lambda: Image.new("L", (600, 800), 255))
+
+
+class PageNumberingTests(SimpleTestCase):
+    def setUp(self):
+        pdf = [FakePdfPage(page_no) for page_no in (1, 2, 3)]
+        patcher = mock.patch.object(ai_utils.pdfium, "PdfDocument", return_value=pdf)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_failed_page_keeps_its_number(self):
+        with redirect_stdout(StringIO()):
+            pages = list(ai_utils.iter_document_images("report.pdf"))
+        self.assertEqual([(page_no, img is None) for page_no, img in pages], [(1, False), (2, True), (3, False)])
+
+    @override_settings(RENDER_PROCESSES=0, OCR_PREPROCESS=False)
+    def test_ocr_batches_skip_and_count_failed_page(self):
+        stats = {"pages_blank": 0, "pages_failed": 0}
+        with redirect_stdout(StringIO()):
+            batches = list(services.iter_ocr_batches("report.pdf", stats))
+        self.assertEqual([[page_no for page_no, _ in batch] for batch in batches], [[1], [3]])
+        self.assertEqual(stats["pages_failed"], 1)
@@ -1,6 +1,21 @@
 from django.urls import path
-from .views import UploadReportView
+from .views import (UploadReportView, AsyncUploadReportView, UploadJobView, QuickAnswersView, ReportPlanView, ChatView,
+                    ReprocessReportsView,
+                    PatientListView, PatientDetailView, PatientTrendsView, LLMOutputStatsView,
+                    SchedulerStatsView)
 
 urlpatterns = [
     path('upload/', UploadReportView.as_view(), name='upload_report'),
+    path('upload/async/', AsyncUploadReportView.as_view(), name='upload_report_async'),
+    path('jobs/', UploadJobView.as_view(), name='upload_job'),
+    path('jobs/<str:job_id>/', UploadJobView.as_view(), name='upload_job_status'),
+    path('chat/', ChatView.as_view(), name='chat'),
+    path('reports/<int:report_id>/quick-answers/', QuickAnswersView.as_view(), name='quick_answers'),
+    path('reports/<int:report_id>/plan/', ReportPlanView.as_view(), name='report_plan'),
+    path('reports/reprocess/', ReprocessReportsView.as_view(), name='reprocess_reports'),
+    path('patients/', PatientListView.as_view(), name='patients'),
+    path('patients/<int:patient_id>/', PatientDetailView.as_view(), name='patient_detail'),
+    path('patients/<int:patient_id>/trends/', PatientTrendsView.as_view(), name='patient_trends'),
+    path('stats/llm-outputs/', LLMOutputStatsView.as_view(), name='llm_output_stats'),
+    path('stats/scheduler/', SchedulerStatsView.as_view(), name='scheduler_stats'),
 ]
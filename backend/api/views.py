@@ -1,74 +1,420 @@
+import json
+import os
+from datetime import datetime
+from asgiref.sync import sync_to_async
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework import status
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_date
+from django.views import View
+from .async_pipeline import aprocess_report
+from .chat_engine import chat_turn, SESSION_STORE
+from .idempotency import Flight, IdempotencyConflict, StillRunning
+from .jobs import get_job, submit_report_job
+from .models import MedicalReport, Patient
+from .patients import lab_trends, past_reports_for_chat, patient_summary
+from .pipeline import build_report_response, plan_days, process_report, regenerate_plan
+from .scheduler import BATCH, INTERACTIVE, PRIORITIES, Overloaded, admit, request_tenant, scheduler_stats
+from .schemas import repair_stats
 from .serializers import MedicalReportSerializer
-from .services import extract_medical_data, generate_diet_plan
-import os
+from .services import MAX_PLAN_DAYS, QUICK_START_QUESTIONS
+
+
+def parse_days(value):
+    """Plan length from a request field, clamped to 1..MAX_PLAN_DAYS (ValueError if not a number)."""
+    return max(1, min(int(value or 1), MAX_PLAN_DAYS))
+
+
+def parse_report_id(value):
+    """A report id from a request field, or None when it is not a positive integer."""
+    try:
+        report_id = int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    return report_id if report_id > 0 else None
+
+
+def overloaded_response(error, response_class=Response):
+    """503 / 429 with Retry-After for a report the scheduler did not admit."""
+    response = response_class({"error": str(error), "retry_after": error.retry_after}, status=error.status)
+    response["Retry-After"] = str(error.retry_after)
+    return response
+
+
+def replay_response(record, response_class=Response):
+    """The response of the identical upload a request joined (see idempotency.Flight)."""
+    response = response_class(record["data"], status=record["status_code"])
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def flight_error_response(error, response_class=Response):
+    """422 for a reused Idempotency-Key, 409 with Retry-After when the joined upload did not finish."""
+    if isinstance(error, IdempotencyConflict):
+        return response_class({"error": str(error)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    response = response_class({"error": str(error)}, status=status.HTTP_409_CONFLICT)
+    response["Retry-After"] = str(settings.SCHEDULER_RETRY_AFTER)
+    return response
+
 
 class UploadReportView(APIView):
     parser_classes = (MultiPartParser, FormParser)
 
     def post(self, request, *args, **kwargs):
+        # Double-clicks and client retries join the identical upload already in flight
+        flight = Flight.for_request(request, "upload", request.data)
+        try:
+            record = flight.join() if flight else None
+            if record:
+                return replay_response(flight.wait(record))
+        except (IdempotencyConflict, StillRunning) as e:
+            return flight_error_response(e)
+
+        try:
+            response = self.admit_and_process(request)
+        except Exception as e:
+            response = Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if flight:
+            flight.settle(response.status_code, response.data)
+        return response
+
+    def admit_and_process(self, request):
+        # Interactive uploads are admitted (or turned away) before anything is saved
+        try:
+            ticket = admit(INTERACTIVE, request_tenant(request))
+        except Overloaded as e:
+            return overloaded_response(e)
+        try:
+            with ticket.active():
+                return self.process_upload(request)
+        finally:
+            ticket.release()
+
+    def process_upload(self, request):
         file_serializer = MedicalReportSerializer(data=request.data)
-        if file_serializer.is_valid():
-            report = file_serializer.save()
-            
-            # Perform AI Extraction & Analysis
-            file_path = report.report_file.path
-            
-            try:
-                # 1. Extract Medical Data (Vision + LLM)
-                # Returns a FLAT dict with keys: patient_name, age, gender,
-                # blood_sugar, cholesterol, bmi, hemoglobin, total_protein,
-                # albumin, abnormal_findings
-                extracted, full_text = extract_medical_data(file_path)
-                
-                # 2. Get diet preference from request (default to Balanced)
-                diet_type = request.data.get("diet_type", "Balanced")
-                
-                # 3. Get age from request (default to 25)
-                age = int(request.data.get("age", 25))
-                
-                print(f"[VIEW] Diet Type received: {diet_type}")
-                print(f"[VIEW] Age received: {age}")
-                print(f"[VIEW] Extracted data keys: {list(extracted.keys())}")
-                
-                # 4. Generate Diet Plan (LLM) with diet preference and age
-                result = generate_diet_plan(extracted, diet_type, age)
-                
-                # Extract plan and source from hybrid response
-                diet_plan = result.get("plan", result)
-                plan_source = result.get("source", "Unknown")
-                
-                # Save extracted data
-                report.extracted_data = extracted
-                report.save()
-
-                # Construct Response — properly separate patient_info and medical_data
-                response_data = {
-                    "message": "Report processed successfully",
-                    "patient_info": {
-                        "name": extracted.get("patient_name", "N/A"),
-                        "age": extracted.get("age", str(age)),
-                        "gender": extracted.get("gender", "N/A"),
-                    },
-                    "medical_data": {
-                        "blood_sugar": extracted.get("blood_sugar", "N/A"),
-                        "cholesterol": extracted.get("cholesterol", "N/A"),
-                        "bmi": extracted.get("bmi", "N/A"),
-                        "hemoglobin": extracted.get("hemoglobin", "N/A"),
-                        "total_protein": extracted.get("total_protein", "N/A"),
-                        "albumin": extracted.get("albumin", "N/A"),
-                        "abnormal_findings": extracted.get("abnormal_findings", []),
-                    },
-                    "diet_plan": diet_plan,
-                    "plan_source": plan_source,
-                    "raw_text_preview": full_text[:500] + "..." if full_text else ""
-                }
-                return Response(response_data, status=status.HTTP_201_CREATED)
-            except Exception as e:
-                return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if not file_serializer.is_valid():
+            return Response(file_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        else:
+        # 1. Get diet preference from request (default to Balanced)
+        diet_type = request.data.get("diet_type", "Balanced")
+        try:
+            # 2. Get age from request (default to 25)
+            age = int(request.data.get("age", 25))
+            # 3. Number of plan days (default 1)
+            days = parse_days(request.data.get("days"))
+        except (TypeError, ValueError):
+            return Response({"error": "age and days must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Saved only once the request is known to be valid, so a bad field leaves no report behind
+        report = file_serializer.save()
+        try:
+            # 4. Perform AI Extraction & Analysis, then generate the plan
+            response_data = process_report(report, diet_type, age, days=days)
+            return Response(response_data, status=status.HTTP_201_CREATED)
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncUploadReportView(View):
+    """
+    Async twin of UploadReportView for ASGI servers: same fields and response,
+    but Groq calls are awaited (OCR pages concurrently), so one worker can
+    hold many in-flight reports. Under WSGI it still works, one request per thread.
+    """
+    http_method_names = ["post"]
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True  # API clients send no CSRF token, as with the DRF views
+        return view
+
+    async def post(self, request, *args, **kwargs):
+        flight = await sync_to_async(Flight.for_request)(request, "upload_async", request.POST)
+        try:
+            record = await sync_to_async(flight.join)() if flight else None
+            if record:
+                return replay_response(await flight.await_result(record), JsonResponse)
+        except (IdempotencyConflict, StillRunning) as e:
+            return flight_error_response(e, JsonResponse)
+
+        try:
+            response = await self.admit_and_process(request)
+        except Exception as e:
+            response = JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if flight:
+            await sync_to_async(flight.settle)(response.status_code, json.loads(response.content))
+        return response
+
+    async def admit_and_process(self, request):
+        tenant = await sync_to_async(request_tenant)(request)
+        try:
+            ticket = admit(INTERACTIVE, tenant)
+        except Overloaded as e:
+            return overloaded_response(e, JsonResponse)
+        try:
+            with ticket.active():
+                return await self.process_upload(request)
+        finally:
+            ticket.release()
+
+    async def process_upload(self, request):
+        file_serializer = MedicalReportSerializer(data=request.FILES)
+        if not file_serializer.is_valid():
+            return JsonResponse(file_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        diet_type = request.POST.get("diet_type", "Balanced")
+        try:
+            age = int(request.POST.get("age", 25))
+            days = parse_days(request.POST.get("days"))
+        except (TypeError, ValueError):
+            return JsonResponse({"error": "age and days must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            report = await sync_to_async(file_serializer.save)()
+            response_data = await aprocess_report(report, diet_type, age, days=days)
+            return JsonResponse(response_data, status=status.HTTP_201_CREATED)
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class UploadJobView(APIView):
+    """
+    Non-blocking upload. POST takes the same fields as /api/upload/ and returns
+    202 with a job id; GET /api/jobs/<job_id>/ reports the current stage
+    (rendering, ocr page i/n, extraction, plan), partial results once
+    extraction is done, and the full result when finished.
+    An optional `priority` field ("interactive" or "batch") picks the
+    scheduling class; batch jobs are never rejected but only use spare capacity.
+    """
+    parser_classes = (MultiPartParser, FormParser)
+
+    def post(self, request, *args, **kwargs):
+        file_serializer = MedicalReportSerializer(data=request.data)
+        if not file_serializer.is_valid():
             return Response(file_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            diet_type = request.data.get("diet_type", "Balanced")
+            age = int(request.data.get("age", 25))
+            days = parse_days(request.data.get("days"))
+        except (TypeError, ValueError):
+            return Response({"error": "age and days must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        priority = request.data.get("priority", INTERACTIVE)
+        if priority not in PRIORITIES:
+            return Response({"error": f"priority must be one of {', '.join(PRIORITIES)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # An identical upload already queued or running hands out its job instead
+        flight = Flight.for_request(request, "jobs", request.data)
+        try:
+            record = flight.join() if flight else None
+            if record:
+                return replay_response(flight.wait(record))
+        except (IdempotencyConflict, StillRunning) as e:
+            return flight_error_response(e)
+
+        try:
+            ticket = admit(priority, request_tenant(request))
+        except Overloaded as e:
+            response = overloaded_response(e)
+            if flight:
+                flight.settle(response.status_code, response.data)
+            return response
+
+        report = file_serializer.save()
+        job_id = submit_report_job(report, diet_type, age, days, ticket=ticket,
+                                   on_done=flight.release if flight else None)
+        response = Response(
+            {"job_id": job_id, "report_id": report.id, "status": "queued"},
+            status=status.HTTP_202_ACCEPTED,
+        )
+        if flight:
+            flight.settle(response.status_code, response.data, in_flight=True)
+            if get_job(job_id)["status"] in ("done", "error"):
+                flight.release()  # the job beat settle(); its on_done ran too early to clear the record
+        return response
+
+    def get(self, request, job_id=None, *args, **kwargs):
+        job = get_job(job_id) if job_id else None
+        if job is None:
+            return Response({"error": "Unknown or expired job"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job)
+
+
+class QuickAnswersView(APIView):
+    """Pre-generated answers to the chat quick-start prompts for a report."""
+
+    def get(self, request, report_id, *args, **kwargs):
+        report = get_object_or_404(MedicalReport, pk=report_id)
+        answers = report.quick_answers or {}
+        if answers:
+            answer_status = "ready"
+        elif not settings.PRECOMPUTE_QUICK_ANSWERS:
+            answer_status = "disabled"
+        else:
+            answer_status = report.quick_answers_status or "pending"
+        return Response({
+            "status": answer_status,
+            "questions": QUICK_START_QUESTIONS,
+            "answers": answers,
+        })
+
+
+class ReportPlanView(APIView):
+    """
+    Re-plan a processed report for new preferences without re-uploading.
+    POST {"diet_type", "age"} (either optional). Age-only changes just
+    redistribute calories; a new diet type regenerates the plan.
+    """
+
+    def post(self, request, report_id, *args, **kwargs):
+        report = get_object_or_404(MedicalReport, pk=report_id)
+        if not report.extracted_data:
+            return Response({"error": "Report has not been processed yet"},
+                            status=status.HTTP_409_CONFLICT)
+        try:
+            age = request.data.get("age")
+            age = int(age) if age not in (None, "") else None
+            days = request.data.get("days")
+            days = parse_days(days) if days not in (None, "") else None
+        except (TypeError, ValueError):
+            return Response({"error": "age and days must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+
+        response_data, update = regenerate_plan(report, request.data.get("diet_type") or None, age, days)
+        return Response({**response_data, "plan_update": update})
+
+
+class ReprocessReportsView(APIView):
+    """
+    Bulk re-processing: re-run OCR, extraction and the plan for stored reports
+    as batch jobs, which only use Groq capacity interactive uploads leave free.
+    POST {"report_ids": [...]} or {"all": true}; the jobs run as the caller's tenant.
+    Returns 202 with one job id per report (poll /api/jobs/<job_id>/).
+    """
+
+    def post(self, request, *args, **kwargs):
+        reports = MedicalReport.objects.exclude(report_file="").order_by("id")
+        if not request.data.get("all"):
+            report_ids = request.data.get("report_ids")
+            if not isinstance(report_ids, list) or not report_ids:
+                return Response({"error": "Pass report_ids (a list) or all=true"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            report_ids = [parse_report_id(report_id) for report_id in report_ids]
+            if None in report_ids:
+                return Response({"error": "report_ids must be positive integers"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            reports = reports.filter(pk__in=report_ids)
+        tenant = request_tenant(request)
+
+        jobs, skipped = [], []
+        for report in reports:
+            if not os.path.exists(report.report_file.path):
+                skipped.append(report.id)
+                continue
+            job_id = submit_report_job(report, report.diet_type or "Balanced", report.age or 25,
+                                       plan_days(report.diet_plan), ticket=admit(BATCH, tenant))
+            jobs.append({"report_id": report.id, "job_id": job_id})
+        return Response({"jobs": jobs, "skipped_missing_file": skipped, "priority": BATCH},
+                        status=status.HTTP_202_ACCEPTED)
+
+
+class ChatView(APIView):
+    """
+    Dr. AI chat over a processed report. Conversation state is kept server-side
+    per (report_id, session_id) and expires after CHAT_SESSION_TTL seconds idle.
+
+    POST {"report_id", "session_id", "message", "stream"} -> {"reply"} or a
+    text/plain stream when "stream" is true.
+    GET ?report_id=&session_id= -> {"history"}.
+    """
+
+    def get(self, request, *args, **kwargs):
+        report_id = request.query_params.get("report_id")
+        session_id = request.query_params.get("session_id")
+        if not report_id or not session_id:
+            return Response({"error": "report_id and session_id are required"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        report_id = parse_report_id(report_id)
+        if report_id is None:
+            return Response({"error": "report_id must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"history": SESSION_STORE.get_history(report_id, session_id)})
+
+    def post(self, request, *args, **kwargs):
+        report_id = request.data.get("report_id")
+        session_id = request.data.get("session_id")
+        message = (request.data.get("message") or "").strip()
+        if not report_id or not session_id or not message:
+            return Response({"error": "report_id, session_id and message are required"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        report_id = parse_report_id(report_id)
+        if report_id is None:
+            return Response({"error": "report_id must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = get_object_or_404(MedicalReport, pk=report_id)
+        turn = chat_turn(build_report_response(report), report.id, str(session_id), message,
+                         quick_answers=report.quick_answers,
+                         past_reports=past_reports_for_chat(report))
+
+        if str(request.data.get("stream", "")).lower() in ("1", "true"):
+            return StreamingHttpResponse(turn, content_type="text/plain; charset=utf-8")
+        return Response({"reply": "".join(turn)})
+
+
+class PatientListView(APIView):
+    """Patients with their precomputed summary, most recently seen first."""
+
+    def get(self, request, *args, **kwargs):
+        patients = (Patient.objects.select_related("summary")
+                    .order_by("-summary__last_report_at", "-id"))
+        name = request.query_params.get("name")
+        if name:
+            patients = patients.filter(name__icontains=name)
+        return Response({"patients": [patient_summary(p) for p in patients[:200]]})
+
+
+class PatientDetailView(APIView):
+    """One patient's summary plus the list of their reports."""
+
+    def get(self, request, patient_id, *args, **kwargs):
+        patient = get_object_or_404(Patient.objects.select_related("summary"), pk=patient_id)
+        reports = patient.reports.order_by("-created_at").values("id", "created_at", "plan_source")
+        return Response({**patient_summary(patient), "reports": list(reports)})
+
+
+class PatientTrendsView(APIView):
+    """
+    Time series per lab value for a patient.
+    GET ?vital=blood_sugar&vital=cholesterol&since=2026-01-01 (both optional).
+    """
+
+    def get(self, request, patient_id, *args, **kwargs):
+        patient = get_object_or_404(Patient, pk=patient_id)
+        since = request.query_params.get("since")
+        if since:
+            day = parse_date(since)
+            since = datetime.combine(day, datetime.min.time()) if day else parse_datetime(since)
+            if since is None:
+                return Response({"error": "since must be an ISO date or datetime"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+        vitals = request.query_params.getlist("vital") or None
+        return Response({"patient_id": patient.id, "trends": lab_trends(patient, vitals, since)})
+
+
+class LLMOutputStatsView(APIView):
+    """How often each structured LLM output was valid, repaired, field-fixed or failed."""
+
+    def get(self, request, *args, **kwargs):
+        return Response({"schemas": repair_stats()})
+
+
+class SchedulerStatsView(APIView):
+    """Stage slots in use, queue lengths and waits per priority class, and admission rejections."""
+
+    def get(self, request, *args, **kwargs):
+        return Response(scheduler_stats())
@@ -0,0 +1,188 @@
+"""
+Lab-value parsing, unit normalization and classification shared by the API,
+the diet-plan fallback and batch analytics.
+
+Values arrive as free-text strings from the extraction LLM ("180 mg/dL (High)",
+"6.1 mmol/L", "38 g/L"). They are parsed once, converted to one canonical unit
+per vital, and classified against NumPy band tables, so a whole batch of
+reports is classified with one vectorized comparison per vital.
+"""
+import re
+
+import numpy as np
+
+# Canonical unit, unit conversion factors (normalized unit -> multiplier to the
+# canonical unit), bands and labels. "bands" are the upper bounds of each status
+# but the last, as (operator, bound) checked in order, with the same cut-offs and
+# < / <= as the clinical if-chains they replace (blood sugar: < 70 Low, <= 85
+# Slightly Low, <= 100 Normal, <= 125 Elevated, else High).
+VITALS = {
+    "blood_sugar": {
+        "label": "Blood Sugar",
+        "unit": "mg/dL",
+        "convert": {"mg/dl": 1.0, "mmol/l": 18.016},
+        "bands": [("<", 70), ("<=", 85), ("<=", 100), ("<=", 125)],
+        "statuses": ["Low", "Slightly Low", "Normal", "Elevated", "High"],
+        "normal": "70-100 mg/dL (fasting)",
+    },
+    "cholesterol": {
+        "label": "Cholesterol",
+        "unit": "mg/dL",
+        "convert": {"mg/dl": 1.0, "mmol/l": 38.67},
+        "bands": [("<", 150), ("<=", 199), ("<=", 239)],
+        "statuses": ["Normal", "Borderline", "High", "Very High"],
+        "normal": "<200 mg/dL",
+    },
+    "hemoglobin": {
+        "label": "Hemoglobin",
+        "unit": "g/dL",
+        "convert": {"g/dl": 1.0, "g/l": 0.1, "mmol/l": 1.611},
+        "bands": [("<", 12), ("<=", 17)],
+        "statuses": ["Low", "Normal", "High"],
+        "normal": "12-17 g/dL",
+    },
+    "total_protein": {
+        "label": "Total Protein",
+        "unit": "g/dL",
+        "convert": {"g/dl": 1.0, "g/l": 0.1},
+        "bands": [("<", 6.0), ("<=", 8.3)],
+        "statuses": ["Low", "Normal", "High"],
+        "normal": "6.0-8.3 g/dL",
+    },
+    "albumin": {
+        "label": "Albumin",
+        "unit": "g/dL",
+        "convert": {"g/dl": 1.0, "g/l": 0.1},
+        "bands": [("<", 3.5), ("<=", 5.5)],
+        "statuses": ["Low", "Normal", "High"],
+        "normal": "3.5-5.5 g/dL",
+    },
+    "bmi": {
+        "label": "BMI",
+        "unit": "kg/m²",
+        "convert": {"kg/m2": 1.0, "kg/m²": 1.0},
+        "bands": [("<", 18.5), ("<", 25), ("<", 30)],
+        "statuses": ["Underweight", "Normal", "Overweight", "Obese"],
+        "normal": "18.5-24.9",
+    },
+}
+
+VITAL_KEYS = list(VITALS)
+NO_DATA = "No Data"
+
+# Band tables as arrays, built once: bounds, and whether each bound itself is in the band below
+_BOUNDS = {key: np.asarray([bound for _, bound in spec["bands"]], dtype=np.float64) for key, spec in VITALS.items()}
+_INCLUSIVE = {key: np.asarray([op == "<=" for op, _ in spec["bands"]]) for key, spec in VITALS.items()}
+_STATUSES = {key: np.asarray(spec["statuses"] + [NO_DATA], dtype=object) for key, spec in VITALS.items()}
+
+# A comma followed by exactly three digits is a thousands separator ("1,200");
+# any other comma is a decimal comma ("6,1 mmol/L")
+_MEASUREMENT = re.compile(r"(\d+(?:,\d{3}(?!\d))*(?:[.,]\d+)?)\s*([a-zA-Zµμ²%^/0-9]*(?:/[a-zA-Z0-9²^]+)?)")
+_THOUSANDS = re.compile(r",(?=\d{3}(?!\d))")
+
+# Spellings on (mostly Indian) lab reports for the units in VITALS["convert"].
+# "g%" / "mg%" are per 100 mL, i.e. per dL.
+UNIT_ALIASES = {
+    "gm/dl": "g/dl", "gms/dl": "g/dl", "gm%": "g/dl", "g%": "g/dl", "gm/l": "g/l",
+    "mg%": "mg/dl", "mgs/dl": "mg/dl",
+    "kg/m^2": "kg/m2", "kg/sq.m": "kg/m2",
+}
+
+
+def parse_measurement(text):
+    """
+    Split a lab value string into (number, normalized unit).
+    '180 mg/dL (High)' -> (180.0, 'mg/dl'); '13 g%' -> (13.0, 'g/dl');
+    '1,200 mg/dL' -> (1200.0, 'mg/dl'); 'N/A' -> (None, '').
+    """
+    if text is None:
+        return None, ""
+    if isinstance(text, (int, float)):
+        return float(text), ""
+    match = _MEASUREMENT.search(str(text))
+    if not match:
+        return None, ""
+    number = _THOUSANDS.sub("", match.group(1))
+    value = float(number.replace(",", "."))
+    unit = match.group(2).lower().replace("μ", "µ")
+    return value, UNIT_ALIASES.get(unit, unit)
+
+
+def normalize_vital(key, text):
+    """
+    Numeric value of one vital in its canonical unit, or None when missing or the
+    unit is not one we can convert. A bare number is taken as the canonical unit.
+    """
+    value, unit = parse_measurement(text)
+    if value is None:
+        return None
+    if not unit:
+        return value
+    factor = VITALS[key]["convert"].get(unit)
+    return round(value * factor, 2) if factor is not None else None
+
+
+def values_matrix(reports):
+    """(n_reports, n_vitals) float array of canonical values, NaN where missing."""
+    matrix = np.full((len(reports), len(VITAL_KEYS)), np.nan)
+    for row, data in enumerate(reports):
+        for col, key in enumerate(VITAL_KEYS):
+            value = normalize_vital(key, (data or {}).get(key))
+            if value is not None:
+                matrix[row, col] = value
+    return matrix
+
+
+def classify_matrix(matrix):
+    """
+    Status label array matching `matrix` (from values_matrix). The band index of
+    each cell is the number of bounds it is past, compared for the whole column
+    at once; NaN cells become 'No Data'.
+    """
+    statuses = np.empty(matrix.shape, dtype=object)
+    for col, key in enumerate(VITAL_KEYS):
+        column = matrix[:, col]
+        values, bounds = column[:, None], _BOUNDS[key]
+        index = np.where(_INCLUSIVE[key], values > bounds, values >= bounds).sum(axis=1)
+        index[np.isnan(column)] = len(_STATUSES[key]) - 1
+        statuses[:, col] = _STATUSES[key][index]
+    return statuses
+
+
+def classify_batch(reports):
+    """
+    Classify every vital of many extracted-data dicts at once.
+    Returns one {vital: {"value", "unit", "status"}} dict per report.
+    """
+    matrix = values_matrix(reports)
+    statuses = classify_matrix(matrix)
+    results = []
+    for row in range(len(reports)):
+        results.append({
+            key: {
+                "value": None if np.isnan(matrix[row, col]) else float(matrix[row, col]),
+                "unit": VITALS[key]["unit"],
+                "status": statuses[row, col],
+            }
+            for col, key in enumerate(VITAL_KEYS)
+        })
+    return results
+
+
+def classify_report(data):
+    """classify_batch for a single extracted-data dict."""
+    return classify_batch([data])[0]
+
+
+def same_values(data, other):
+    """
+    True when every vital of two extracted-data dicts has the same value in its
+    canonical unit ("182 mg/dL" and "182 mg/dL (High)" agree), or is missing in both.
+    """
+    first, second = values_matrix([data, other])
+    return bool(np.array_equal(first, second, equal_nan=True))
+
+
+def reference_ranges_text():
+    """Normal ranges as the bullet list used in the extraction prompt."""
+    return "\n".join(f"   - {spec['label']}: {spec['normal']}" for spec in VITALS.values())
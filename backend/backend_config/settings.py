@@ -137,4 +137,84 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 # Tesseract Configuration (not used - using Groq Vision instead)
 # TESSERACT_CMD = '/usr/bin/tesseract'
-GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
\ No newline at end of file
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+
+# Offline Groq stand-in (api/fakegroq.py) for load tests: replays recorded responses
+GROQ_FAKE = os.environ.get("GROQ_FAKE", "false").lower() == "true"
+GROQ_FAKE_RECORDINGS = os.environ.get("GROQ_FAKE_RECORDINGS")
+GROQ_FAKE_LATENCY_SCALE = float(os.environ.get("GROQ_FAKE_LATENCY_SCALE", "1.0"))
+GROQ_FAKE_ERROR_RATE = float(os.environ.get("GROQ_FAKE_ERROR_RATE", "0.0"))
+# Append every real Groq response to this recordings file (for GROQ_FAKE_RECORDINGS)
+GROQ_RECORD_PATH = os.environ.get("GROQ_RECORD_PATH")
+
+# Pre-generate answers to the chat quick-start prompts right after a plan is produced
+PRECOMPUTE_QUICK_ANSWERS = os.environ.get("PRECOMPUTE_QUICK_ANSWERS", "true").lower() == "true"
+
+# Cache used for server-side chat sessions and upload job state. LocMem is per-process; set REDIS_URL
+# so every backend worker shares the same state.
+REDIS_URL = os.environ.get("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+
+# Idle chat sessions are evicted after this many seconds
+CHAT_SESSION_TTL = int(os.environ.get("CHAT_SESSION_TTL", "3600"))
+
+# Background upload jobs (/api/jobs/): worker threads and how long job state is kept
+UPLOAD_JOB_WORKERS = int(os.environ.get("UPLOAD_JOB_WORKERS", "4"))
+UPLOAD_JOB_TTL = int(os.environ.get("UPLOAD_JOB_TTL", "3600"))
+BATCH_JOB_WORKERS = int(os.environ.get("BATCH_JOB_WORKERS", "2"))
+
+# Idempotent uploads (api/idempotency.py): identical in-flight uploads share one run, followers
+# wait up to UPLOAD_COALESCE_WAIT seconds and late ones replay the result for UPLOAD_COALESCE_GRACE;
+# responses to an Idempotency-Key are kept for IDEMPOTENCY_TTL seconds
+UPLOAD_COALESCE = os.environ.get("UPLOAD_COALESCE", "true").lower() == "true"
+UPLOAD_COALESCE_WAIT = int(os.environ.get("UPLOAD_COALESCE_WAIT", "300"))
+UPLOAD_COALESCE_GRACE = int(os.environ.get("UPLOAD_COALESCE_GRACE", "30"))
+IDEMPOTENCY_TTL = int(os.environ.get("IDEMPOTENCY_TTL", "86400"))
+
+# Stage scheduler (api/scheduler.py): concurrent Groq calls shared by the OCR, extraction
+# and plan stages (0 = no scheduling), slots batch work may not use, and admission limits
+SCHEDULER_SLOTS = int(os.environ.get("SCHEDULER_SLOTS", "8"))
+SCHEDULER_INTERACTIVE_RESERVE = int(os.environ.get("SCHEDULER_INTERACTIVE_RESERVE", "2"))
+SCHEDULER_MAX_ACTIVE = int(os.environ.get("SCHEDULER_MAX_ACTIVE", "32"))
+SCHEDULER_TENANT_MAX_ACTIVE = int(os.environ.get("SCHEDULER_TENANT_MAX_ACTIVE", "4"))
+SCHEDULER_RETRY_AFTER = int(os.environ.get("SCHEDULER_RETRY_AFTER", "10"))
+
+# Client addresses (e.g. the Streamlit server) whose X-Tenant-ID header names the tenant;
+# anyone else is their logged-in user or, failing that, their address
+TENANT_HEADER_TRUSTED_PROXIES = [
+    addr.strip() for addr in os.environ.get("TENANT_HEADER_TRUSTED_PROXIES", "127.0.0.1,::1").split(",")
+    if addr.strip()
+]
+
+# Deskew / crop / contrast-normalize pages and skip blank ones before Vision OCR
+OCR_PREPROCESS = os.environ.get("OCR_PREPROCESS", "true").lower() == "true"
+
+# Pack several sparse (short, cropped) pages into one Vision OCR call; needs OCR_PREPROCESS
+OCR_TILE_PAGES = os.environ.get("OCR_TILE_PAGES", "true").lower() == "true"
+
+# Stop rendering / OCRing pages once every target lab field has been seen
+OCR_EARLY_EXIT = os.environ.get("OCR_EARLY_EXIT", "true").lower() == "true"
+
+# Vision OCR calls in flight at once per report on the async upload path (/api/upload/async/)
+OCR_ASYNC_CONCURRENCY = int(os.environ.get("OCR_ASYNC_CONCURRENCY", "4"))
+
+# Worker processes that render, preprocess and JPEG-encode pages for OCR (0 = on the request thread)
+RENDER_PROCESSES = int(os.environ.get("RENDER_PROCESSES", "0"))
+
+# Start the diet plan from locally parsed OCR values while the LLM extraction runs;
+# the plan is kept when the extracted lab values are the same
+SPECULATIVE_PLAN = os.environ.get("SPECULATIVE_PLAN", "true").lower() == "true"
+SPECULATIVE_PLAN_WORKERS = int(os.environ.get("SPECULATIVE_PLAN_WORKERS", "4"))
@@ -1,15 +1,9 @@
 import streamlit as st
 import requests
-import re
 import uuid
 import os
-from pathlib import Path
-from dotenv import load_dotenv
-
-# --- Load environment variables from backend's .env ---
-_env_path = Path(__file__).resolve().parent.parent / "backend" / ".env"
-if _env_path.exists():
-    load_dotenv(_env_path)
+import hashlib
+import time
 
 # --- Page Config ---
 st.set_page_config(
@@ -19,21 +13,30 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
-API_URL = "http://127.0.0.1:8000/api/upload/"
+API_BASE = os.getenv("NUTRICARE_API_BASE", "http://127.0.0.1:8000/api/")
+JOBS_URL = API_BASE + "jobs/"
+PATIENTS_URL = API_BASE + "patients/"
+JOB_POLL_INTERVAL = 0.75  # seconds between progress polls
+JOB_TIMEOUT = 300         # give up waiting for a job after this many seconds
 
 # --- Session State Defaults ---
 _defaults = {
     "dark_mode": True,
     "diet_type": "Vegetarian",
     "age": 25,
+    "plan_days": 1,
     "bmi_value": None,
     "weight": 70.0,
     "height": 170.0,
     "chat_history": [],
     "diet_chain": None,
     "session_id": str(uuid.uuid4()),
+    # Stays for the whole browser session (session_id changes per report / chat);
+    # the backend schedules and rate-limits uploads per tenant
+    "tenant_id": str(uuid.uuid4()),
     "generated_plan": None,
-    "pending_question": None,
+    "show_full_chat": False,
+    "optimize_upload": True,
 }
 for _k, _v in _defaults.items():
     if _k not in st.session_state:
@@ -43,37 +46,79 @@ for _k, _v in _defaults.items():
 # ============================================================
 #  HELPER FUNCTIONS
 # ============================================================
-def extract_numeric(val_str):
-    """Extract first number from a string like '180 mg/dL (High)'."""
-    if not val_str or val_str == "N/A":
-        return None
-    m = re.search(r"(\d+\.?\d*)", str(val_str))
-    return float(m.group(1)) if m else None
-
-
-def classify_vital(value, vital_type):
-    """Return (label, hex_color, symbol) for a vital value."""
-    if value is None:
-        return ("No Data", "#9CA3AF", "—")
-    if vital_type == "blood_sugar":
-        if value < 70:
-            return ("Low", "#3B82F6", "↓")
-        if value <= 85:
-            return ("Slightly Low", "#06B6D4", "↘")
-        if value <= 100:
-            return ("Normal", "#10B981", "✓")
-        if value <= 125:
-            return ("Elevated", "#F59E0B", "↗")
-        return ("High", "#EF4444", "↑")
-    if vital_type == "cholesterol":
-        if value < 150:
-            return ("Normal", "#10B981", "✓")
-        if value <= 199:
-            return ("Borderline", "#F59E0B", "↗")
-        if value <= 239:
-            return ("High", "#EF4444", "↑")
-        return ("Very High", "#DC2626", "⚠")
-    return ("Unknown", "#9CA3AF", "?")
+# Colour and symbol per vital status; statuses come from the backend (api/vitals.py)
+STATUS_STYLES = {
+    "Low": ("#3B82F6", "↓"),
+    "Slightly Low": ("#06B6D4", "↘"),
+    "Underweight": ("#3B82F6", "↓"),
+    "Normal": ("#10B981", "✓"),
+    "Borderline": ("#F59E0B", "↗"),
+    "Elevated": ("#F59E0B", "↗"),
+    "Overweight": ("#F59E0B", "↗"),
+    "High": ("#EF4444", "↑"),
+    "Very High": ("#DC2626", "⚠"),
+    "Obese": ("#DC2626", "⚠"),
+    "No Data": ("#9CA3AF", "—"),
+}
+
+
+def vital_style(vital):
+    """(value, status, hex_color, symbol) for one entry of the API's `vitals` section."""
+    vital = vital or {}
+    status = vital.get("status", "No Data")
+    color, sym = STATUS_STYLES.get(status, ("#9CA3AF", "?"))
+    return vital.get("value"), status, color, sym
+
+
+@st.cache_resource
+def get_http_session():
+    """One pooled HTTP session (keep-alive connections) shared by every rerun and user."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_trends(patient_id, report_id):
+    """Lab-value history for a patient; `report_id` busts the cache after a new upload."""
+    try:
+        resp = get_http_session().get(f"{PATIENTS_URL}{patient_id}/trends/", timeout=10)
+        resp.raise_for_status()
+        return resp.json().get("trends", {})
+    except requests.RequestException:
+        return {}
+
+
+def describe_job(job):
+    """(fraction_done, label) for an upload job's current stage."""
+    stage = job.get("stage")
+    if stage == "ocr":
+        page, pages = job.get("page", 1), max(job.get("pages", 1), 1)
+        return 0.1 + 0.5 * (page - 1) / pages, f"📄 Reading page {page}/{pages} with Vision AI..."
+    return {
+        "queued": (0.02, "⏳ Queued..."),
+        "rendering": (0.05, "🖼️ Rendering report pages..."),
+        "extraction": (0.65, "🧪 Extracting health metrics..."),
+        "plan": (0.8, "🥗 Generating your diet plan..."),
+        "done": (1.0, "✅ Done"),
+    }.get(stage, (0.0, "🔬 Analyzing your report..."))
+
+
+def render_partial_results(partial):
+    """Show extracted vitals while the diet plan is still being generated."""
+    patient = partial.get("patient_info", {})
+    med = partial.get("medical_data", {})
+    st.markdown(
+        f"**Patient:** {patient.get('name', 'N/A')} · "
+        f"**Blood Sugar:** {med.get('blood_sugar', 'N/A')} · "
+        f"**Cholesterol:** {med.get('cholesterol', 'N/A')} · "
+        f"**Hemoglobin:** {med.get('hemoglobin', 'N/A')}"
+    )
+    findings = med.get("abnormal_findings", [])
+    if findings:
+        st.caption("Findings: " + ", ".join(findings))
 
 
 # ============================================================
@@ -97,7 +142,7 @@ def build_css(dark: bool) -> str:
 
     return f"""<style>
 @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
-html,body,[class*="css"]{{font-family:'Inter',sans-serif;}}
+html,body,[class*="css"]{{font-family:'Inter',system-ui,-apple-system,'Segoe UI',Roboto,sans-serif;}}
 
 /* App-level backgrounds */
 .stApp{{background:{app_bg} !important;}}
@@ -211,11 +256,161 @@ footer{{visibility:hidden;}}
 </style>"""
 
 
+@st.cache_resource
+def get_theme_css(dark: bool) -> str:
+    """Built once per theme per server process, then reused on every rerun."""
+    return build_css(dark)
+
+
+# ============================================================
+#  CACHED HTML FRAGMENTS
+# ============================================================
+HERO_HTML = """
+    <div class="hero">
+        <h1>🩺 AI-NutriCare</h1>
+        <p>Upload your medical report and get a personalized, AI-generated diet plan
+        tailored to your health conditions, age, and dietary preferences.</p>
+    </div>
+    """
+
+STEPS_HTML = """
+    <div class="steps-row">
+        <div class="step-box">
+            <div class="step-num">1</div>
+            <div class="step-title">Upload Report</div>
+            <div class="step-desc">PDF or image of your blood test / medical report</div>
+        </div>
+        <div class="step-box">
+            <div class="step-num">2</div>
+            <div class="step-title">AI Analysis</div>
+            <div class="step-desc">AI reads your vitals, detects conditions &amp; risk factors</div>
+        </div>
+        <div class="step-box">
+            <div class="step-num">3</div>
+            <div class="step-title">Get Your Plan</div>
+            <div class="step-desc">Receive a meal-by-meal diet plan with calorie targets</div>
+        </div>
+    </div>
+    """
+
+
+@st.cache_data(max_entries=256)
+def meal_card_html(icon, title, meal):
+    """HTML for one meal card; `meal` is either a dict or a plain string."""
+    if isinstance(meal, str):
+        return (
+            f'<div class="nc-card">'
+            f'<div class="meal-hdr">{icon} {title}</div>'
+            f'<div class="meal-item">{meal}</div>'
+            f"</div>"
+        )
+    items_html = "".join(
+        f'<div class="meal-item">• {it}</div>'
+        for it in meal.get("food_items", [])
+    )
+    cals = meal.get("total_calories", "—")
+    return (
+        f'<div class="nc-card">'
+        f'<div class="meal-hdr">{icon} {title}</div>'
+        f"{items_html}"
+        f'<div class="meal-cal">⚡ {cals}</div>'
+        f"</div>"
+    )
+
+
+@st.cache_data(max_entries=256)
+def vital_card_html(label, val, unit, status, color, sym):
+    """HTML for one key-vital card; `val` is None when the value is missing."""
+    if val is None:
+        return (
+            f'<div class="vital-card">'
+            f'<div class="vital-lbl">{label}</div>'
+            f'<div style="color:#9ca3af;margin-top:4px;">Not available</div>'
+            f"</div>"
+        )
+    return (
+        f'<div class="vital-card">'
+        f'<div class="vital-lbl">{label}</div>'
+        f'<div class="vital-val" style="color:{color}">{int(val)} {unit}</div>'
+        f'<span class="vital-badge" style="background:{color}15;color:{color};">{sym} {status}</span>'
+        f"</div>"
+    )
+
+
+# ============================================================
+#  CHAT FRAGMENT  (reruns on its own — the plan above is not re-rendered)
+# ============================================================
+CHAT_WINDOW = 10  # messages rendered per chat rerun; older ones load on demand
+
+# Keep in sync with QUICK_START_QUESTIONS in backend/api/services.py
+QUICK_PROMPTS = [
+    ("🍳 Breakfast info", "What should I eat for breakfast and why?"),
+    ("🔄 Alternatives", "Can you suggest alternatives for my lunch?"),
+    ("📊 Calories", "What are the total calories for each meal?"),
+    ("❓ Why this diet?", "Why did you recommend this specific diet based on my medical data?"),
+]
+
+
+@st.fragment
+def render_chat():
+    """
+    Chat section as an isolated fragment. Sending a message reruns only this
+    function, and only the last CHAT_WINDOW messages are rendered, so the cost
+    per message doesn't grow with the length of the conversation.
+    """
+    started = time.perf_counter()
+    history = st.session_state.chat_history
+    question = None
+
+    # Quick-start suggestion buttons (only show when no history)
+    if not history:
+        buttons_slot = st.empty()
+        with buttons_slot.container():
+            scols = st.columns(len(QUICK_PROMPTS))
+            for sc, (lbl, prm) in zip(scols, QUICK_PROMPTS):
+                with sc:
+                    if st.button(lbl, use_container_width=True, key=f"s_{lbl}"):
+                        question = prm
+        if question:
+            buttons_slot.empty()
+
+    hidden = 0 if st.session_state.show_full_chat else max(0, len(history) - CHAT_WINDOW)
+    if hidden:
+        more_slot = st.empty()
+        if more_slot.button(f"Show {hidden} earlier messages", key="chat_show_all"):
+            st.session_state.show_full_chat = True
+            more_slot.empty()
+            hidden = 0
+
+    # Render the visible window using Streamlit's native chat UI
+    for msg in history[hidden:]:
+        with st.chat_message(msg["role"], avatar="🧑" if msg["role"] == "user" else "👨‍⚕️"):
+            st.markdown(msg["content"])
+
+    # Suggestion button click or free-form input
+    user_msg = st.chat_input("Ask AI about your diet plan...")
+    question = question or user_msg
+
+    if question:
+        history.append({"role": "user", "content": question})
+        with st.chat_message("user", avatar="🧑"):
+            st.markdown(question)
+        with st.chat_message("assistant", avatar="👨‍⚕️"):
+            # Streamed from the backend (pre-generated quick answers return instantly)
+            ans = st.write_stream(st.session_state.diet_chain.chat_stream(question))
+        history.append({"role": "assistant", "content": ans})
+
+    print(
+        f"[PERF] Chat fragment rendered {len(history) - hidden}/{len(history)} messages "
+        f"in {(time.perf_counter() - started) * 1000:.1f} ms"
+    )
+
+
 # ============================================================
 #  APPLY CSS
 # ============================================================
 is_dark = st.session_state.get("dark_mode", False)
-st.markdown(build_css(is_dark), unsafe_allow_html=True)
+st.markdown(get_theme_css(is_dark), unsafe_allow_html=True)
 
 
 # ============================================================
@@ -237,6 +432,12 @@ with st.sidebar:
     st.markdown("##### Preferences")
     st.selectbox("Diet Type", ["Vegetarian", "Non-Vegetarian"], key="diet_type")
     st.number_input("Age", min_value=1, max_value=120, step=1, key="age")
+    st.select_slider("Plan length (days)", options=list(range(1, 8)), key="plan_days")
+    st.checkbox(
+        "Optimize photo before upload",
+        key="optimize_upload",
+        help="Shrink phone photos before sending; the server still straightens and crops them (PDFs are sent as-is)",
+    )
 
     # BMI calculator
     with st.expander("BMI Calculator"):
@@ -268,6 +469,14 @@ with st.sidebar:
         disabled=(uploaded_file is None),
     )
 
+    # Re-plan the current report when only the preferences changed (no re-upload / OCR)
+    update_btn = False
+    if st.session_state.generated_plan:
+        used = st.session_state.generated_plan.get("preferences") or {}
+        wanted = (st.session_state.diet_type, st.session_state.age, st.session_state.plan_days)
+        if (used.get("diet_type"), used.get("age"), used.get("days", 1)) != wanted:
+            update_btn = st.button("🔁 Update plan for new preferences", use_container_width=True)
+
     st.divider()
 
     # Dark mode toggle — key-managed, no assignment conflict
@@ -279,37 +488,111 @@ with st.sidebar:
 #  PROCESS UPLOAD  (runs only on button click)
 # ============================================================
 if generate_btn and uploaded_file:
-    with st.spinner("🔬 Analyzing your report with AI — this may take a moment..."):
-        try:
-            files = {
-                "report_file": (uploaded_file.name, uploaded_file, uploaded_file.type)
-            }
-            payload = {
-                "diet_type": st.session_state.diet_type,
-                "age": st.session_state.age,
-            }
-            resp = requests.post(API_URL, files=files, data=payload, timeout=120)
+    http = get_http_session()
+    try:
+        file_name, file_data, file_type = uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type
+        if st.session_state.optimize_upload:
+            from image_prep import prepare_upload
+
+            file_data, file_name, file_type, prep = prepare_upload(file_data, file_name, file_type)
+            if prep["changed"]:
+                st.caption(
+                    f"Optimized upload: {prep['original_bytes'] / 1e6:.1f} MB → "
+                    f"{prep['final_bytes'] / 1e6:.1f} MB"
+                )
+        files = {
+            "report_file": (file_name, file_data, file_type)
+        }
+        payload = {
+            "diet_type": st.session_state.diet_type,
+            "age": st.session_state.age,
+            "days": st.session_state.plan_days,
+        }
+        # The same file and preferences in this session get the same key, so a
+        # rerun or retry picks up the job already submitted instead of starting another
+        idempotency_key = hashlib.sha256(
+            st.session_state.session_id.encode() + file_data + repr(sorted(payload.items())).encode()
+        ).hexdigest()
+        # Submit without waiting for the pipeline, then poll for progress
+        resp = http.post(JOBS_URL, files=files, data=payload, timeout=30,
+                         headers={"Idempotency-Key": idempotency_key,
+                                  "X-Tenant-ID": st.session_state.tenant_id})
+
+        if resp.status_code in (429, 503):
+            # Not admitted: the server is at capacity (or this client has too many reports running)
+            st.warning(f"{resp.json().get('error', 'The server is busy.')} "
+                       f"Try again in about {resp.headers.get('Retry-After', '10')} seconds.")
+        elif resp.status_code != 202:
+            st.error(f"Server error ({resp.status_code}): {resp.text[:300]}")
+        else:
+            job_id = resp.json()["job_id"]
+            job = {}
+            with st.status("🔬 Analyzing your report with AI...", expanded=True) as status_box:
+                bar = st.progress(0.0)
+                partial_slot = st.empty()
+                deadline = time.monotonic() + JOB_TIMEOUT
+                while True:
+                    job = http.get(f"{JOBS_URL}{job_id}/", timeout=10).json()
+                    fraction, label = describe_job(job)
+                    bar.progress(fraction, text=label)
+                    if job.get("partial"):
+                        with partial_slot.container():
+                            render_partial_results(job["partial"])
+                    if job.get("status") in ("done", "error"):
+                        break
+                    if time.monotonic() > deadline:
+                        job = {"status": "error", "error": "Timed out waiting for the report to finish."}
+                        break
+                    time.sleep(JOB_POLL_INTERVAL)
+                status_box.update(
+                    label="Plan ready!" if job.get("status") == "done" else "Analysis failed",
+                    state="complete" if job.get("status") == "done" else "error",
+                )
 
-            if resp.status_code == 201:
-                st.session_state.generated_plan = resp.json()
+            if job.get("status") == "done":
+                st.session_state.generated_plan = job["result"]
                 st.session_state.diet_chain = None
                 st.session_state.chat_history = []
+                st.session_state.show_full_chat = False
                 st.session_state.session_id = str(uuid.uuid4())
                 st.rerun()
             else:
-                st.error(f"Server error ({resp.status_code}): {resp.text[:300]}")
-        except requests.exceptions.ConnectionError:
-            st.error(
-                "**Cannot connect to the backend.**  \n"
-                "Make sure the Django server is running:  \n"
-                "`cd backend && python manage.py runserver`"
-            )
-        except Exception as e:
-            st.error(f"Something went wrong: {e}")
+                st.error(f"Server error: {job.get('error', 'unknown error')[:300]}")
+    except requests.exceptions.ConnectionError:
+        st.error(
+            "**Cannot connect to the backend.**  \n"
+            "Make sure the Django server is running:  \n"
+            "`cd backend && python manage.py runserver`"
+        )
+    except Exception as e:
+        st.error(f"Something went wrong: {e}")
 elif generate_btn:
     st.warning("Please upload a medical report first.")
 
 
+if update_btn:
+    report_id = st.session_state.generated_plan.get("report_id")
+    try:
+        with st.spinner("Updating your plan..."):
+            resp = get_http_session().post(
+                f"{API_BASE}reports/{report_id}/plan/",
+                json={"diet_type": st.session_state.diet_type, "age": st.session_state.age,
+                      "days": st.session_state.plan_days},
+                timeout=120,
+            )
+        if resp.status_code == 200:
+            st.session_state.generated_plan = resp.json()
+            st.session_state.diet_chain = None
+            st.session_state.chat_history = []
+            st.session_state.show_full_chat = False
+            st.session_state.session_id = str(uuid.uuid4())
+            st.rerun()
+        else:
+            st.error(f"Server error ({resp.status_code}): {resp.text[:300]}")
+    except requests.exceptions.ConnectionError:
+        st.error("**Cannot connect to the backend.**")
+
+
 # ============================================================
 #  DISPLAY RESULTS  (persisted in session_state)
 # ============================================================
@@ -328,7 +611,7 @@ if st.session_state.generated_plan:
         st.caption(
             f"Patient: **{name}** · "
             f"Age: **{patient.get('age', st.session_state.age)}** · "
-            f"Diet: **{st.session_state.diet_type}**"
+            f"Diet: **{(data.get('preferences') or {}).get('diet_type') or st.session_state.diet_type}**"
         )
     with hcol2:
         src_cls = "src-ai" if plan_source == "AI" else "src-tmpl"
@@ -346,32 +629,22 @@ if st.session_state.generated_plan:
         ("🍛", "Lunch", "lunch"),
         ("🥗", "Dinner", "dinner"),
     ]
-    cols = st.columns(3)
-    for col, (icon, title, key) in zip(cols, meals):
-        with col:
-            meal = diet.get(key, {})
-            if isinstance(meal, str):
-                st.markdown(
-                    f'<div class="nc-card">'
-                    f'<div class="meal-hdr">{icon} {title}</div>'
-                    f'<div class="meal-item">{meal}</div>'
-                    f"</div>",
-                    unsafe_allow_html=True,
-                )
-            else:
-                items_html = "".join(
-                    f'<div class="meal-item">• {it}</div>'
-                    for it in meal.get("food_items", [])
-                )
-                cals = meal.get("total_calories", "—")
-                st.markdown(
-                    f'<div class="nc-card">'
-                    f'<div class="meal-hdr">{icon} {title}</div>'
-                    f"{items_html}"
-                    f'<div class="meal-cal">⚡ {cals}</div>'
-                    f"</div>",
-                    unsafe_allow_html=True,
-                )
+    day_plans = diet.get("days") or [diet]
+    day_tabs = st.tabs([f"Day {i}" for i in range(1, len(day_plans) + 1)]) if len(day_plans) > 1 else [st.container()]
+    for tab, day_plan in zip(day_tabs, day_plans):
+        with tab:
+            cols = st.columns(3)
+            for col, (icon, title, key) in zip(cols, meals):
+                with col:
+                    meal = day_plan.get(key, {})
+                    st.markdown(meal_card_html(icon, title, meal), unsafe_allow_html=True)
+    checks = diet.get("checks")
+    if checks:
+        st.caption(
+            f"Variety across days: {checks.get('variety', 0):.0%} distinct items · "
+            f"Daily target {checks.get('daily_target', '')}"
+            + (f" · {len(checks['calorie_outliers'])} day(s) off target" if checks.get("calorie_outliers") else "")
+        )
 
     st.divider()
 
@@ -380,31 +653,14 @@ if st.session_state.generated_plan:
 
     with vcol:
         st.markdown("#### Key Vitals")
-        vital_info = [
-            ("Blood Sugar", "blood_sugar", "blood_sugar", "mg/dL"),
-            ("Cholesterol", "cholesterol", "cholesterol", "mg/dL"),
-        ]
-        for label, key, vtype, unit in vital_info:
-            raw = med_data.get(key, "N/A")
-            val = extract_numeric(raw)
-            status, color, sym = classify_vital(val, vtype)
-            if val is not None:
-                st.markdown(
-                    f'<div class="vital-card">'
-                    f'<div class="vital-lbl">{label}</div>'
-                    f'<div class="vital-val" style="color:{color}">{int(val)} {unit}</div>'
-                    f'<span class="vital-badge" style="background:{color}15;color:{color};">{sym} {status}</span>'
-                    f"</div>",
-                    unsafe_allow_html=True,
-                )
-            else:
-                st.markdown(
-                    f'<div class="vital-card">'
-                    f'<div class="vital-lbl">{label}</div>'
-                    f'<div style="color:#9ca3af;margin-top:4px;">Not available</div>'
-                    f"</div>",
-                    unsafe_allow_html=True,
-                )
+        vitals = data.get("vitals", {})
+        for label, key in [("Blood Sugar", "blood_sugar"), ("Cholesterol", "cholesterol")]:
+            val, status, color, sym = vital_style(vitals.get(key))
+            unit = vitals.get(key, {}).get("unit", "mg/dL")
+            st.markdown(
+                vital_card_html(label, val, unit, status, color, sym),
+                unsafe_allow_html=True,
+            )
 
         # Extra vitals (simple display for hemoglobin, protein, albumin, BMI)
         extra_vitals = [
@@ -448,6 +704,22 @@ if st.session_state.generated_plan:
             unsafe_allow_html=True,
         )
 
+        # ---- Trends across this patient's earlier reports ----
+        if data.get("patient_id"):
+            trends = fetch_trends(data["patient_id"], data.get("report_id"))
+            series = {
+                key: {p["observed_at"][:16].replace("T", " "): p["value"] for p in points}
+                for key, points in trends.items() if len(points) > 1
+            }
+            if series:
+                st.markdown("#### Trends")
+                key = st.selectbox(
+                    "Lab value", list(series),
+                    format_func=lambda k: k.replace("_", " ").title(),
+                    label_visibility="collapsed",
+                )
+                st.line_chart(series[key], height=180)
+
     # ---- Chat Section ----
     st.divider()
     st.markdown("#### 💬 Chat with AI")
@@ -469,63 +741,7 @@ if st.session_state.generated_plan:
                 st.error(f"Could not start chatbot: {e}")
 
     if st.session_state.diet_chain:
-        # Quick-start suggestion buttons (only show when no history)
-        if not st.session_state.chat_history:
-            prompts = [
-                ("🍳 Breakfast info", "What should I eat for breakfast and why?"),
-                ("🔄 Alternatives", "Can you suggest alternatives for my lunch?"),
-                ("📊 Calories", "What are the total calories for each meal?"),
-                ("❓ Why this diet?", "Why did you recommend this specific diet based on my medical data?"),
-            ]
-            scols = st.columns(len(prompts))
-            for sc, (lbl, prm) in zip(scols, prompts):
-                with sc:
-                    if st.button(lbl, use_container_width=True, key=f"s_{lbl}"):
-                        st.session_state.pending_question = prm
-                        st.rerun()
-
-        # Render chat history using Streamlit's native chat UI
-        for msg in st.session_state.chat_history:
-            with st.chat_message(msg["role"], avatar="🧑" if msg["role"] == "user" else "👨‍⚕️"):
-                st.markdown(msg["content"])
-
-        # Handle pending question (from suggestion button click)
-        if st.session_state.pending_question:
-            q = st.session_state.pending_question
-            st.session_state.pending_question = None
-            st.session_state.chat_history.append({"role": "user", "content": q})
-            with st.chat_message("user", avatar="🧑"):
-                st.markdown(q)
-            with st.chat_message("assistant", avatar="👨‍⚕️"):
-                with st.spinner("AI is thinking..."):
-                    try:
-                        ans = st.session_state.diet_chain.chat(
-                            q, st.session_state.chat_history[:-1]
-                        )
-                    except Exception as e:
-                        ans = f"Sorry, an error occurred: {e}"
-                st.markdown(ans)
-            st.session_state.chat_history.append({"role": "assistant", "content": ans})
-            st.rerun()
-
-        # Free-form chat input
-        user_msg = st.chat_input("Ask AI about your diet plan...")
-        if user_msg:
-            st.session_state.chat_history.append({"role": "user", "content": user_msg})
-            with st.chat_message("user", avatar="🧑"):
-                st.markdown(user_msg)
-            with st.chat_message("assistant", avatar="👨‍⚕️"):
-                with st.spinner("AI is thinking..."):
-                    try:
-                        ans = st.session_state.diet_chain.chat(
-                            user_msg, st.session_state.chat_history[:-1]
-                        )
-                    except Exception as e:
-                        ans = f"Sorry, an error occurred: {e}"
-                st.markdown(ans)
-            st.session_state.chat_history.append({"role": "assistant", "content": ans})
-            st.rerun()
-
+        render_chat()
     elif st.session_state.diet_chain is None:
         st.info("Chatbot is initializing...")
 
@@ -534,39 +750,8 @@ if st.session_state.generated_plan:
 #  LANDING PAGE  (no plan generated yet)
 # ============================================================
 else:
-    st.markdown(
-        """
-    <div class="hero">
-        <h1>🩺 AI-NutriCare</h1>
-        <p>Upload your medical report and get a personalized, AI-generated diet plan
-        tailored to your health conditions, age, and dietary preferences.</p>
-    </div>
-    """,
-        unsafe_allow_html=True,
-    )
-
-    st.markdown(
-        """
-    <div class="steps-row">
-        <div class="step-box">
-            <div class="step-num">1</div>
-            <div class="step-title">Upload Report</div>
-            <div class="step-desc">PDF or image of your blood test / medical report</div>
-        </div>
-        <div class="step-box">
-            <div class="step-num">2</div>
-            <div class="step-title">AI Analysis</div>
-            <div class="step-desc">AI reads your vitals, detects conditions &amp; risk factors</div>
-        </div>
-        <div class="step-box">
-            <div class="step-num">3</div>
-            <div class="step-title">Get Your Plan</div>
-            <div class="step-desc">Receive a meal-by-meal diet plan with calorie targets</div>
-        </div>
-    </div>
-    """,
-        unsafe_allow_html=True,
-    )
+    st.markdown(HERO_HTML, unsafe_allow_html=True)
+    st.markdown(STEPS_HTML, unsafe_allow_html=True)
 
     st.markdown("")
     _, mid, _ = st.columns([1, 2, 1])
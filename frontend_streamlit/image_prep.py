@@ -0,0 +1,52 @@
+"""
+Client-side shrinking of uploaded report photos.
+Phone photos of lab reports are often 10-20 MB; the vision OCR model only
+needs a ~200 DPI grayscale page. Shrinking them here cuts upload bandwidth
+and the backend's own re-encoding work. Deskew, border crop and contrast
+clean-up are left to the backend (api/ai_utils.preprocess_page, run on every
+page when OCR_PREPROCESS is on). PDFs are sent as-is.
+"""
+
+import io
+from PIL import Image, ImageOps
+
+MAX_SIDE = 2200          # px on the long side (~200 DPI for an A4 page) keeps lab-table text legible
+JPEG_QUALITY = 85        # visually lossless for printed text
+MIN_SAVING = 0.9         # keep the original unless the result is at least 10% smaller
+
+
+def prepare_upload(data, filename, mime_type):
+    """
+    Downsample, grayscale and recompress an uploaded report image.
+
+    Returns (data, filename, mime_type, info) where info describes what changed.
+    Non-images, unreadable files and images that would not get meaningfully
+    smaller are returned untouched.
+    """
+    info = {"original_bytes": len(data), "final_bytes": len(data), "changed": False}
+    if not mime_type or not mime_type.startswith("image/"):
+        return data, filename, mime_type, info
+
+    try:
+        img = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+        gray = img.convert("L")
+
+        long_side = max(gray.size)
+        if long_side > MAX_SIDE:
+            scale = MAX_SIDE / long_side
+            gray = gray.resize((round(gray.width * scale), round(gray.height * scale)),
+                               Image.LANCZOS)
+
+        out = io.BytesIO()
+        gray.save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+        result = out.getvalue()
+    except Exception as e:
+        print(f"[WARN] Upload preprocessing skipped: {e}")
+        return data, filename, mime_type, info
+
+    if len(result) > len(data) * MIN_SAVING:
+        return data, filename, mime_type, info
+
+    stem = filename.rsplit(".", 1)[0]
+    info.update(final_bytes=len(result), changed=True, size=gray.size)
+    return result, f"{stem}.jpg", "image/jpeg", info
@@ -1,145 +1,65 @@
 """
-Dr. AI Chatbot — Direct Groq API chatbot for AI-NutriCare.
-No LangChain / ChromaDB / sentence-transformers needed.
-Just the Groq SDK + the user's diet plan context.
+Dr. AI chat client for AI-NutriCare.
+The chatbot itself (retrieval, memory, answer cache, Groq calls) runs in the
+Django backend behind /api/chat/ — see backend/api/chat_engine.py. This module
+keeps the old initialize_diet_chat() entry point so app.py stays simple.
 """
 
 import os
-import json
-from pathlib import Path
-from typing import Dict, Any, List
-from dotenv import load_dotenv
-from groq import Groq
-
-# Load env from backend/.env
-_env_path = Path(__file__).resolve().parent.parent / "backend" / ".env"
-if _env_path.exists():
-    load_dotenv(_env_path)
-
-
-def format_diet_plan_to_text(data: Dict[str, Any]) -> str:
-    """Convert the full API response into readable text the LLM can reference."""
-    parts = []
-
-    if "patient_info" in data:
-        p = data["patient_info"]
-        parts.append("PATIENT INFORMATION")
-        parts.append(f"  Name: {p.get('name', 'N/A')}")
-        parts.append(f"  Age: {p.get('age', 'N/A')}")
-        parts.append(f"  Gender: {p.get('gender', 'N/A')}")
-        parts.append("")
-
-    if "medical_data" in data:
-        m = data["medical_data"]
-        parts.append("MEDICAL DATA")
-        for key in ("blood_sugar", "cholesterol", "bmi", "hemoglobin",
-                     "total_protein", "albumin"):
-            val = m.get(key, "N/A")
-            label = key.replace("_", " ").title()
-            parts.append(f"  {label}: {val}")
-        findings = m.get("abnormal_findings", [])
-        if findings:
-            parts.append(f"  Abnormal Findings: {', '.join(findings)}")
-        parts.append("")
-
-    if "diet_plan" in data:
-        d = data["diet_plan"]
-        parts.append("PERSONALIZED DIET PLAN")
-        for meal, icon in [("breakfast", "Breakfast"), ("lunch", "Lunch"), ("dinner", "Dinner")]:
-            if meal in d:
-                parts.append(f"\n  {icon}:")
-                info = d[meal]
-                if isinstance(info, dict):
-                    for item in info.get("food_items", []):
-                        parts.append(f"    - {item}")
-                    parts.append(f"    Calories: {info.get('total_calories', 'N/A')}")
-                else:
-                    parts.append(f"    {info}")
-        if "doctor_note" in d:
-            parts.append(f"\n  Doctor's Note: {d['doctor_note']}")
-
-    if "plan_source" in data:
-        parts.append(f"\n  Plan Source: {data['plan_source']}")
-
-    return "\n".join(parts)
-
-
-SYSTEM_PROMPT = """You are Dr. AI, a friendly and knowledgeable dietitian assistant for the AI-NutriCare app.
-
-You have access to the patient's complete diet plan and medical data shown below. Use this to answer their questions accurately.
-
-RULES:
-1. Answer based on the diet plan context provided. Reference specific foods, calories, and medical values when relevant.
-2. If asked for meal alternatives, suggest foods that match the same calorie range and dietary goal.
-3. If the question is unrelated to diet/nutrition/health, politely redirect: "I specialize in nutrition and diet advice. How can I help with your meal plan?"
-4. Be warm, encouraging, and concise. Use bullet points for lists.
-5. When discussing medical values, explain what they mean in simple terms.
-6. Never diagnose conditions — only provide dietary guidance.
-
-PATIENT'S DIET PLAN & MEDICAL DATA:
-{context}
-"""
-
-
-class DrAIChatbot:
-    """Simple Groq-powered chatbot with conversation memory."""
-
-    def __init__(self, diet_plan_data: Dict[str, Any]):
-        api_key = os.getenv("GROQ_API_KEY")
-        if not api_key:
-            raise ValueError(
-                "GROQ_API_KEY not found. Make sure backend/.env has it set."
-            )
-        self.client = Groq(api_key=api_key)
-        self.context = format_diet_plan_to_text(diet_plan_data)
-        self.system_message = SYSTEM_PROMPT.format(context=self.context)
-        # Model list with fallback
-        self.models = ["llama-3.3-70b-versatile", "llama-3.1-8b-instant"]
-
-    def chat(self, user_message: str, history: List[Dict[str, str]]) -> str:
+from typing import Dict, Any, Iterator, List, Optional
+import requests
+
+API_BASE = os.getenv("NUTRICARE_API_BASE", "http://127.0.0.1:8000/api/")
+CHAT_URL = API_BASE + "chat/"
+
+# One pooled HTTP session for every chat in this Streamlit process
+_http = requests.Session()
+
+
+class DrAIChatClient:
+    """Talks to the backend chat API; conversation state lives server-side."""
+
+    def __init__(self, report_id: int, session_id: str):
+        self.report_id = report_id
+        self.session_id = session_id
+
+    def _payload(self, user_message: str, stream: bool) -> Dict[str, Any]:
+        return {
+            "report_id": self.report_id,
+            "session_id": self.session_id,
+            "message": user_message,
+            "stream": stream,
+        }
+
+    def chat_stream(self, user_message: str) -> Iterator[str]:
+        """Yield the reply piece by piece as the backend streams it."""
+        try:
+            with _http.post(CHAT_URL, json=self._payload(user_message, True),
+                            stream=True, timeout=(5, 120)) as resp:
+                if resp.status_code != 200:
+                    yield f"Sorry, the chat service returned an error ({resp.status_code})."
+                    return
+                resp.encoding = "utf-8"
+                for piece in resp.iter_content(chunk_size=None, decode_unicode=True):
+                    if piece:
+                        yield piece
+        except requests.exceptions.RequestException as e:
+            yield f"Sorry, I'm having trouble connecting right now. Error: {e}"
+
+    def chat(self, user_message: str, history: Optional[List[Dict[str, str]]] = None) -> str:
         """
-        Send a message and get a response.
-
-        Args:
-            user_message: The user's question.
-            history: List of {"role": "user"|"assistant", "content": "..."} dicts.
-
-        Returns:
-            The assistant's reply as a string.
+        Send a message and get the full reply.
+        `history` is accepted for compatibility; the server keeps the real history.
         """
-        messages = [{"role": "system", "content": self.system_message}]
-
-        # Add conversation history (keep last 10 exchanges to stay within context)
-        for msg in history[-20:]:
-            messages.append({
-                "role": msg["role"],
-                "content": msg["content"],
-            })
-
-        # Add current question
-        messages.append({"role": "user", "content": user_message})
-
-        # Try models with fallback
-        last_error = None
-        for model in self.models:
-            try:
-                response = self.client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    temperature=0.4,
-                    max_tokens=1024,
-                )
-                return response.choices[0].message.content
-            except Exception as e:
-                last_error = e
-                continue
-
-        return f"Sorry, I'm having trouble connecting right now. Error: {last_error}"
+        return "".join(self.chat_stream(user_message))
 
 
 def initialize_diet_chat(diet_plan_data: Dict[str, Any], session_id: str):
     """
-    Initialize the chatbot. Returns a DrAIChatbot instance.
+    Initialize the chatbot for a processed report. Returns a DrAIChatClient.
     Keeps same function signature so app.py doesn't need big changes.
     """
-    return DrAIChatbot(diet_plan_data)
+    report_id = diet_plan_data.get("report_id")
+    if report_id is None:
+        raise ValueError("This plan has no report_id — re-upload the report to enable chat.")
+    return DrAIChatClient(report_id, session_id)